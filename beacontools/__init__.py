@@ -1,14 +1,75 @@
 """A library for working with various types of Bluetooth LE Beacons.."""
+from importlib import import_module
+
 from .const import CYPRESS_BEACON_DEFAULT_UUID, BluetoothAddressType, ScanFilter, ScanType
-from .scanner import BeaconScanner
-from .parser import parse_packet
-from .packet_types.eddystone import EddystoneUIDFrame, EddystoneURLFrame, \
-                                    EddystoneEncryptedTLMFrame, EddystoneTLMFrame, \
-                                    EddystoneEIDFrame
-from .packet_types.ibeacon import IBeaconAdvertisement
-from .packet_types.controlj import CJMonitorAdvertisement
-from .packet_types.estimote import EstimoteTelemetryFrameA, EstimoteTelemetryFrameB
-from .packet_types.exposure_notification import ExposureNotificationFrame
-from .device_filters import IBeaconFilter, EddystoneFilter, BtAddrFilter, EstimoteFilter, \
-                            CJMonitorFilter, ExposureNotificationFilter
-from .utils import is_valid_mac
+
+# type checkers treat this name as true, importing it from typing would double the import time
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    # bind the lazy names for type checkers and linters, keep in sync with _LAZY_ATTRIBUTES
+    from .scanner import BeaconScanner
+    from .fanout import BeaconPublisher, BeaconSubscriber
+    from .eid import EIDResolver
+    from .parser import parse_packet, parse_record, parse_packet_all, iter_ad_structures
+    from .registry import PacketFormat, register_packet_format
+    from .packet_types.eddystone import EddystoneUIDFrame, EddystoneURLFrame, \
+                                        EddystoneEncryptedTLMFrame, EddystoneTLMFrame, \
+                                        EddystoneEIDFrame
+    from .packet_types.ibeacon import IBeaconAdvertisement
+    from .packet_types.controlj import CJMonitorAdvertisement
+    from .packet_types.estimote import EstimoteTelemetryFrameA, EstimoteTelemetryFrameB
+    from .packet_types.exposure_notification import ExposureNotificationFrame
+    from .device_filters import IBeaconFilter, EddystoneFilter, BtAddrFilter, EstimoteFilter, \
+                                CJMonitorFilter, ExposureNotificationFilter
+    from .utils import is_valid_mac
+
+# Public names and the submodule they live in. They are imported on first access
+# (PEP 562) so that `import beacontools` does not pull in construct, ahocorapy
+# and the scanner for users which only need a part of the library.
+_LAZY_ATTRIBUTES = {
+    'BeaconScanner': '.scanner',
+    'BeaconPublisher': '.fanout',
+    'BeaconSubscriber': '.fanout',
+    'EIDResolver': '.eid',
+    'parse_packet': '.parser',
+    'parse_record': '.parser',
+    'parse_packet_all': '.parser',
+    'iter_ad_structures': '.parser',
+    'PacketFormat': '.registry',
+    'register_packet_format': '.registry',
+    'EddystoneUIDFrame': '.packet_types.eddystone',
+    'EddystoneURLFrame': '.packet_types.eddystone',
+    'EddystoneEncryptedTLMFrame': '.packet_types.eddystone',
+    'EddystoneTLMFrame': '.packet_types.eddystone',
+    'EddystoneEIDFrame': '.packet_types.eddystone',
+    'IBeaconAdvertisement': '.packet_types.ibeacon',
+    'CJMonitorAdvertisement': '.packet_types.controlj',
+    'EstimoteTelemetryFrameA': '.packet_types.estimote',
+    'EstimoteTelemetryFrameB': '.packet_types.estimote',
+    'ExposureNotificationFrame': '.packet_types.exposure_notification',
+    'IBeaconFilter': '.device_filters',
+    'EddystoneFilter': '.device_filters',
+    'BtAddrFilter': '.device_filters',
+    'EstimoteFilter': '.device_filters',
+    'CJMonitorFilter': '.device_filters',
+    'ExposureNotificationFilter': '.device_filters',
+    'is_valid_mac': '.utils',
+}
+
+__all__ = ['CYPRESS_BEACON_DEFAULT_UUID', 'BluetoothAddressType', 'ScanFilter', 'ScanType'] + \
+          list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    """Import public names from their submodule on first access."""
+    try:
+        module_name = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name)) from None
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
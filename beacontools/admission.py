@@ -0,0 +1,82 @@
+"""Decide which advertisements a scanner processes at all.
+
+The checks of an AdmissionPolicy only look at the header of an advertising report (address
+and RSSI), they run before the payload is prefiltered or parsed. Dropped advertisements
+are counted by reason.
+"""
+import threading
+
+from .utils import string_to_bt_addr
+
+
+class AdmissionPolicy(object):
+    """Drop advertisements before they are prefiltered, pass an instance as admission_policy
+    to a BeaconScanner.
+
+    Advertisements received with an RSSI below min_rssi (dBm) or sent from an address in
+    blocklist (address strings, see block and unblock) are dropped. If a FloodGuard is
+    passed as flood_guard, advertisements of addresses which send more than its max_rate
+    are dropped (see beacontools.flood). If an OverloadController is passed as
+    overload_controller, the scanner samples advertisements and skips telemetry frames
+    while it can't keep up with the incoming advertisements (see beacontools.overload).
+    """
+
+    def __init__(self, min_rssi=None, blocklist=None, flood_guard=None, overload_controller=None):
+        self.min_rssi = min_rssi
+        # binary addresses (as received) whose advertisements are dropped, replaced as a whole
+        # by block and unblock so that the packet path can read it without locking
+        self.blocklist = frozenset(string_to_bt_addr(addr) for addr in blocklist or ())
+        self._blocklist_lock = threading.Lock()
+        self.flood_guard = flood_guard
+        self.overload_controller = overload_controller
+        # advertisements dropped by the policy, by reason
+        self.drops = {'rssi': 0, 'blocked': 0, 'flood': 0, 'overload': 0}
+
+    def block(self, *bt_addrs):
+        """Drop all advertisements of the given addresses (e.g. "aa:bb:cc:dd:ee:ff").
+
+        Can be called while the scanner is running.
+        """
+        add = [string_to_bt_addr(addr) for addr in bt_addrs]
+        with self._blocklist_lock:
+            self.blocklist = self.blocklist.union(add)
+
+    def unblock(self, *bt_addrs):
+        """Stop dropping the advertisements of the given addresses."""
+        remove = [string_to_bt_addr(addr) for addr in bt_addrs]
+        with self._blocklist_lock:
+            self.blocklist = self.blocklist.difference(remove)
+
+    def check_report(self, bt_addr, rssi):
+        """Check the blocklist and min_rssi for a report of bt_addr (binary, as received) with
+        rssi (dBm), also for the fragments of an extended advertisement.
+
+        Returns:
+            False if the report should be dropped
+        """
+        if bt_addr in self.blocklist:
+            self.drops['blocked'] += 1
+            return False
+        if self.min_rssi is not None and rssi < self.min_rssi:
+            self.drops['rssi'] += 1
+            return False
+        return True
+
+    def admit(self, bt_addr, rssi):
+        """Check an advertisement of bt_addr (binary, as received) with rssi (dBm).
+
+        Returns:
+            False if the advertisement should be dropped
+        """
+        if not self.check_report(bt_addr, rssi):
+            return False
+        flood_guard = self.flood_guard
+        if flood_guard is not None and not flood_guard.admit(bt_addr):
+            self.drops['flood'] += 1
+            return False
+        overload_controller = self.overload_controller
+        if overload_controller is not None and overload_controller.degraded and \
+                not overload_controller.admit(bt_addr):
+            self.drops['overload'] += 1
+            return False
+        return True
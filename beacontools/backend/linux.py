@@ -1,23 +1,102 @@
-"""Backend for Linux using bluez"""
-from bluetooth import _bluetooth as bluez
+"""Backend for Linux using raw hci sockets of the kernel (no PyBluez required)."""
+import errno
+import select
+import socket
+import struct
+import time
 
-# pylint: disable=c-extension-no-member
+from ..const import HCI_COMMAND_PKT, HCI_EVENT_PKT, SOL_HCI, HCI_FILTER, LE_META_EVENT, \
+                    EVT_CMD_COMPLETE, EVT_CMD_STATUS, HCI_MAX_EVENT_SIZE, HCI_REQUEST_TIMEOUT
+
+# struct hci_ufilter: packet type mask, event mask (64 bits), opcode
+_FILTER = struct.Struct("<IIIH")
+_COMMAND_HEADER = struct.Struct("<BHB")
+# command complete: number of allowed commands, opcode
+_CMD_COMPLETE = struct.Struct("<BH")
+# command status: status, number of allowed commands, opcode
+_CMD_STATUS = struct.Struct("<BBH")
+
+
+def hci_filter(events, opcode=0):
+    """Build the HCI_FILTER socket option which passes the given events (and no other packets)."""
+    event_mask = 0
+    for event in events:
+        event_mask |= 1 << event
+    return _FILTER.pack(1 << HCI_EVENT_PKT, event_mask & 0xFFFFFFFF, event_mask >> 32, opcode)
 
-def open_dev(bt_device_id):
-    """Open hci device socket."""
-    socket = bluez.hci_open_dev(bt_device_id)
 
-    filtr = bluez.hci_filter_new()
-    bluez.hci_filter_all_events(filtr)
-    bluez.hci_filter_set_ptype(filtr, bluez.HCI_EVENT_PKT)
-    socket.setsockopt(bluez.SOL_HCI, bluez.HCI_FILTER, filtr)
+def opcode_of(group_field, command_field):
+    """Opcode of an hci command."""
+    return ((group_field & 0x3f) << 10) | (command_field & 0x3ff)
+
+
+def open_dev(bt_device_id):
+    """Open hci device socket which only receives LE meta events."""
+    # pylint: disable=no-member
+    sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_RAW, socket.BTPROTO_HCI)
+    # pylint: enable=no-member
+    try:
+        sock.bind((bt_device_id,))
+        sock.setsockopt(SOL_HCI, HCI_FILTER, hci_filter([LE_META_EVENT]))
+    except OSError:
+        sock.close()
+        raise
+    return sock
 
-    return socket
 
-def send_cmd(socket, group_field, command_field, data):
+def send_cmd(sock, group_field, command_field, data):
     """Send hci command to device."""
-    return bluez.hci_send_cmd(socket, group_field, command_field, data)
+    sock.send(_COMMAND_HEADER.pack(HCI_COMMAND_PKT, opcode_of(group_field, command_field),
+                                   len(data)) + data)
+
+
+def send_req(sock, group_field, command_field, event, rlen, params, timeout):
+    """Send hci request to device and wait for the response.
+
+    The filter of the socket is widened to the command complete and status events of the
+    command (and event) while waiting and restored afterwards.
+
+    Returns:
+        The first rlen bytes of the return parameters
+
+    Raises:
+        TimeoutError: no response within timeout ms (HCI_REQUEST_TIMEOUT if timeout is 0)
+        OSError: the controller rejected the command
+    """
+    opcode = opcode_of(group_field, command_field)
+    old_filter = sock.getsockopt(SOL_HCI, HCI_FILTER, _FILTER.size)
+    sock.setsockopt(SOL_HCI, HCI_FILTER,
+                    hci_filter({EVT_CMD_COMPLETE, EVT_CMD_STATUS, event}, opcode))
+    try:
+        send_cmd(sock, group_field, command_field, params)
+        deadline = time.monotonic() + (timeout or HCI_REQUEST_TIMEOUT) / 1000.0
+        return _wait_for_response(sock, opcode, event, rlen, deadline)
+    finally:
+        sock.setsockopt(SOL_HCI, HCI_FILTER, old_filter)
+
+
+def _wait_for_response(sock, opcode, event, rlen, deadline):
+    """Read events until the response to the command with opcode arrives, see send_req."""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+            raise TimeoutError(errno.ETIMEDOUT, "hci request 0x%04x timed out" % opcode)
+        pkt = sock.recv(HCI_MAX_EVENT_SIZE)
+        if len(pkt) < 3 or pkt[0] != HCI_EVENT_PKT:
+            continue
+        received, data = pkt[1], pkt[3:3 + pkt[2]]
 
-def send_req(socket, group_field, command_field, event, rlen, params, timeout):
-    """Send hci request to device."""
-    return bluez.hci_send_req(socket, group_field, command_field, event, rlen, params, timeout)
+        if received == EVT_CMD_STATUS and len(data) >= _CMD_STATUS.size:
+            status, _, status_opcode = _CMD_STATUS.unpack_from(data)
+            if status_opcode != opcode:
+                continue
+            if event == EVT_CMD_STATUS:
+                return data[:rlen]
+            if status != 0:
+                raise OSError(errno.EIO, "hci request 0x%04x failed with status 0x%02x"
+                              % (opcode, status))
+        elif received == EVT_CMD_COMPLETE and len(data) >= _CMD_COMPLETE.size:
+            if _CMD_COMPLETE.unpack_from(data)[1] == opcode:
+                return data[_CMD_COMPLETE.size:_CMD_COMPLETE.size + rlen]
+        elif received == event:
+            return data[:rlen]
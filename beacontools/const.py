@@ -33,20 +33,53 @@ class BluetoothAddressType(IntEnum):
     RANDOM = 0x01  # with a random MAC-address
 
 
+# the controller white list (called filter accept list in newer specs) stores the address type
+# of each entry, the type of addresses given by the user is unknown so both are added
+WHITE_LIST_ADDRESS_TYPES = (BluetoothAddressType.PUBLIC, BluetoothAddressType.RANDOM)
+
+# default interval in seconds after which the duplicate filter of the controller is reset
+DUPLICATES_REARM_INTERVAL = 1.0
+
 # used for window and interval (i.e. 0x10 * 0.625 = 10ms, 10ms / 0.625 = 0x10)
 MS_FRACTION_DIVIDER = 0.625
+# valid range of window and interval (in fractions) for the (extended) set scan parameters command
+MIN_SCAN_FRACTIONS = 0x0004
+MAX_SCAN_FRACTIONS = 0x4000
+MAX_EXT_SCAN_FRACTIONS = 0xFFFF
 
 LE_META_EVENT = 0x3e
 OGF_LE_CTL = 0x08
 OCF_LE_SET_SCAN_PARAMETERS = 0x000B
 OCF_LE_SET_SCAN_ENABLE = 0x000C
+OCF_LE_READ_WHITE_LIST_SIZE = 0x000F
+OCF_LE_CLEAR_WHITE_LIST = 0x0010
+OCF_LE_ADD_DEVICE_TO_WHITE_LIST = 0x0011
 EVT_LE_ADVERTISING_REPORT = 0x02
 OCF_LE_SET_EXT_SCAN_PARAMETERS = 0x0041
 OCF_LE_SET_EXT_SCAN_ENABLE = 0x0042
 EVT_LE_EXT_ADVERTISING_REPORT = 0x0D
+# data status (bits 5-6 of the event type) of an extended advertising report
+EXT_ADV_DATA_COMPLETE = 0x00
+EXT_ADV_DATA_INCOMPLETE = 0x01
+EXT_ADV_DATA_TRUNCATED = 0x02
+# maximum length of the (reassembled) extended advertising data
+MAX_EXT_ADV_DATA_LENGTH = 1650
+# maximum size of an hci event packet (packet type, event code, length, 255 byte parameters)
+HCI_MAX_EVENT_SIZE = 260
+# maximum number of events read from the socket per wakeup of the scanner
+MAX_RECV_BATCH = 64
 OGF_INFO_PARAM = 0x04
 OCF_READ_LOCAL_VERSION = 0x01
 EVT_CMD_COMPLETE = 0x0E
+EVT_CMD_STATUS = 0x0F
+# hci packet types
+HCI_COMMAND_PKT = 0x01
+HCI_EVENT_PKT = 0x04
+# socket option of hci sockets (Linux) which selects the packet and event types passed to the socket
+SOL_HCI = 0
+HCI_FILTER = 2
+# timeout in ms of hci requests which are sent without a timeout
+HCI_REQUEST_TIMEOUT = 1000
 
 # for Generic Access Profile parsing
 FLAGS_DATA_TYPE = 0x01
@@ -68,6 +101,10 @@ EDDYSTONE_RESERVED_FRAME = 0x20
 EDDYSTONE_TLM_UNENCRYPTED = 0x00
 EDDYSTONE_TLM_ENCRYPTED = 0x01
 
+# EIDs rotate every 2^K seconds, K is the rotation exponent
+EDDYSTONE_EID_MAX_ROTATION_EXPONENT = 15
+EDDYSTONE_EID_LENGTH = 8
+
 EDDYSTONE_URL_SCHEMES = {
     0x00: "http://www.",
     0x01: "https://www.",
@@ -0,0 +1,154 @@
+"""Count distinct devices per time window with bounded memory.
+
+Exposure Notification frames carry a rolling proximity identifier which changes every
+10-20 minutes, so the number of distinct identifiers per minute is a good estimate of
+the number of devices nearby. Identifiers are counted exactly until a threshold is
+reached, after that the count of the window is estimated with HyperLogLog.
+"""
+import hashlib
+import math
+import time
+from collections import OrderedDict
+
+from .packet_types import ExposureNotificationFrame
+
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+
+
+def hash_identifier(identifier):
+    """64 bit hash of an identifier (str or bytes)."""
+    if isinstance(identifier, str):
+        identifier = identifier.encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(identifier, digest_size=8).digest(), "big")
+
+
+class HyperLogLog(object):
+    """Estimate the number of distinct 64 bit hashes."""
+
+    def __init__(self, precision=12):
+        """Initialize the estimator with 2^precision registers (one byte each).
+
+        The standard error of the estimate is about 1.04 / sqrt(2^precision).
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, hashed):
+        """Add a 64 bit hash."""
+        index = hashed >> (_HASH_BITS - self.precision)
+        remaining = (hashed << self.precision) & _HASH_MASK
+        # position of the first set bit of the remaining bits (moved to the top)
+        rank = min(_HASH_BITS - remaining.bit_length(), _HASH_BITS - self.precision) + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        """Estimated number of distinct hashes."""
+        size = len(self.registers)
+        if size == 16:
+            alpha = 0.673
+        elif size == 32:
+            alpha = 0.697
+        elif size == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # small range correction (linear counting)
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+
+class DistinctCounter(object):
+    """Count distinct identifiers exactly up to threshold, estimate them afterwards."""
+
+    def __init__(self, threshold=4096, precision=12):
+        self.threshold = threshold
+        self.precision = precision
+        self._exact = set()
+        self._estimator = None
+
+    @property
+    def exact(self):
+        """Whether the count is exact."""
+        return self._estimator is None
+
+    def add(self, hashed):
+        """Add a 64 bit hash (see hash_identifier)."""
+        if self._estimator is not None:
+            self._estimator.add(hashed)
+            return
+        self._exact.add(hashed)
+        if len(self._exact) > self.threshold:
+            self._estimator = HyperLogLog(self.precision)
+            for value in self._exact:
+                self._estimator.add(value)
+            self._exact = None
+
+    def count(self):
+        """Number of distinct identifiers."""
+        if self._estimator is not None:
+            return self._estimator.count()
+        return len(self._exact)
+
+
+class DistinctDeviceCounter(object):
+    """Count distinct rolling proximity identifiers per time window.
+
+    Can be used as the callback of a BeaconScanner, all packets which are not
+    ExposureNotificationFrames are ignored.
+    """
+
+    def __init__(self, window=60.0, max_windows=60, threshold=4096, precision=12):
+        """Initialize the counter.
+
+        Args:
+            window: Length of the time windows in seconds
+            max_windows: Number of windows which are kept, older ones are dropped
+            threshold: Number of identifiers which are counted exactly per window
+            precision: Precision of the HyperLogLog estimator which is used above threshold
+        """
+        if window <= 0:
+            raise ValueError("window must be positive")
+        if max_windows < 1:
+            raise ValueError("max_windows must be at least 1")
+        self.window = window
+        self.max_windows = max_windows
+        self.threshold = threshold
+        self.precision = precision
+        # window start -> DistinctCounter
+        self._windows = OrderedDict()
+
+    def add(self, identifier, timestamp=None):
+        """Count an identifier (str or bytes) seen at timestamp (defaults to now)."""
+        if timestamp is None:
+            timestamp = time.time()
+        start = timestamp - timestamp % self.window
+        counter = self._windows.get(start)
+        if counter is None:
+            counter = DistinctCounter(self.threshold, self.precision)
+            late = self._windows and start < next(reversed(self._windows))
+            self._windows[start] = counter
+            if late:
+                # packet of an earlier window, keep the windows sorted
+                self._windows = OrderedDict(sorted(self._windows.items()))
+            while len(self._windows) > self.max_windows:
+                self._windows.popitem(last=False)
+            if start not in self._windows:
+                return
+        counter.add(hash_identifier(identifier))
+
+    def __call__(self, bt_addr, rssi, packet, properties):  # pylint: disable=unused-argument
+        """Scanner callback."""
+        if isinstance(packet, ExposureNotificationFrame):
+            self.add(packet.identifier_bytes)
+
+    def counts(self):
+        """List of (window start, distinct devices, exact) for all windows, oldest first."""
+        return [(start, counter.count(), counter.exact)
+                for start, counter in self._windows.items()]
@@ -1,6 +1,59 @@
 """Filters passed to the BeaconScanner to filter results."""
 from .const import CJ_MANUFACTURER_ID, CJ_TEMPHUM_TYPE
-from .utils import is_valid_mac
+from .utils import is_valid_mac, is_one_of, is_packet_type, string_to_bt_addr
+
+
+def check_filters(device_filter, packet_filter):
+    """Validate device and packet filters and convert them to lists (or None if empty).
+
+    Raises:
+        ValueError: A filter is not a DeviceFilter or not a packet type
+    """
+    # check if device filters are valid
+    if device_filter is not None:
+        if not isinstance(device_filter, list):
+            device_filter = [device_filter]
+        if len(device_filter) > 0:
+            for filtr in device_filter:
+                if not isinstance(filtr, DeviceFilter):
+                    raise ValueError("Device filters must be instances of DeviceFilter")
+        else:
+            device_filter = None
+
+    # check if packet filters are valid
+    if packet_filter is not None:
+        if not isinstance(packet_filter, list):
+            packet_filter = [packet_filter]
+        if len(packet_filter) > 0:
+            for filtr in packet_filter:
+                if not is_packet_type(filtr):
+                    raise ValueError("Packet filters must be one of the packet types")
+        else:
+            packet_filter = None
+
+    return device_filter, packet_filter
+
+
+def filters_match(bt_addr, packet, properties, device_filter, packet_filter):
+    """Check if a packet passes the (validated) device and packet filters.
+
+    bt_addr is the binary address as received (see BtAddrFilter.bt_addr_key).
+    """
+    if packet_filter is not None and not is_one_of(packet, packet_filter):
+        # return if packet filter does not match
+        return False
+    if device_filter is None:
+        return True
+
+    # iterate over filters and call .matches() on each
+    for filtr in device_filter:
+        if isinstance(filtr, BtAddrFilter):
+            if filtr.bt_addr_key == bt_addr:
+                return True
+
+        elif filtr.matches(properties):
+            return True
+    return False
 
 
 class DeviceFilter(object):
@@ -112,3 +165,16 @@ class BtAddrFilter(DeviceFilter):
             raise ValueError("Invalid bluetooth MAC address given,"
                              " format should match aa:bb:cc:dd:ee:ff")
         self.properties['bt_addr'] = bt_addr
+
+    @property
+    def bt_addr_key(self):
+        """Binary address in the byte order used by the controller.
+
+        Compared with the address of every received packet instead of formatting it. Derived
+        from properties (and cached), so that filters restored from their properties work too.
+        """
+        bt_addr = self.properties['bt_addr']
+        cached = self.__dict__.get('_bt_addr_key')
+        if cached is None or cached[0] != bt_addr:
+            cached = self.__dict__['_bt_addr_key'] = (bt_addr, string_to_bt_addr(bt_addr))
+        return cached[1]
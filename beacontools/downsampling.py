@@ -0,0 +1,173 @@
+"""Downsample telemetry of beacons to one aggregate per time window.
+
+Telemetry packets are sent several times per second, the downsampler keeps the minimum,
+maximum, mean and last value of every telemetry field per beacon and tumbling window and
+emits a single aggregate record per window. Windows are emitted by the first packet (of any
+beacon) after they are over, or by flush. Without any telemetry flush has to be called to
+get the last aggregates, e.g. when the scanner is stopped.
+"""
+import time
+from array import array
+from collections import namedtuple
+
+from .packet_types import EddystoneTLMFrame, EstimoteTelemetryFrameB, EstimoteNearable, \
+                          CJMonitorAdvertisement
+
+# telemetry fields which are aggregated per packet type
+TELEMETRY_FIELDS = {
+    EddystoneTLMFrame: ('voltage', 'temperature'),
+    EstimoteTelemetryFrameB: ('temperature', 'ambient_light', 'battery_level'),
+    EstimoteNearable: ('temperature',),
+    CJMonitorAdvertisement: ('temperature', 'humidity', 'light'),
+}
+
+AGGREGATE_HEADER_FIELDS = ('packet_type', 'beacon', 'window_start', 'window_end', 'samples')
+AGGREGATE_STATISTICS = ('min', 'max', 'mean', 'last')
+
+# aggregate record of every packet type, e.g. EddystoneTLMFrame -> EddystoneTLMFrameAggregate
+# with the fields voltage_min, voltage_max, voltage_mean, voltage_last, temperature_min, ...
+AGGREGATE_TYPES = {
+    cls: namedtuple(cls.__name__ + 'Aggregate', AGGREGATE_HEADER_FIELDS + tuple(
+        '%s_%s' % (field, statistic) for field in fields for statistic in AGGREGATE_STATISTICS))
+    for cls, fields in TELEMETRY_FIELDS.items()
+}
+
+# layout of the per field state: number of values, min, max, sum, last
+_STATE_SIZE = 5
+
+
+def beacon_identity(bt_addr, packet, properties):
+    """Get the identity of the beacon which sent a packet.
+
+    This is the beacon_id of resolved EID beacons, namespace and instance of Eddystone
+    beacons, the identifier of Estimote beacons or the bluetooth address otherwise.
+    """
+    if properties:
+        if 'beacon_id' in properties:
+            return properties['beacon_id']
+        if 'namespace' in properties:
+            return (properties['namespace'], properties['instance'])
+    identifier = getattr(packet, 'identifier', None)
+    if identifier is not None:
+        return identifier
+    return bt_addr
+
+
+class _Window(object):
+    """Statistics of one beacon in the current window."""
+
+    __slots__ = ('start', 'samples', 'state')
+
+    def __init__(self, start, fields):
+        self.start = start
+        self.samples = 0
+        self.state = array('d', [0.0] * (_STATE_SIZE * len(fields)))
+
+    def add(self, values):
+        """Add the telemetry values of one packet, None values are skipped."""
+        state = self.state
+        self.samples += 1
+        for offset, value in zip(range(0, len(state), _STATE_SIZE), values):
+            if value is None:
+                continue
+            if state[offset] == 0:
+                state[offset + 1] = value
+                state[offset + 2] = value
+            elif value < state[offset + 1]:
+                state[offset + 1] = value
+            elif value > state[offset + 2]:
+                state[offset + 2] = value
+            state[offset] += 1
+            state[offset + 3] += value
+            state[offset + 4] = value
+
+    def statistics(self):
+        """min, max, mean and last value of every field, None for fields without values."""
+        state = self.state
+        result = []
+        for offset in range(0, len(state), _STATE_SIZE):
+            count = state[offset]
+            if count == 0:
+                result.extend((None, None, None, None))
+            else:
+                result.extend((state[offset + 1], state[offset + 2], state[offset + 3] / count,
+                               state[offset + 4]))
+        return result
+
+
+class Downsampler(object):
+    """Aggregate telemetry per beacon over tumbling windows.
+
+    Can be used as the callback of a BeaconScanner, packets without telemetry are ignored.
+    """
+
+    def __init__(self, callback, window=60.0):
+        """Initialize the downsampler.
+
+        Args:
+            callback: Called with an aggregate record (see AGGREGATE_TYPES) for every
+                beacon and window which contains samples
+            window: Length of the windows in seconds
+        """
+        if window <= 0:
+            raise ValueError("window must be positive")
+        self.callback = callback
+        self.window = window
+        # (packet type, beacon identity) -> _Window
+        self._windows = {}
+        # end of the earliest open window, windows are flushed when a packet arrives after it
+        self._next_flush = None
+        # windows which end at or before this time have been emitted by flush
+        self._flushed_until = None
+
+    def __call__(self, bt_addr, rssi, packet, properties):  # pylint: disable=unused-argument
+        """Scanner callback."""
+        if type(packet) in TELEMETRY_FIELDS:
+            self.add(beacon_identity(bt_addr, packet, properties), packet)
+
+    def add(self, beacon, packet, timestamp=None):
+        """Add the telemetry of a packet sent by beacon at timestamp (defaults to now)."""
+        if timestamp is None:
+            timestamp = time.time()
+        cls = type(packet)
+        fields = TELEMETRY_FIELDS[cls]
+        start = timestamp - timestamp % self.window
+        if self._flushed_until is not None and start + self.window <= self._flushed_until:
+            # the window of this packet has been emitted already
+            return
+        if self._next_flush is not None and timestamp >= self._next_flush:
+            # emit the windows of beacons which went quiet, at most once per window
+            self.flush(timestamp)
+        key = (cls, beacon)
+        window = self._windows.get(key)
+        if window is not None and start < window.start:
+            # the window of this packet has been emitted already
+            return
+        if window is None or window.start != start:
+            if window is not None:
+                self._emit(key, window)
+            window = _Window(start, fields)
+            self._windows[key] = window
+            if self._next_flush is None or start + self.window < self._next_flush:
+                self._next_flush = start + self.window
+        window.add([getattr(packet, field) for field in fields])
+
+    def flush(self, now=None):
+        """Emit all windows which are over at now, emit all windows if now is None."""
+        for key, window in list(self._windows.items()):
+            if now is None or window.start + self.window <= now:
+                del self._windows[key]
+                self._emit(key, window)
+        if now is not None and (self._flushed_until is None or now > self._flushed_until):
+            self._flushed_until = now
+        self._next_flush = min((window.start for window in self._windows.values()),
+                               default=None)
+        if self._next_flush is not None:
+            self._next_flush += self.window
+
+    def _emit(self, key, window):
+        """Call the callback with the aggregate of a window."""
+        cls, beacon = key
+        self.callback(AGGREGATE_TYPES[cls]._make(
+            [cls.__name__, beacon, window.start, window.start + self.window, window.samples] +
+            window.statistics()))
@@ -0,0 +1,240 @@
+"""Resolve Eddystone ephemeral identifiers (EIDs) to registered beacons.
+
+An EID beacon derives its identifier from a 16 byte identity key, its own clock and the
+rotation exponent K with AES, the identifier changes every 2^K seconds. Instead of running
+AES for every registered beacon when a packet arrives, the resolver precomputes the EIDs of
+the current, previous and next rotation period of every beacon in the background and looks
+up received EIDs in a dict.
+
+AES is provided by the cryptography package: pip install beacontools[crypto]
+"""
+import heapq
+import itertools
+import logging
+import struct
+import threading
+import time
+
+from .const import EDDYSTONE_EID_MAX_ROTATION_EXPONENT, EDDYSTONE_EID_LENGTH
+
+_LOGGER = logging.getLogger(__name__)
+
+_TIME = struct.Struct(">I")
+_TIME_HIGH = struct.Struct(">H")
+
+
+def _load_aes():
+    """Get a function which encrypts a single block with AES-128 (ECB)."""
+    try:
+        # pylint: disable=import-outside-toplevel
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    except ImportError as exc:
+        raise ImportError("EID resolution requires the cryptography package, "
+                          "install beacontools[crypto]") from exc
+
+    def aes_encrypt(key, block):
+        """Encrypt a 16 byte block with key."""
+        encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+        return encryptor.update(block) + encryptor.finalize()
+    return aes_encrypt
+
+
+def compute_eid(identity_key, rotation_exponent, beacon_time, aes_encrypt=None):
+    """Compute the EID a beacon broadcasts at beacon_time (seconds of the beacon clock)."""
+    if aes_encrypt is None:
+        aes_encrypt = _load_aes()
+    beacon_time = int(beacon_time) & 0xFFFFFFFF
+    temporary_key = aes_encrypt(identity_key, b"\x00" * 11 + b"\xff\x00\x00" +
+                                _TIME_HIGH.pack(beacon_time >> 16))
+    quantized = (beacon_time >> rotation_exponent) << rotation_exponent
+    eid = aes_encrypt(temporary_key, b"\x00" * 11 + bytes([rotation_exponent]) +
+                      _TIME.pack(quantized))
+    return eid[:EDDYSTONE_EID_LENGTH]
+
+
+class EIDResolver(object):
+    """Precompute the EIDs of registered beacons and resolve received EIDs to their ids.
+
+    The EIDs of every beacon are recomputed on their own when it rotates, registering or
+    removing a beacon doesn't touch the EIDs of the others.
+    """
+
+    def __init__(self, adjacent_periods=1):
+        """Initialize the resolver.
+
+        Args:
+            adjacent_periods: Number of rotation periods before and after the current one
+                which are resolved as well, to tolerate clock drift of the beacons.
+        """
+        if adjacent_periods < 0:
+            raise ValueError("adjacent_periods must not be negative")
+        self._aes_encrypt = _load_aes()
+        self.adjacent_periods = adjacent_periods
+        # beacon_id -> (identity key, rotation exponent, clock offset)
+        self._beacons = {}
+        # eid -> properties, modified in place under the lock and read without it
+        self._table = {}
+        # beacon_id -> (eids in the table, time when they have to be recomputed)
+        self._entries = {}
+        # heap of (time, sequence number, beacon_id), outdated items are skipped
+        self._deadlines = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._keep_going = False
+
+    def register(self, beacon_id, identity_key, rotation_exponent, beacon_time=0, timestamp=None):
+        """Register a beacon.
+
+        Args:
+            beacon_id: Identity reported in the properties of resolved packets
+            identity_key: 16 byte identity key shared with the beacon
+            rotation_exponent: The EID rotates every 2^rotation_exponent seconds
+            beacon_time: Value of the beacon clock at timestamp (as reported during
+                provisioning)
+            timestamp: Wall clock time when beacon_time was read, defaults to now
+        """
+        identity_key = bytes(identity_key)
+        if len(identity_key) != 16:
+            raise ValueError("identity_key must be 16 bytes")
+        if not 0 <= rotation_exponent <= EDDYSTONE_EID_MAX_ROTATION_EXPONENT:
+            raise ValueError("rotation_exponent must be between 0 and %d"
+                             % EDDYSTONE_EID_MAX_ROTATION_EXPONENT)
+        if timestamp is None:
+            timestamp = time.time()
+        registration = (identity_key, rotation_exponent, timestamp - beacon_time)
+        with self._lock:
+            self._beacons[beacon_id] = registration
+        self._update(beacon_id, registration, time.time())
+
+    def unregister(self, beacon_id):
+        """Remove a registered beacon."""
+        with self._lock:
+            self._beacons.pop(beacon_id, None)
+            self._drop(beacon_id)
+
+    def registration(self, beacon_id):
+        """Get (identity key, rotation exponent, clock offset) of a beacon, None if unknown.
+
+        The clock offset is the wall clock time at which the beacon clock was 0.
+        """
+        return self._beacons.get(beacon_id)
+
+    def resolve(self, eid):
+        """Get the properties of the beacon which sent eid, None if it is unknown."""
+        return self._table.get(bytes(eid))
+
+    @property
+    def next_refresh(self):
+        """Wall clock time when the next beacon rotates and its EIDs have to be recomputed."""
+        with self._lock:
+            deadlines = self._deadlines
+            while deadlines and not self._is_current(deadlines[0]):
+                heapq.heappop(deadlines)
+            return deadlines[0][0] if deadlines else None
+
+    def refresh(self, now=None):
+        """Recompute the EIDs of all registered beacons."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            beacons = list(self._beacons.items())
+        for beacon_id, registration in beacons:
+            self._update(beacon_id, registration, now)
+
+    def refresh_due(self, now=None):
+        """Recompute the EIDs of the beacons which have rotated at now."""
+        if now is None:
+            now = time.time()
+        due = []
+        with self._lock:
+            deadlines = self._deadlines
+            while deadlines and deadlines[0][0] <= now:
+                item = heapq.heappop(deadlines)
+                if self._is_current(item):
+                    due.append((item[2], self._beacons[item[2]]))
+        for beacon_id, registration in due:
+            self._update(beacon_id, registration, now)
+
+    def _compute(self, registration, now):
+        """Compute the EIDs of the current and adjacent periods of a beacon.
+
+        Returns:
+            List of EIDs and the time when the beacon rotates next
+        """
+        identity_key, rotation_exponent, clock_offset = registration
+        period = 1 << rotation_exponent
+        current = (int(now - clock_offset) >> rotation_exponent) << rotation_exponent
+        starts = [current + i * period
+                  for i in range(-self.adjacent_periods, self.adjacent_periods + 1)]
+        eids = [compute_eid(identity_key, rotation_exponent, start, self._aes_encrypt)
+                for start in starts if start >= 0]
+        return eids, clock_offset + current + period
+
+    def _update(self, beacon_id, registration, now):
+        """Replace the EIDs of a beacon, AES runs without holding the lock."""
+        eids, deadline = self._compute(registration, now)
+        properties = {'beacon_id': beacon_id}
+        with self._lock:
+            if self._beacons.get(beacon_id) != registration:
+                # removed or registered again meanwhile
+                return
+            self._drop(beacon_id)
+            for eid in eids:
+                self._table[eid] = properties
+            self._entries[beacon_id] = (eids, deadline)
+            heapq.heappush(self._deadlines, (deadline, next(self._sequence), beacon_id))
+            if len(self._deadlines) > 2 * len(self._entries) + 16:
+                # drop outdated items of beacons which were registered again or removed
+                self._deadlines = [item for item in self._deadlines if self._is_current(item)]
+                heapq.heapify(self._deadlines)
+        self._wakeup.set()
+
+    def _drop(self, beacon_id):
+        """Remove the EIDs of a beacon from the table, the lock must be held."""
+        eids, _ = self._entries.pop(beacon_id, ((), None))
+        for eid in eids:
+            properties = self._table.get(eid)
+            if properties is not None and properties['beacon_id'] == beacon_id:
+                del self._table[eid]
+
+    def _is_current(self, item):
+        """Check if a heap item is the deadline of the current EIDs of its beacon."""
+        entry = self._entries.get(item[2])
+        return entry is not None and entry[1] == item[0]
+
+    def start(self):
+        """Recompute the EIDs in a background thread whenever a beacon rotates."""
+        if self._thread is not None:
+            return
+        self._keep_going = True
+        self._thread = threading.Thread(target=self._run, name="EIDResolver", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        if self._thread is None:
+            return
+        self._keep_going = False
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        """Wait for the next rotation and recompute the EIDs of the rotated beacons."""
+        while self._keep_going:
+            self._wakeup.clear()
+            next_refresh = self.next_refresh
+            if next_refresh is None:
+                timeout = None
+            else:
+                timeout = next_refresh - time.time()
+                if timeout <= 0:
+                    try:
+                        self.refresh_due()
+                        continue
+                    except Exception:  # pylint: disable=broad-except
+                        _LOGGER.exception("Failed to compute EIDs")
+                        timeout = 1.0
+            self._wakeup.wait(timeout)
@@ -0,0 +1,201 @@
+"""Decrypt Eddystone encrypted TLM (eTLM) frames.
+
+eTLM frames are encrypted with AES-EAX using the identity key of the beacon. The nonce
+consists of the beacon time (with the lowest K bits cleared, K is the rotation exponent)
+and the salt of the frame, the 16 bit MIC is the truncated EAX tag. The keys and clocks
+of the beacons are taken from the registrations of an EIDResolver, the identity of the
+sender from the properties of the frame (beacon_id, see beacontools.eid).
+
+Decryption is done in a worker thread so that the scanner loop is not slowed down.
+"""
+import logging
+import struct
+import threading
+import time
+from collections import deque
+
+from .packet_types import EddystoneTLMFrame
+
+_LOGGER = logging.getLogger(__name__)
+
+_TIME = struct.Struct(">I")
+_SALT = struct.Struct("<H")
+# voltage, temperature, advertising count, seconds since boot (see UnencryptedTLMFrame)
+_TLM_DATA = struct.Struct(">HHII")
+_TLM_FIELDS = ('voltage', 'temperature', 'advertising_count', 'seconds_since_boot')
+
+
+def _load_crypto():
+    """Import the primitives which are needed for EAX."""
+    try:
+        # pylint: disable=import-outside-toplevel
+        from cryptography.hazmat.primitives import cmac
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    except ImportError as exc:
+        raise ImportError("eTLM decryption requires the cryptography package, "
+                          "install beacontools[crypto]") from exc
+    return cmac, Cipher, algorithms, modes
+
+
+class _KeyMaterial(object):
+    """Per beacon state which does not change between frames."""
+
+    def __init__(self, registration, crypto):
+        cmac, cipher, algorithms, modes = crypto
+        self.registration = registration
+        identity_key, self.rotation_exponent, self.clock_offset = registration
+        self._cmac = cmac
+        self._cipher = cipher
+        self._modes = modes
+        self._algorithm = algorithms.AES(identity_key)
+        # OMAC of the (empty) header
+        self.header_mac = self.omac(1, b"")
+
+    def omac(self, tweak, data):
+        """OMAC of data with tweak as defined by EAX."""
+        mac = self._cmac.CMAC(self._algorithm)
+        mac.update(b"\x00" * 15 + bytes([tweak]) + data)
+        return mac.finalize()
+
+    def find_nonce(self, timestamp, salt, mic, ciphertext, adjacent_periods):
+        """Find the nonce of a frame received at timestamp whose EAX tag matches mic.
+
+        The beacon time of the current rotation period is tried first, then the ones of
+        up to adjacent_periods before and after it.
+
+        Returns:
+            OMAC of the nonce (the initial counter) or None if no period matches
+        """
+        ciphertext_mac = self.omac(2, ciphertext)
+        exponent = self.rotation_exponent
+        period = int(timestamp - self.clock_offset) >> exponent
+        for delta in sorted(range(-adjacent_periods, adjacent_periods + 1), key=abs):
+            beacon_time = (period + delta) << exponent
+            if not 0 <= beacon_time <= 0xFFFFFFFF:
+                continue
+            nonce_mac = self.omac(0, _TIME.pack(beacon_time) + salt)
+            tag = bytes(a ^ b ^ c for a, b, c in zip(nonce_mac[:2], self.header_mac[:2],
+                                                       ciphertext_mac[:2]))
+            if tag == mic:
+                return nonce_mac
+        return None
+
+    def decrypt_ctr(self, counter, data):
+        """Decrypt data with AES-CTR starting at counter."""
+        decryptor = self._cipher(self._algorithm, self._modes.CTR(counter)).decryptor()
+        return decryptor.update(data) + decryptor.finalize()
+
+
+class ETLMDecryptor(object):
+    """Decrypt eTLM frames of beacons which are registered with an EIDResolver."""
+
+    def __init__(self, resolver, callback, max_queue=1024, batch_size=64, adjacent_periods=1):
+        """Initialize the decryptor.
+
+        Args:
+            resolver: EIDResolver with the registrations of the beacons
+            callback: Called from the worker thread with (bt_addr, rssi, packet, properties,
+                timestamp) for every decrypted frame, packet is an EddystoneTLMFrame
+            max_queue: Number of queued frames, the oldest frame is dropped when it is full
+            batch_size: Maximum number of frames which are decrypted at once
+            adjacent_periods: Number of rotation periods before and after the current one
+                which are tried, to tolerate clock drift of the beacons.
+        """
+        self._crypto = _load_crypto()
+        self.resolver = resolver
+        self.callback = callback
+        self.batch_size = batch_size
+        self.adjacent_periods = adjacent_periods
+        # beacon_id -> _KeyMaterial
+        self._keys = {}
+        self._queue = deque(maxlen=max_queue)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._keep_going = False
+        self.stats = {'queued': 0, 'dropped': 0, 'decrypted': 0, 'unknown_beacon': 0,
+                      'invalid_mic': 0}
+
+    def submit(self, bt_addr, rssi, packet, properties, timestamp=None):
+        """Queue an EddystoneEncryptedTLMFrame for decryption, never blocks."""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self.stats['dropped'] += 1
+            self._queue.append((bt_addr, rssi, packet, properties, timestamp))
+            self.stats['queued'] += 1
+            self._condition.notify()
+
+    def key_material(self, beacon_id):
+        """Get the cached key material of a beacon, None if it is not registered."""
+        registration = self.resolver.registration(beacon_id)
+        if registration is None:
+            self._keys.pop(beacon_id, None)
+            return None
+        material = self._keys.get(beacon_id)
+        if material is None or material.registration != registration:
+            material = _KeyMaterial(registration, self._crypto)
+            self._keys[beacon_id] = material
+        return material
+
+    def decrypt(self, beacon_id, packet, timestamp=None):
+        """Decrypt an EddystoneEncryptedTLMFrame.
+
+        Returns:
+            EddystoneTLMFrame or None if the beacon is unknown or the MIC does not match
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        material = self.key_material(beacon_id)
+        if material is None:
+            self.stats['unknown_beacon'] += 1
+            return None
+        ciphertext = bytes(packet.encrypted_data)
+        nonce_mac = material.find_nonce(timestamp, _SALT.pack(packet.salt), _SALT.pack(packet.mic),
+                                        ciphertext, self.adjacent_periods)
+        if nonce_mac is None:
+            self.stats['invalid_mic'] += 1
+            return None
+        plaintext = material.decrypt_ctr(nonce_mac, ciphertext)
+        self.stats['decrypted'] += 1
+        return EddystoneTLMFrame(dict(zip(_TLM_FIELDS, _TLM_DATA.unpack(plaintext))))
+
+    def process_batch(self, batch):
+        """Decrypt queued frames and call the callback for every successfully decrypted one."""
+        for bt_addr, rssi, packet, properties, timestamp in batch:
+            tlm = self.decrypt(properties['beacon_id'], packet, timestamp)
+            if tlm is not None:
+                self.callback(bt_addr, rssi, tlm, properties, timestamp)
+
+    def start(self):
+        """Start the worker thread."""
+        if self._thread is not None:
+            return
+        self._keep_going = True
+        self._thread = threading.Thread(target=self._run, name="ETLMDecryptor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread, queued frames are discarded."""
+        if self._thread is None:
+            return
+        with self._condition:
+            self._keep_going = False
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        """Take batches of frames from the queue and decrypt them."""
+        while True:
+            with self._condition:
+                while self._keep_going and not self._queue:
+                    self._condition.wait()
+                if not self._keep_going:
+                    return
+                batch = [self._queue.popleft()
+                         for _ in range(min(self.batch_size, len(self._queue)))]
+            try:
+                self.process_batch(batch)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Failed to process eTLM frames")
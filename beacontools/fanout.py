@@ -0,0 +1,556 @@
+"""Share the advertisements of one scanner with multiple local processes.
+
+A single BeaconScanner uses a BeaconPublisher as its callback. The publisher
+listens on a Unix domain socket, other processes attach with a BeaconSubscriber
+and their own device and packet filters. The filters are evaluated by the
+publisher on the already parsed packets, matching packets are sent in a compact
+binary encoding and restored on the subscriber side without parsing them again.
+
+Packet types of formats added with register_packet_format are sent with their class
+name, the subscriber must have registered the same formats to restore them.
+"""
+import errno
+import logging
+import os
+import selectors
+import socket
+import stat
+import struct
+import threading
+import time
+from collections import deque
+
+from . import device_filters
+from . import packet_types
+from .device_filters import DeviceFilter, check_filters, filters_match
+from .registry import find_packet_type
+from .utils import bt_addr_to_string, drain_socket, string_to_bt_addr
+
+_LOGGER = logging.getLogger(__name__)
+
+# all packet types which can be transferred, the index is used on the wire
+PACKET_TYPES = (
+    packet_types.EddystoneUIDFrame,
+    packet_types.EddystoneURLFrame,
+    packet_types.EddystoneEncryptedTLMFrame,
+    packet_types.EddystoneTLMFrame,
+    packet_types.EddystoneEIDFrame,
+    packet_types.IBeaconAdvertisement,
+    packet_types.EstimoteTelemetryFrameA,
+    packet_types.EstimoteTelemetryFrameB,
+    packet_types.EstimoteNearable,
+    packet_types.CJMonitorAdvertisement,
+    packet_types.ExposureNotificationFrame,
+)
+PACKET_TYPE_INDEX = {cls: index for index, cls in enumerate(PACKET_TYPES)}
+# index of all other packet types, followed by the name of the class
+REGISTERED_PACKET_TYPE = 0xFF
+
+# every message is prefixed with its length
+MESSAGE_HEADER = struct.Struct("<I")
+# timestamp, bt_addr, rssi, packet type
+RECORD_HEADER = struct.Struct("<d6sbB")
+# upper bound for messages from subscribers
+MAX_SUBSCRIPTION_SIZE = 65536
+# upper bound of the cached binary addresses of the publisher
+_MAX_ADDRESSES = 4096
+
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_LENGTH = struct.Struct("<H")
+
+
+def encode_value(value, out):
+    """Append the binary encoding of a simple value (None, bool, int, float, str, bytes
+    and tuples, lists or dicts of those) to the bytearray out."""
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, int):
+        out += b"i"
+        out += _INT.pack(value)
+    elif isinstance(value, float):
+        out += b"f"
+        out += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        out += b"s"
+        out += _LENGTH.pack(len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out += b"b"
+        out += _LENGTH.pack(len(value))
+        out += value
+    elif isinstance(value, (tuple, list)):
+        out += b"t" if isinstance(value, tuple) else b"l"
+        out += _LENGTH.pack(len(value))
+        for item in value:
+            encode_value(item, out)
+    elif isinstance(value, dict):
+        out += b"d"
+        out += _LENGTH.pack(len(value))
+        for key, item in value.items():
+            encode_value(key, out)
+            encode_value(item, out)
+    else:
+        raise ValueError("Can't encode value of type {}".format(type(value).__name__))
+
+
+def _decode_constant(value):
+    """Decoder of a value without data."""
+    return lambda data, offset: (value, offset)
+
+
+def _decode_struct(fmt):
+    """Decoder of a value packed with the struct fmt."""
+    return lambda data, offset: (fmt.unpack_from(data, offset)[0], offset + fmt.size)
+
+
+def _decode_length(data, offset):
+    """Decode the length prefix of a variable length value."""
+    return _LENGTH.unpack_from(data, offset)[0], offset + _LENGTH.size
+
+
+def _decode_bytes(data, offset):
+    """Decode length prefixed bytes."""
+    length, offset = _decode_length(data, offset)
+    if offset + length > len(data):
+        raise ValueError("Value exceeds data")
+    return bytes(data[offset:offset + length]), offset + length
+
+
+def _decode_str(data, offset):
+    """Decode a length prefixed UTF-8 string."""
+    value, offset = _decode_bytes(data, offset)
+    return value.decode("utf-8"), offset
+
+
+def _decode_list(data, offset):
+    """Decode a list of values."""
+    length, offset = _decode_length(data, offset)
+    items = []
+    for _ in range(length):
+        item, offset = decode_value(data, offset)
+        items.append(item)
+    return items, offset
+
+
+def _decode_tuple(data, offset):
+    """Decode a tuple of values."""
+    items, offset = _decode_list(data, offset)
+    return tuple(items), offset
+
+
+def _decode_dict(data, offset):
+    """Decode a dict of values."""
+    length, offset = _decode_length(data, offset)
+    items = {}
+    for _ in range(length):
+        key, offset = decode_value(data, offset)
+        items[key], offset = decode_value(data, offset)
+    return items, offset
+
+
+# tag (byte value) -> decoder which takes the data and the offset after the tag and returns the value
+# and the offset after it
+_DECODERS = {
+    ord("N"): _decode_constant(None),
+    ord("T"): _decode_constant(True),
+    ord("F"): _decode_constant(False),
+    ord("i"): _decode_struct(_INT),
+    ord("f"): _decode_struct(_FLOAT),
+    ord("s"): _decode_str,
+    ord("b"): _decode_bytes,
+    ord("t"): _decode_tuple,
+    ord("l"): _decode_list,
+    ord("d"): _decode_dict,
+}
+
+
+def decode_value(data, offset=0):
+    """Decode a value encoded with encode_value, returns the value and the offset after it.
+
+    Raises:
+        ValueError: The data is malformed
+    """
+    if offset >= len(data):
+        raise ValueError("Truncated value")
+    decoder = _DECODERS.get(data[offset])
+    if decoder is None:
+        raise ValueError("Unknown tag {!r}".format(bytes(data[offset:offset + 1])))
+    try:
+        return decoder(data, offset + 1)
+    except struct.error as exc:
+        raise ValueError("Truncated value") from exc
+
+
+def encode_record(timestamp, bt_addr, rssi, packet, properties):
+    """Encode an advertisement as delivered to the scanner callback into a message.
+
+    bt_addr is the binary address (see string_to_bt_addr).
+
+    Raises:
+        ValueError: The packet has attributes which can't be encoded
+    """
+    out = bytearray(MESSAGE_HEADER.size)
+    cls = type(packet)
+    type_index = PACKET_TYPE_INDEX.get(cls, REGISTERED_PACKET_TYPE)
+    out += RECORD_HEADER.pack(timestamp, bt_addr, rssi, type_index)
+    if type_index == REGISTERED_PACKET_TYPE:
+        encode_value(cls.__name__, out)
+    encode_value(properties, out)
+    # the packet classes keep their decoded values in plain attributes
+    encode_value(vars(packet), out)
+    MESSAGE_HEADER.pack_into(out, 0, len(out) - MESSAGE_HEADER.size)
+    return bytes(out)
+
+
+def decode_record(data):
+    """Decode a message created by encode_record (without the length prefix).
+
+    Returns:
+        Tuple of timestamp, bt_addr, rssi, packet, properties
+
+    Raises:
+        ValueError: The data is malformed or the packet type is unknown
+    """
+    timestamp, bt_addr, rssi, type_index = RECORD_HEADER.unpack_from(data)
+    offset = RECORD_HEADER.size
+    if type_index == REGISTERED_PACKET_TYPE:
+        name, offset = decode_value(data, offset)
+        cls = find_packet_type(name)
+        if cls is None:
+            raise ValueError("Unknown packet type {}".format(name))
+    elif type_index < len(PACKET_TYPES):
+        cls = PACKET_TYPES[type_index]
+    else:
+        raise ValueError("Unknown packet type index {}".format(type_index))
+    properties, offset = decode_value(data, offset)
+    state, _ = decode_value(data, offset)
+    packet = cls.__new__(cls)
+    packet.__dict__.update(state)
+    return timestamp, bt_addr_to_string(bt_addr), rssi, packet, properties
+
+
+def encode_subscription(device_filter, packet_filter):
+    """Encode (validated) filters of a subscriber into a message."""
+    out = bytearray(MESSAGE_HEADER.size)
+    encode_value({
+        "device_filter": [{"type": type(filtr).__name__, "properties": filtr.properties}
+                          for filtr in device_filter or []],
+        "packet_filter": [cls.__name__ for cls in packet_filter or []],
+    }, out)
+    MESSAGE_HEADER.pack_into(out, 0, len(out) - MESSAGE_HEADER.size)
+    return bytes(out)
+
+
+def decode_subscription(data):
+    """Decode filters encoded with encode_subscription.
+
+    Raises:
+        ValueError: The subscription is malformed or contains unknown filters
+    """
+    subscription, _ = decode_value(data)
+    try:
+        device_filter = []
+        for desc in subscription["device_filter"]:
+            cls = getattr(device_filters, desc["type"], None)
+            if not isinstance(cls, type) or not issubclass(cls, DeviceFilter) or cls is DeviceFilter:
+                raise ValueError("Unknown device filter {}".format(desc["type"]))
+            # restore the filter as it was, the constructors might add default values
+            filtr = cls.__new__(cls)
+            DeviceFilter.__init__(filtr)
+            filtr.properties.update(desc["properties"])
+            device_filter.append(filtr)
+        packet_filter = []
+        for name in subscription["packet_filter"]:
+            cls = getattr(packet_types, name, None)
+            if cls not in PACKET_TYPE_INDEX:
+                cls = find_packet_type(name)
+            if cls is None:
+                raise ValueError("Unknown packet type {}".format(name))
+            packet_filter.append(cls)
+    except (KeyError, TypeError) as exc:
+        raise ValueError("Malformed subscription") from exc
+    return check_filters(device_filter, packet_filter)
+
+
+class _Subscriber(object):
+    """State of a connected subscriber."""
+
+    def __init__(self, sock, number, max_queue):
+        self.sock = sock
+        self.number = number
+        self.subscribed = False
+        self.device_filter = None
+        self.packet_filter = None
+        # encoded records which have not been sent yet
+        self.queue = deque()
+        self.max_queue = max_queue
+        self.inbuf = bytearray()
+        self.outbuf = b""
+        self.sent = 0
+        self.dropped = 0
+
+    def enqueue(self, record):
+        """Queue a record, drops the oldest one if the subscriber is too slow."""
+        if len(self.queue) >= self.max_queue:
+            try:
+                self.queue.popleft()
+                self.dropped += 1
+            except IndexError:
+                pass
+        self.queue.append(record)
+
+    def stats(self):
+        """Counters of this subscriber."""
+        return {'sent': self.sent, 'dropped': self.dropped, 'lag': len(self.queue)}
+
+
+class BeaconPublisher(object):
+    """Publish the advertisements of a BeaconScanner to BeaconSubscribers.
+
+    Pass an instance as callback to a BeaconScanner. Slow subscribers don't block the
+    scanner: every subscriber has a queue of at most max_queue records, if it is full
+    the oldest record is dropped and counted.
+    """
+
+    def __init__(self, path, max_queue=1024):
+        """Initialize publisher listening on the Unix domain socket at path."""
+        self.path = path
+        self.max_queue = max_queue
+        self._subscribers = []
+        self._server = None
+        self._thread = None
+        self._keep_going = True
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._wakeup_pending = False
+        self._next_number = 0
+        # address string -> binary address, only used by the scanner thread
+        self._bt_addr_keys = {}
+
+    def start(self):
+        """Start listening for subscribers.
+
+        Raises:
+            FileExistsError: Something else than a (stale) socket exists at path
+        """
+        try:
+            mode = os.lstat(self.path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError(errno.EEXIST, "Not a socket", self.path)
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        self._server.setblocking(False)
+        self._thread = threading.Thread(target=self._run, name="BeaconPublisher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Disconnect all subscribers and stop listening."""
+        self._keep_going = False
+        self._wakeup()
+        if self._thread is not None:
+            self._thread.join()
+        for sub in self._subscribers:
+            sub.sock.close()
+        self._subscribers = []
+        if self._server is not None:
+            self._server.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+    def stats(self):
+        """Counters (sent, dropped and lag in records) per subscriber number."""
+        return {sub.number: sub.stats() for sub in self._subscribers}
+
+    def __call__(self, bt_addr, rssi, packet, properties):
+        """Scanner callback, queue the advertisement for all matching subscribers."""
+        record = None
+        bt_addr_key = self._bt_addr_keys.get(bt_addr)
+        if bt_addr_key is None:
+            if len(self._bt_addr_keys) >= _MAX_ADDRESSES:
+                self._bt_addr_keys = {}
+            bt_addr_key = self._bt_addr_keys[bt_addr] = string_to_bt_addr(bt_addr)
+        for sub in self._subscribers:
+            if not sub.subscribed or \
+               not filters_match(bt_addr_key, packet, properties, sub.device_filter, sub.packet_filter):
+                continue
+            if record is None:
+                try:
+                    record = encode_record(time.time(), bt_addr_key, rssi, packet, properties)
+                except ValueError as exc:
+                    # never raise into the scanner thread
+                    _LOGGER.warning("Can't publish %s: %s", type(packet).__name__, exc)
+                    return
+            sub.enqueue(record)
+        if record is not None and not self._wakeup_pending:
+            self._wakeup_pending = True
+            self._wakeup()
+
+    def _wakeup(self):
+        """Wake up the sending thread."""
+        try:
+            self._wakeup_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self):
+        """Accept subscribers and send the queued records."""
+        selector = selectors.DefaultSelector()
+        selector.register(self._server, selectors.EVENT_READ)
+        selector.register(self._wakeup_r, selectors.EVENT_READ)
+        while self._keep_going:
+            for key, events in selector.select():
+                if key.fileobj is self._server:
+                    self._accept(selector)
+                elif key.fileobj is self._wakeup_r:
+                    self._wakeup_pending = False
+                    drain_socket(self._wakeup_r)
+                elif events & selectors.EVENT_READ:
+                    self._receive(selector, key.data)
+            for sub in list(self._subscribers):
+                self._flush(selector, sub)
+        selector.close()
+
+    def _accept(self, selector):
+        """Accept a new subscriber."""
+        try:
+            sock, _ = self._server.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sub = _Subscriber(sock, self._next_number, self.max_queue)
+        self._next_number += 1
+        selector.register(sock, selectors.EVENT_READ, sub)
+        # copy on write, the list is read by the scanner thread
+        self._subscribers = self._subscribers + [sub]
+
+    def _remove(self, selector, sub):
+        """Disconnect a subscriber."""
+        selector.unregister(sub.sock)
+        sub.sock.close()
+        self._subscribers = [other for other in self._subscribers if other is not sub]
+
+    def _receive(self, selector, sub):
+        """Read the subscription message of a subscriber."""
+        try:
+            data = sub.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data or sub.subscribed:
+            # subscribers only send a single message, everything else is a disconnect
+            self._remove(selector, sub)
+            return
+        sub.inbuf += data
+        if len(sub.inbuf) < MESSAGE_HEADER.size:
+            return
+        length = MESSAGE_HEADER.unpack_from(sub.inbuf)[0]
+        if length > MAX_SUBSCRIPTION_SIZE:
+            self._remove(selector, sub)
+            return
+        if len(sub.inbuf) < MESSAGE_HEADER.size + length:
+            return
+        try:
+            sub.device_filter, sub.packet_filter = decode_subscription(
+                bytes(sub.inbuf[MESSAGE_HEADER.size:MESSAGE_HEADER.size + length]))
+        except ValueError as exc:
+            _LOGGER.warning("Invalid subscription: %s", exc)
+            self._remove(selector, sub)
+            return
+        sub.inbuf = bytearray()
+        sub.subscribed = True
+
+    def _flush(self, selector, sub):
+        """Send as much queued data as possible without blocking."""
+        while True:
+            if not sub.outbuf:
+                records = []
+                while sub.queue and len(records) < 64:
+                    records.append(sub.queue.popleft())
+                if not records:
+                    break
+                sub.outbuf = b"".join(records)
+                sub.sent += len(records)
+            try:
+                sent = sub.sock.send(sub.outbuf)
+            except BlockingIOError:
+                break
+            except OSError:
+                self._remove(selector, sub)
+                return
+            sub.outbuf = sub.outbuf[sent:]
+            if sub.outbuf:
+                break
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if sub.outbuf else 0)
+        if selector.get_key(sub.sock).events != events:
+            selector.modify(sub.sock, events, sub)
+
+
+class BeaconSubscriber(object):
+    """Receive advertisements from a BeaconPublisher.
+
+    Behaves like a BeaconScanner: the callback is called with bt_addr, rssi, packet and
+    properties for every advertisement which passes the filters.
+    """
+
+    def __init__(self, callback, path, device_filter=None, packet_filter=None):
+        """Initialize subscriber."""
+        self.callback = callback
+        self.path = path
+        self.device_filter, self.packet_filter = check_filters(device_filter, packet_filter)
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        """Connect to the publisher and start receiving advertisements."""
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(self.path)
+        self._sock.sendall(encode_subscription(self.device_filter, self.packet_filter))
+        self._thread = threading.Thread(target=self._run, name="BeaconSubscriber")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Disconnect from the publisher."""
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._thread.join()
+        self._sock.close()
+
+    def _run(self):
+        """Receive records and call the callback."""
+        stream = self._sock.makefile("rb")
+        while True:
+            header = stream.read(MESSAGE_HEADER.size)
+            if len(header) < MESSAGE_HEADER.size:
+                break
+            length = MESSAGE_HEADER.unpack(header)[0]
+            data = stream.read(length)
+            if len(data) < length:
+                break
+            try:
+                _, bt_addr, rssi, packet, properties = decode_record(data)
+            except ValueError as exc:
+                _LOGGER.warning("Skipping record: %s", exc)
+                continue
+            self.callback(bt_addr, rssi, packet, properties)
+        stream.close()
@@ -0,0 +1,140 @@
+"""Detect and shed addresses which flood the scanner with advertisements.
+
+A few misbehaving (or malicious) devices can send most of the advertisements in a
+crowded place. The guard counts advertisements per address with the space-saving
+algorithm, which finds the most frequent addresses of a stream with a fixed number of
+counters no matter how many distinct addresses are seen. An address which sends more
+than max_rate advertisements per second is shed (dropped before parsing) for a while.
+"""
+import time
+
+from .utils import bt_addr_to_string, string_to_bt_addr
+
+
+class SpaceSaving(object):
+    """Approximate counts of the most frequent keys of a stream (Metwally et al.).
+
+    Every key with a frequency above 1/capacity of the stream is guaranteed to be counted,
+    a count overestimates the true frequency by at most its error.
+    """
+
+    def __init__(self, capacity=64):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        # key -> [count, error]
+        self._counters = {}
+
+    def add(self, key):
+        """Count key, returns its (count, error)."""
+        counter = self._counters.get(key)
+        if counter is None:
+            if len(self._counters) < self.capacity:
+                counter = self._counters[key] = [0, 0]
+            else:
+                # the new key takes over the smallest counter, O(capacity)
+                evicted = min(self._counters, key=lambda k: self._counters[k][0])
+                count = self._counters.pop(evicted)[0]
+                counter = self._counters[key] = [count, count]
+        counter[0] += 1
+        return counter[0], counter[1]
+
+    def top(self, count=None):
+        """(key, count, error) tuples sorted by count, descending."""
+        items = sorted(((key, counter[0], counter[1]) for key, counter in self._counters.items()),
+                       key=lambda item: item[1], reverse=True)
+        return items if count is None else items[:count]
+
+    def clear(self):
+        """Forget all counts."""
+        self._counters.clear()
+
+    def __len__(self):
+        return len(self._counters)
+
+
+class FloodGuard(object):
+    """Shed addresses which send more than max_rate advertisements per second.
+
+    Pass an instance as flood_guard to an AdmissionPolicy, it is asked before an
+    advertisement is prefiltered or parsed. The cost per advertisement is bounded by the
+    capacity of the counters, also when every advertisement comes from a new address.
+    """
+
+    def __init__(self, max_rate=50.0, window=1.0, shed_time=30.0, capacity=64):
+        """Initialize the guard.
+
+        Args:
+            max_rate: Advertisements per second above which an address is shed
+            window: Seconds over which the advertisements are counted
+            shed_time: Seconds for which the advertisements of a flooding address are dropped
+            capacity: Number of counters, addresses which send less than 1/capacity of all
+                advertisements of a window may be missed
+        """
+        if max_rate <= 0 or window <= 0 or shed_time <= 0:
+            raise ValueError("max_rate, window and shed_time must be positive")
+        self.max_rate = max_rate
+        self.window = window
+        self.shed_time = shed_time
+        self._threshold = max_rate * window
+        self._counters = SpaceSaving(capacity)
+        self._window_end = None
+        # binary address -> monotonic time until which it is shed
+        self._shed = {}
+        # top talkers of the last complete window
+        self._top = []
+        self.stats = {'detected': 0, 'shed': 0}
+
+    def admit(self, bt_addr, now=None):
+        """Count an advertisement of bt_addr (binary), returns False if it should be dropped."""
+        if now is None:
+            now = time.monotonic()
+        if self._window_end is None:
+            self._window_end = now + self.window
+        elif now >= self._window_end:
+            self._close_window(now)
+
+        shed_until = self._shed.get(bt_addr)
+        if shed_until is not None:
+            if now < shed_until:
+                self.stats['shed'] += 1
+                return False
+            del self._shed[bt_addr]
+
+        count, error = self._counters.add(bt_addr)
+        if count - error > self._threshold:
+            # guaranteed to be above the rate, no need to wait for the end of the window
+            self._shed[bt_addr] = now + self.shed_time
+            self.stats['detected'] += 1
+            self.stats['shed'] += 1
+            return False
+        return True
+
+    def _close_window(self, now):
+        """Remember the top talkers, expire sheds and start a new window."""
+        self._top = self._counters.top()
+        self._counters.clear()
+        self._shed = {addr: until for addr, until in self._shed.items() if until > now}
+        # skip windows without advertisements
+        self._window_end += ((now - self._window_end) // self.window + 1) * self.window
+
+    def top_talkers(self, count=10):
+        """Most active addresses of the last complete window as (bt_addr, rate) tuples.
+
+        The rate is in advertisements per second and may be overestimated for addresses
+        which were counted late in the window.
+        """
+        return [(bt_addr_to_string(addr), addr_count / self.window)
+                for addr, addr_count, _ in self._top[:count]]
+
+    def shed_addresses(self, now=None):
+        """Addresses which are currently shed with the seconds until they are admitted again."""
+        if now is None:
+            now = time.monotonic()
+        # copy, the scanner thread modifies the dict
+        return {bt_addr_to_string(addr): until - now
+                for addr, until in list(self._shed.items()) if until > now}
+
+    def forgive(self, bt_addr):
+        """Admit the advertisements of an address (e.g. "aa:bb:cc:dd:ee:ff") again."""
+        self._shed.pop(string_to_bt_addr(bt_addr), None)
@@ -0,0 +1,213 @@
+"""Detect failing beacons from their telemetry.
+
+The detector keeps a constant amount of state per beacon and reports health events when
+the uptime of a beacon goes backwards (reboot), its advertising counter is reset, its
+battery drains faster than a threshold or it reports a firmware or clock error. The drain
+is the slope of an exponentially weighted least squares fit of the battery voltage (or
+level) over time, so that old measurements fade out without being stored.
+"""
+import time
+from collections import namedtuple
+
+from .downsampling import beacon_identity
+from .packet_types import EddystoneTLMFrame, EstimoteTelemetryFrameA, EstimoteTelemetryFrameB
+
+REBOOT = 'reboot'
+COUNTER_RESET = 'counter_reset'
+BATTERY_DRAIN = 'battery_drain'
+FIRMWARE_ERROR = 'firmware_error'
+CLOCK_ERROR = 'clock_error'
+
+# active is False when a condition (drain or error flag) is over, value depends on the
+# event: the uptime or count before the reset, the drain per day or None for error flags
+HealthEvent = namedtuple('HealthEvent', ('event', 'beacon', 'timestamp', 'active', 'value'))
+
+_DAY = 86400.0
+# the uptime and advertising count of Eddystone TLM frames are 32 bit counters
+_COUNTER_RANGE = 1 << 32
+
+
+class _DrainFit(object):
+    """Exponentially weighted linear regression of a battery value over time."""
+
+    __slots__ = ('origin', 'first', 'last', 'samples', 'weight', 'sum_t', 'sum_v', 'sum_tt',
+                 'sum_tv')
+
+    def __init__(self, timestamp):
+        self.origin = timestamp
+        self.first = timestamp
+        self.last = timestamp
+        self.samples = 0
+        self.weight = self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+
+    def add(self, timestamp, value, half_life):
+        """Add a measurement."""
+        if timestamp > self.last:
+            decay = 0.5 ** ((timestamp - self.last) / half_life)
+            self.weight *= decay
+            self.sum_t *= decay
+            self.sum_v *= decay
+            self.sum_tt *= decay
+            self.sum_tv *= decay
+            self.last = timestamp
+        # days since the first measurement
+        t = (timestamp - self.origin) / _DAY
+        self.samples += 1
+        self.weight += 1.0
+        self.sum_t += t
+        self.sum_v += value
+        self.sum_tt += t * t
+        self.sum_tv += t * value
+
+    def slope(self):
+        """Change of the value per day, None if all measurements were taken at once."""
+        denominator = self.weight * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 1e-12 * self.weight * self.weight:
+            return None
+        return (self.weight * self.sum_tv - self.sum_t * self.sum_v) / denominator
+
+
+class _BeaconHealth(object):
+    """State of one beacon."""
+
+    __slots__ = ('uptime', 'resolution', 'count', 'fit', 'draining', 'firmware_error',
+                 'clock_error')
+
+    def __init__(self):
+        self.uptime = None
+        self.resolution = 0
+        self.count = None
+        self.fit = None
+        self.draining = False
+        self.firmware_error = False
+        self.clock_error = False
+
+
+class HealthMonitor(object):
+    """Report health events of beacons which send telemetry.
+
+    Can be used as the callback of a BeaconScanner, packets without telemetry are ignored.
+    """
+
+    def __init__(self, callback, voltage_drain=20.0, battery_level_drain=2.0,
+                 half_life=3 * _DAY, min_span=_DAY / 4, min_samples=10):
+        """Initialize the monitor.
+
+        Args:
+            callback: Called with a HealthEvent
+            voltage_drain: Battery drain in mV per day above which BATTERY_DRAIN is reported
+            battery_level_drain: Drain of the battery level in percent per day above which
+                BATTERY_DRAIN is reported (Estimote beacons which report a level)
+            half_life: Seconds after which the weight of a battery measurement is halved
+            min_span: Seconds of battery measurements before the drain is evaluated
+            min_samples: Number of battery measurements before the drain is evaluated
+        """
+        if half_life <= 0:
+            raise ValueError("half_life must be positive")
+        self.callback = callback
+        self.voltage_drain = voltage_drain
+        self.battery_level_drain = battery_level_drain
+        self.half_life = half_life
+        self.min_span = min_span
+        self.min_samples = min_samples
+        # beacon identity -> _BeaconHealth
+        self._beacons = {}
+
+    def __call__(self, bt_addr, rssi, packet, properties):  # pylint: disable=unused-argument
+        """Scanner callback."""
+        if isinstance(packet, (EddystoneTLMFrame, EstimoteTelemetryFrameA,
+                               EstimoteTelemetryFrameB)):
+            self.add(beacon_identity(bt_addr, packet, properties), packet)
+
+    def add(self, beacon, packet, timestamp=None):
+        """Check the telemetry of a packet sent by beacon at timestamp (defaults to now)."""
+        if timestamp is None:
+            timestamp = time.time()
+        state = self._beacons.get(beacon)
+        if state is None:
+            state = self._beacons[beacon] = _BeaconHealth()
+
+        if isinstance(packet, EddystoneTLMFrame):
+            self._check_uptime(beacon, state, timestamp, packet.seconds_since_boot, 1,
+                               packet.advertising_count, True)
+            self._check_battery(beacon, state, timestamp, packet.voltage or None,
+                                self.voltage_drain)
+        elif isinstance(packet, EstimoteTelemetryFrameB):
+            self._check_uptime(beacon, state, timestamp, packet.uptime, packet.uptime_unit,
+                               None, False)
+            if packet.battery_level is not None:
+                self._check_battery(beacon, state, timestamp, packet.battery_level,
+                                    self.battery_level_drain)
+            else:
+                self._check_battery(beacon, state, timestamp, packet.voltage,
+                                    self.voltage_drain)
+
+        # only reported by Estimote telemetry
+        firmware_error = getattr(packet, 'has_firmware_error', None)
+        if firmware_error is not None:
+            self._check_flag(beacon, state, timestamp, FIRMWARE_ERROR, firmware_error)
+        clock_error = getattr(packet, 'has_clock_error', None)
+        if clock_error is not None:
+            self._check_flag(beacon, state, timestamp, CLOCK_ERROR, clock_error)
+
+    def forget(self, beacon):
+        """Drop the state of a beacon."""
+        self._beacons.pop(beacon, None)
+
+    def _check_uptime(self, beacon, state, timestamp, uptime, resolution, count, wraps):
+        """Report reboots and counter resets.
+
+        The uptime may be rounded down to its resolution (which can change between frames),
+        so it has to go back by more than one unit. If wraps is set, the uptime and count are
+        32 bit counters which are allowed to wrap around.
+        """
+        tolerance = max(resolution, state.resolution)
+        if state.uptime is not None and _went_back(state.uptime, uptime, tolerance, wraps):
+            self.callback(HealthEvent(REBOOT, beacon, timestamp, True, state.uptime))
+            # the battery may have been replaced
+            state.fit = None
+            state.draining = False
+        elif state.count is not None and count is not None and \
+                _went_back(state.count, count, 0, wraps):
+            self.callback(HealthEvent(COUNTER_RESET, beacon, timestamp, True, state.count))
+        state.uptime = uptime
+        state.resolution = resolution
+        state.count = count
+
+    def _check_battery(self, beacon, state, timestamp, value, threshold):
+        """Update the drain of the battery and report when it exceeds threshold."""
+        if value is None:
+            return
+        fit = state.fit
+        if fit is None:
+            fit = state.fit = _DrainFit(timestamp)
+        fit.add(timestamp, value, self.half_life)
+        if fit.samples < self.min_samples or fit.last - fit.first < self.min_span:
+            return
+        slope = fit.slope()
+        if slope is None:
+            return
+        drain = -slope
+        if not state.draining and drain > threshold:
+            state.draining = True
+            self.callback(HealthEvent(BATTERY_DRAIN, beacon, timestamp, True, drain))
+        elif state.draining and drain <= threshold / 2:
+            state.draining = False
+            self.callback(HealthEvent(BATTERY_DRAIN, beacon, timestamp, False, drain))
+
+    def _check_flag(self, beacon, state, timestamp, event, value):
+        """Report when an error flag is set or cleared."""
+        if getattr(state, event) != value:
+            setattr(state, event, value)
+            self.callback(HealthEvent(event, beacon, timestamp, value, None))
+
+
+def _went_back(previous, value, tolerance, wraps):
+    """Check if a counter went back from previous to value by more than tolerance.
+
+    A wrapping counter went back if it is behind previous by less than half of its range
+    (serial number arithmetic), otherwise it has wrapped around.
+    """
+    if wraps:
+        return tolerance < (previous - value) % _COUNTER_RANGE <= _COUNTER_RANGE // 2
+    return previous - value > tolerance
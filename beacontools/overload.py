@@ -0,0 +1,152 @@
+"""Shed load in a controlled way when advertisements arrive faster than they are processed.
+
+Without load shedding the advertisements back up in the receive buffer of the socket and
+the kernel drops them at random once it is full, no matter which beacons they come from.
+The controller watches how many advertisements are waiting whenever the scanner wakes up
+(backlog) and which fraction of the time the scanner is busy (load). If either is above
+its budget, the scanner switches to a degraded mode in which it only parses every n-th
+advertisement of a device and skips telemetry frames while identity frames (UID, EID,
+iBeacon...) are still delivered. Beacons matching the priority filters are always
+processed completely.
+"""
+import logging
+
+from .device_filters import check_filters, filters_match
+from .packet_types import EddystoneTLMFrame, EddystoneEncryptedTLMFrame, \
+                          EstimoteTelemetryFrameA, EstimoteTelemetryFrameB
+
+NORMAL = 'normal'
+DEGRADED = 'degraded'
+
+# frames which are skipped in degraded mode
+TELEMETRY_TYPES = (EddystoneTLMFrame, EddystoneEncryptedTLMFrame, EstimoteTelemetryFrameA,
+                   EstimoteTelemetryFrameB)
+
+# upper bound of the addresses which are tracked for sampling and priority
+_MAX_ADDRESSES = 4096
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class OverloadController(object):
+    """Switch a scanner to a degraded mode while it is overloaded.
+
+    Pass an instance as overload_controller to the AdmissionPolicy of a BeaconScanner. The
+    scanner reports every batch of advertisements it reads, the mode is evaluated once per
+    interval.
+    """
+
+    def __init__(self, max_load=0.8, max_backlog=32, sample_rate=4, priority_filter=None,
+                 interval=1.0, hold_time=10.0, on_transition=None):
+        """Initialize the controller.
+
+        Args:
+            max_load: Fraction of the time the scanner may be busy before it is overloaded
+            max_backlog: Number of advertisements waiting at once before it is overloaded
+            sample_rate: Only every sample_rate-th advertisement of a device is parsed in
+                degraded mode
+            priority_filter: Device filters (e.g. BtAddrFilter, IBeaconFilter) of beacons
+                which are always processed completely
+            interval: Seconds over which load and backlog are measured
+            hold_time: Minimum seconds in degraded mode, the scanner goes back to normal mode
+                once load and backlog have dropped to half of their budget
+            on_transition: Called with the new mode and a copy of stats on every transition
+        """
+        if not 0 < max_load <= 1:
+            raise ValueError("max_load must be between 0 and 1")
+        if max_backlog < 1 or sample_rate < 1:
+            raise ValueError("max_backlog and sample_rate must be positive")
+        self.max_load = max_load
+        self.max_backlog = max_backlog
+        self.sample_rate = sample_rate
+        self.priority_filter, _ = check_filters(priority_filter, None)
+        self.interval = interval
+        self.hold_time = hold_time
+        self.on_transition = on_transition
+        self.mode = NORMAL
+        # read by the scanner for every advertisement
+        self.degraded = False
+        self._since = None
+        self._interval_start = None
+        self._busy = 0.0
+        self._packets = 0
+        self._backlog = 0
+        # binary address -> number of advertisements seen in degraded mode
+        self._seen = {}
+        # binary addresses of beacons which matched the priority filters
+        self._priority = set()
+        self.stats = {
+            'mode': NORMAL,
+            'transitions': 0,
+            'load': 0.0,
+            'backlog': 0,
+            'latency': 0.0,
+            'sampled_out': 0,
+            'telemetry_skipped': 0,
+        }
+
+    def record_batch(self, count, started, finished):
+        """Account a batch of count advertisements processed from started to finished."""
+        if self._interval_start is None:
+            self._interval_start = started
+        self._busy += finished - started
+        self._packets += count
+        self._backlog = max(self._backlog, count)
+        if finished - self._interval_start >= self.interval:
+            self._evaluate(finished)
+
+    def _evaluate(self, now):
+        """Measure the last interval and switch the mode if necessary."""
+        load = self._busy / (now - self._interval_start)
+        self.stats['load'] = load
+        self.stats['backlog'] = self._backlog
+        self.stats['latency'] = self._busy / self._packets if self._packets else 0.0
+        overloaded = load > self.max_load or self._backlog >= self.max_backlog
+        relaxed = load <= self.max_load / 2 and self._backlog <= self.max_backlog / 2
+        self._interval_start = now
+        self._busy = 0.0
+        self._packets = 0
+        self._backlog = 0
+
+        if not self.degraded and overloaded:
+            self._switch(DEGRADED, now)
+        elif self.degraded and relaxed and now - self._since >= self.hold_time:
+            self._switch(NORMAL, now)
+
+    def _switch(self, mode, now):
+        """Change the mode and report the transition."""
+        _LOGGER.info("Switching to %s mode (load %.2f, backlog %d)", mode, self.stats['load'],
+                     self.stats['backlog'])
+        self.mode = mode
+        self.degraded = mode == DEGRADED
+        self._since = now
+        self._seen = {}
+        self.stats['mode'] = mode
+        self.stats['transitions'] += 1
+        if self.on_transition is not None:
+            self.on_transition(mode, dict(self.stats))
+
+    def admit(self, bt_addr):
+        """Decide in degraded mode if an advertisement of bt_addr (binary) is parsed."""
+        if bt_addr in self._priority:
+            return True
+        seen = self._seen.get(bt_addr, 0)
+        if seen == 0 and len(self._seen) >= _MAX_ADDRESSES:
+            self._seen = {}
+        self._seen[bt_addr] = seen + 1
+        if seen % self.sample_rate:
+            self.stats['sampled_out'] += 1
+            return False
+        return True
+
+    def keep(self, bt_addr, packet, properties):
+        """Decide if a parsed packet is delivered, learns the addresses of priority beacons."""
+        if self.priority_filter is not None and \
+                filters_match(bt_addr, packet, properties, self.priority_filter, None):
+            if len(self._priority) < _MAX_ADDRESSES:
+                self._priority.add(bt_addr)
+            return True
+        if self.degraded and isinstance(packet, TELEMETRY_TYPES):
+            self.stats['telemetry_skipped'] += 1
+            return False
+        return True
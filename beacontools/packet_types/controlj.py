@@ -1,24 +1,24 @@
 """Packet classes for Control-J Monitors."""
-from ..utils import mulaw_to_value, data_to_binstring
-from ..const import MANUFACTURER_SPECIFIC_DATA_TYPE, CJ_TEMPHUM_TYPE, COMPLETE_LOCALE_NAME_DATA_TYPE
+from ..utils import mulaw_to_value
+from ..const import CJ_TEMPHUM_TYPE
 
 class CJMonitorAdvertisement(object):
     """CJ Monitor advertisement."""
 
-    def __init__(self, frame):
-
-        for ltv in frame:
-            if ltv['type'] == MANUFACTURER_SPECIFIC_DATA_TYPE:
-                msd = ltv['value']
-                self._company_id = msd['company_identifier']
-                self._beacon_type = msd['data']['beacon_type']
-                if self._beacon_type == CJ_TEMPHUM_TYPE:
-                    data = msd['data']['data']
-                    self._temperature = data['temperature'] / 100.0
-                    self._humidity = data['humidity']
-                    self._light = mulaw_to_value(data['light']) / 10.0
-            elif ltv['type'] == COMPLETE_LOCALE_NAME_DATA_TYPE:
-                self._name = data_to_binstring(ltv['value']).decode("ascii")
+    def __init__(self, company_id, msd, name=None):
+        """Initialize from the company id, the manufacturer specific data (CJMonitorMSD) and
+        the complete local name of the advertisement."""
+        self._company_id = company_id
+        self._beacon_type = msd['beacon_type']
+        self._name = name
+        self._temperature = None
+        self._humidity = None
+        self._light = None
+        if self._beacon_type == CJ_TEMPHUM_TYPE:
+            data = msd['data']
+            self._temperature = data['temperature'] / 100.0
+            self._humidity = data['humidity']
+            self._light = mulaw_to_value(data['light']) / 10.0
 
     @property
     def name(self):
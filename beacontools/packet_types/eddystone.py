@@ -1,15 +1,37 @@
 """Packet classes for Eddystone beacons."""
+import sys
 from binascii import hexlify
+from functools import lru_cache
 from ..const import EDDYSTONE_URL_SCHEMES, EDDYSTONE_TLD_ENCODINGS
 from ..utils import data_to_hexstring, data_to_binstring
 
+# expansion of every byte of an encoded URL (for str.translate): TLD codes are expanded,
+# ASCII characters are kept and bytes above 0x7f (reserved) are dropped
+URL_EXPANSION = tuple(EDDYSTONE_TLD_ENCODINGS.get(val, chr(val) if val < 0x80 else None)
+                      for val in range(256))
+
+
+@lru_cache(maxsize=256)
+def decode_url(url_scheme, encoded_url):
+    """Expand the encoded URL of an Eddystone URL frame in a single pass.
+
+    URL beacons send the same URL over and over again, so the decoded URLs are cached
+    and interned.
+    """
+    url = encoded_url.decode('latin-1').translate(URL_EXPANSION)
+    return sys.intern(EDDYSTONE_URL_SCHEMES[url_scheme] + url)
+
+
 class EddystoneUIDFrame(object):
     """Eddystone UID frame."""
 
     def __init__(self, data):
         self._tx_power = data['tx_power']
-        self._namespace = data_to_hexstring(data['namespace'])
-        self._instance = data_to_hexstring(data['instance'])
+        self._namespace_bytes = data_to_binstring(data['namespace'])
+        self._instance_bytes = data_to_binstring(data['instance'])
+        # formatted on first access
+        self._namespace = None
+        self._instance = None
 
     @property
     def tx_power(self):
@@ -19,13 +41,27 @@ class EddystoneUIDFrame(object):
     @property
     def namespace(self):
         """10-byte namespace identifier."""
+        if self._namespace is None:
+            self._namespace = data_to_hexstring(self._namespace_bytes)
         return self._namespace
 
+    @property
+    def namespace_bytes(self):
+        """10-byte namespace identifier as bytes."""
+        return self._namespace_bytes
+
     @property
     def instance(self):
         """6-byte instance identifier."""
+        if self._instance is None:
+            self._instance = data_to_hexstring(self._instance_bytes)
         return self._instance
 
+    @property
+    def instance_bytes(self):
+        """6-byte instance identifier as bytes."""
+        return self._instance_bytes
+
     @property
     def properties(self):
         """Get beacon properties."""
@@ -41,14 +77,7 @@ class EddystoneURLFrame(object):
 
     def __init__(self, data):
         self._tx_power = data['tx_power']
-        url_scheme = EDDYSTONE_URL_SCHEMES[data['url_scheme']]
-        url = data['url']
-
-        # Replace url encodings with their expanded version
-        for enc, tld in EDDYSTONE_TLD_ENCODINGS.items():
-            url = url.replace(chr(enc), tld)
-
-        self._url = url_scheme + url
+        self._url = decode_url(data['url_scheme'], data['url'])
 
     @property
     def tx_power(self):
@@ -1,24 +1,74 @@
 """Packet classes for Estimote beacons."""
-from ..utils import data_to_hexstring
+from ..utils import data_to_hexstring, data_to_binstring
+
+
+def _motion_state_seconds(val):
+    """Convert motion state byte to seconds."""
+    number = val & 0b00111111
+    unit = (val & 0b11000000) >> 6
+    if unit == 1:
+        number *= 60 # minutes
+    elif unit == 2:
+        number *= 60 * 60 # hours
+    elif unit == 3 and number < 32:
+        number *= 60 * 60 * 24 # days
+    elif unit == 3:
+        number -= 32
+        number *= 60 * 60 * 24 * 7 # weeks
+    return number
+
+
+def _ambient_light_lux(val):
+    """Convert ambient light byte to lux, None if all bits are set."""
+    upper = (val & 0b11110000) >> 4
+    lower = val & 0b00001111
+    if upper == 0xf and lower == 0xf:
+        return None
+    return pow(2, upper) * lower * 0.72
+
+
+def _signed_byte(val):
+    """Interpret val as signed 8 bit integer."""
+    return val - 256 if val > 127 else val
+
+
+def _signed_12bit(val):
+    """Interpret val as signed 12 bit integer."""
+    return val - 4096 if val > 2047 else val
+
+
+# Estimote devices send telemetry several times per second, so the per field conversions
+# are precomputed for every possible value. The tables are indexed with the raw byte (or
+# the raw 12 bit value for the temperature); signed values are indexed with `value & 0xff`.
+MOTION_STATE_SECONDS = tuple(_motion_state_seconds(val) for val in range(256))
+AMBIENT_LIGHT_LUX = tuple(_ambient_light_lux(val) for val in range(256))
+# states of the GPIO pins 0-3 from the upper nibble of the first combined field
+GPIO_STATES = tuple(tuple((val & (1 << (4+i))) != 0 for i in range(4)) for val in range(256))
+# uptime unit from bits 4 and 5 of the second combined field, 0 means unknown
+UPTIME_MULTIPLIER = tuple((0, 60, 60 * 60, 60 * 60 * 24)[(val & 0b00110000) >> 4]
+                          for val in range(256))
+ACCELERATION_G = tuple(_signed_byte(val) * 2 / 127.0 for val in range(256))
+MAGNETIC_FIELD = tuple(_signed_byte(val) / 128.0 for val in range(256))
+TEMPERATURE_CELSIUS = tuple(_signed_12bit(val) / 16.0 for val in range(4096))
+
 
 class EstimoteTelemetryFrameA(object):
     """Estimote telemetry subframe A."""
 
     def __init__(self, data, protocol_version):
         self._protocol_version = protocol_version
-        self._identifier = data_to_hexstring(data['identifier'])
+        self._identifier_bytes = data_to_binstring(data['identifier'])
+        # formatted on first access
+        self._identifier = None
         sub = data['sub_frame']
         # acceleration: convert to tuple and normalize
-        self._acceleration = tuple([v * 2 / 127.0 for v in sub['acceleration']])
+        self._acceleration = tuple([ACCELERATION_G[v & 0xff] for v in sub['acceleration']])
         # motion states
-        self._previous_motion_state = self.parse_motion_state(sub['previous_motion'])
-        self._current_motion_state = self.parse_motion_state(sub['current_motion'])
+        self._previous_motion_state = MOTION_STATE_SECONDS[sub['previous_motion']]
+        self._current_motion_state = MOTION_STATE_SECONDS[sub['current_motion']]
         self._is_moving = (sub['combined_fields'][0] & 0b00000011) == 1
         # gpio
-        states = []
-        for i in range(4):
-            states.append((sub['combined_fields'][0] & (1 << (4+i))) != 0)
-        self._gpio_states = tuple(states)
+        self._gpio_states = GPIO_STATES[sub['combined_fields'][0]]
         # error codes
         if self.protocol_version == 2:
             self._has_firmware_error = ((sub['combined_fields'][0] & 0b00000100) >> 2) == 1
@@ -45,18 +95,7 @@ class EstimoteTelemetryFrameA(object):
     @staticmethod
     def parse_motion_state(val):
         """Convert motion state byte to seconds."""
-        number = val & 0b00111111
-        unit = (val & 0b11000000) >> 6
-        if unit == 1:
-            number *= 60 # minutes
-        elif unit == 2:
-            number *= 60 * 60 # hours
-        elif unit == 3 and number < 32:
-            number *= 60 * 60 * 24 # days
-        elif unit == 3:
-            number -= 32
-            number *= 60 * 60 * 24 * 7 # weeks
-        return number
+        return MOTION_STATE_SECONDS[val]
 
     @property
     def protocol_version(self):
@@ -66,8 +105,15 @@ class EstimoteTelemetryFrameA(object):
     @property
     def identifier(self):
         """First half of the identifier of the beacon (8 bytes)."""
+        if self._identifier is None:
+            self._identifier = data_to_hexstring(self._identifier_bytes)
         return self._identifier
 
+    @property
+    def identifier_bytes(self):
+        """First half of the identifier of the beacon as bytes."""
+        return self._identifier_bytes
+
     @property
     def acceleration(self):
         """Tuple of acceleration values for (X, Y, Z) axis, in g."""
@@ -128,39 +174,25 @@ class EstimoteTelemetryFrameB(object):
 
     def __init__(self, data, protocol_version):
         self._protocol_version = protocol_version
-        self._identifier = data_to_hexstring(data['identifier'])
+        self._identifier_bytes = data_to_binstring(data['identifier'])
+        # formatted on first access
+        self._identifier = None
         sub = data['sub_frame']
         # magnetic field: convert to tuple and normalize
         if sub['magnetic_field'] == [-1, -1, -1]:
             self._magnetic_field = None
         else:
-            self._magnetic_field = tuple([v / 128.0 for v in sub['magnetic_field']])
+            self._magnetic_field = tuple([MAGNETIC_FIELD[v & 0xff] for v in sub['magnetic_field']])
         # ambient light
-        ambient_upper = (sub['ambient_light'] & 0b11110000) >> 4
-        ambient_lower = sub['ambient_light'] & 0b00001111
-        if ambient_upper == 0xf and ambient_lower == 0xf:
-            self._ambient_light = None
-        else:
-            self._ambient_light = pow(2, ambient_upper) * ambient_lower * 0.72
+        self._ambient_light = AMBIENT_LIGHT_LUX[sub['ambient_light']]
         # uptime
-        uptime_unit_code = (sub['combined_fields'][1] & 0b00110000) >> 4
-        uptime_number = ((sub['combined_fields'][1] & 0b00001111) << 8) | \
-                            sub['combined_fields'][0]
-        if uptime_unit_code == 1:
-            uptime_number *= 60 # minutes
-        elif uptime_unit_code == 2:
-            uptime_number *= 60 * 60 # hours
-        elif uptime_unit_code == 3:
-            uptime_number *= 60 * 60 * 24 # days
-        else:
-            uptime_number = 0
-        self._uptime = uptime_number
+        self._uptime_unit = UPTIME_MULTIPLIER[sub['combined_fields'][1]]
+        self._uptime = (((sub['combined_fields'][1] & 0b00001111) << 8) | \
+                        sub['combined_fields'][0]) * self._uptime_unit
         # temperature
-        temperature = ((sub['combined_fields'][3] & 0b00000011) << 10) |   \
-                        (sub['combined_fields'][2]               <<  2) |  \
-                        ((sub['combined_fields'][1] & 0b11000000) >>  6)
-        temperature = temperature - 4096 if temperature > 2047 else temperature
-        self._temperature = temperature / 16.0
+        self._temperature = TEMPERATURE_CELSIUS[((sub['combined_fields'][3] & 0b00000011) << 10) |
+                                                (sub['combined_fields'][2] << 2) |
+                                                ((sub['combined_fields'][1] & 0b11000000) >> 6)]
         # battery voltage
         voltage = (sub['combined_fields'][4] << 6) |  \
                     ((sub['combined_fields'][3] & 0b11111100) >> 2)
@@ -184,8 +216,15 @@ class EstimoteTelemetryFrameB(object):
     @property
     def identifier(self):
         """First half of the identifier of the beacon (8 bytes)."""
+        if self._identifier is None:
+            self._identifier = data_to_hexstring(self._identifier_bytes)
         return self._identifier
 
+    @property
+    def identifier_bytes(self):
+        """First half of the identifier of the beacon as bytes."""
+        return self._identifier_bytes
+
     @property
     def magnetic_field(self):
         """Tuple of magnetic field values for (X, Y, Z) axis.
@@ -202,6 +241,11 @@ class EstimoteTelemetryFrameB(object):
         """Uptime in seconds."""
         return self._uptime
 
+    @property
+    def uptime_unit(self):
+        """Resolution of the uptime in seconds (60, 3600 or 86400), 0 if unknown."""
+        return self._uptime_unit
+
     @property
     def temperature(self):
         """Ambient temperature in celsius."""
@@ -219,6 +263,11 @@ class EstimoteTelemetryFrameB(object):
         Only available if protocol version is 0, None otherwise."""
         return self._has_clock_error
 
+    @property
+    def voltage(self):
+        """Battery voltage in mV."""
+        return self._voltage
+
     @property
     def battery_level(self):
         """Beacon battery level between 0 and 100.
@@ -239,24 +288,28 @@ class EstimoteNearable(object):
     """Estimote Nearable advertisement."""
 
     def __init__(self, data):
-        self._identifier = data_to_hexstring(data['identifier'])
+        self._identifier_bytes = data_to_binstring(data['identifier'])
+        # formatted on first access
+        self._identifier = None
         self._hardware_version = data['hardware_version']
         self._firmware_version = data['firmware_version']
 
         # byte 13 and the first 4 bits of byte 14 is the temperature in signed,
-        temperature_raw_value = (data['temperature'] & 0x0fff)
-        if temperature_raw_value > 2047:
-            # convert a 12-bit unsigned integer to a signed one
-            temperature_raw_value = temperature_raw_value - 4096
-        temperature = temperature_raw_value / 16.0
-        self._temperature = temperature
+        self._temperature = TEMPERATURE_CELSIUS[data['temperature'] & 0x0fff]
         self._is_moving = data['is_moving'] & 0b01000000 != 0
 
     @property
     def identifier(self):
         """The Nearable identifier (8 bytes)."""
+        if self._identifier is None:
+            self._identifier = data_to_hexstring(self._identifier_bytes)
         return self._identifier
 
+    @property
+    def identifier_bytes(self):
+        """The Nearable identifier as bytes."""
+        return self._identifier_bytes
+
     @property
     def hardware_version(self):
         """The hardware version of the nearable."""
@@ -5,14 +5,23 @@ class ExposureNotificationFrame(object):
     """COVID-19 Exposure Notification frame."""
 
     def __init__(self, data):
-        self._identifier = data_to_hexstring(data['identifier'])
+        self._identifier_bytes = data_to_binstring(data['identifier'])
+        # formatted on first access
+        self._identifier = None
         self._encrypted_metadata = data_to_binstring(data['encrypted_metadata'])
 
     @property
     def identifier(self):
         """16 byte Rolling Proximity Identifier"""
+        if self._identifier is None:
+            self._identifier = data_to_hexstring(self._identifier_bytes)
         return self._identifier
 
+    @property
+    def identifier_bytes(self):
+        """16 byte Rolling Proximity Identifier as bytes"""
+        return self._identifier_bytes
+
     @property
     def encrypted_metadata(self):
         """4 byte encrypted data containing version info and transmission power"""
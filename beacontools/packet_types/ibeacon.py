@@ -1,11 +1,13 @@
 """Packet classes for iBeacon beacons."""
-from ..utils import data_to_uuid
+from ..utils import data_to_uuid, data_to_binstring
 
 class IBeaconAdvertisement(object):
     """iBeacon advertisement."""
 
     def __init__(self, data):
-        self._uuid = data_to_uuid(data['uuid'])
+        self._uuid_bytes = data_to_binstring(data['uuid'])
+        # formatted on first access
+        self._uuid = None
         self._major = data['major']
         self._minor = data['minor']
         self._tx_power = data['tx_power']
@@ -18,8 +20,15 @@ class IBeaconAdvertisement(object):
     @property
     def uuid(self):
         """16-byte uuid."""
+        if self._uuid is None:
+            self._uuid = data_to_uuid(self._uuid_bytes)
         return self._uuid
 
+    @property
+    def uuid_bytes(self):
+        """16-byte uuid as bytes."""
+        return self._uuid_bytes
+
     @property
     def major(self):
         """2-byte major identifier."""
@@ -1,85 +1,176 @@
 """Beacon advertisement parser."""
-from construct import ConstructError
-
-from .structs import LTVFrame
 from .packet_types import EddystoneUIDFrame, EddystoneURLFrame, EddystoneEncryptedTLMFrame, \
                           EddystoneTLMFrame, EddystoneEIDFrame, IBeaconAdvertisement, \
                           EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, EstimoteNearable, \
                           CJMonitorAdvertisement, ExposureNotificationFrame
-from .const import EDDYSTONE_TLM_UNENCRYPTED, EDDYSTONE_TLM_ENCRYPTED, SERVICE_DATA_TYPE, \
+from .const import EDDYSTONE_TLM_UNENCRYPTED, EDDYSTONE_TLM_ENCRYPTED, \
                    EDDYSTONE_UID_FRAME, EDDYSTONE_TLM_FRAME, EDDYSTONE_URL_FRAME, \
-                   EDDYSTONE_EID_FRAME, EDDYSTONE_UUID, ESTIMOTE_UUID, ESTIMOTE_TELEMETRY_FRAME, \
+                   EDDYSTONE_EID_FRAME, ESTIMOTE_TELEMETRY_FRAME, \
                    ESTIMOTE_TELEMETRY_SUBFRAME_A, ESTIMOTE_TELEMETRY_SUBFRAME_B, \
-                   MANUFACTURER_SPECIFIC_DATA_TYPE, ESTIMOTE_MANUFACTURER_ID, CJ_MANUFACTURER_ID, \
-                   IBEACON_MANUFACTURER_ID, EXPOSURE_NOTIFICATION_UUID
+                   CJ_MANUFACTURER_ID, COMPLETE_LOCALE_NAME_DATA_TYPE
+from .records import to_record
 
 # pylint: disable=invalid-name,too-many-return-statements
 
+# construct, the frame structs and the registry of formats are only loaded when the first
+# packet is parsed
+_STRUCTS = None
+
+def _load_structs():
+    """Import construct, the frame structs and the registered formats on first use."""
+    global _STRUCTS  # pylint: disable=global-statement
+    if _STRUCTS is None:
+        # pylint: disable=import-outside-toplevel
+        from construct import ConstructError
+        from . import structs
+        from .registry import PACKET_FORMATS
+        # pylint: enable=import-outside-toplevel
+        _STRUCTS = (structs, ConstructError, PACKET_FORMATS)
+    return _STRUCTS
+
+def iter_ad_structures(payload):
+    """Iterate over the AD structures of advertising data.
+
+    Yields (ad_type, data) tuples, data is a memoryview of the structure without the length
+    and type bytes. Iteration ends at the end of the payload or at a zero length byte
+    (padding).
+
+    Raises:
+        ValueError: if a structure exceeds the payload
+    """
+    view = memoryview(payload)
+    end = len(view)
+    offset = 0
+    while offset < end:
+        length = view[offset]
+        if length == 0:
+            return
+        next_offset = offset + 1 + length
+        if next_offset > end:
+            raise ValueError("AD structure at offset %d exceeds the payload" % offset)
+        yield view[offset + 1], view[offset + 2:next_offset]
+        offset = next_offset
+
 def parse_packet(packet):
     """Parse a beacon advertisement packet."""
     return parse_ltv_packet(packet)
 
-def parse_ltv_packet(packet):
-    """Parse a tag-length-value style beacon packet."""
-    try:
-        frame = LTVFrame.parse(packet)
+def parse_record(packet, bt_addr=None, rssi=None, timestamp=None):
+    """Parse a beacon advertisement packet into a flat record (see beacontools.records).
 
-        for ltv in frame:
-            if ltv['type'] == SERVICE_DATA_TYPE:
-                data = ltv['value']
+    Returns None if the packet is not a supported beacon advertisement.
+    """
+    packet = parse_ltv_packet(packet)
+    if packet is None:
+        return None
+    return to_record(packet, bt_addr, rssi, timestamp, getattr(packet, 'properties', None))
 
-                if data["service_identifier"] == EDDYSTONE_UUID:
-                    return parse_eddystone_service_data(data['service_data'])
+def parse_ltv_packet(packet):
+    """Parse a tag-length-value style beacon packet.
 
-                elif data["service_identifier"] == ESTIMOTE_UUID:
-                    return parse_estimote_service_data(data['service_data'])
+    The decoder of the first AD structure which belongs to a registered format (see
+    beacontools.registry) is used.
+    """
+    _, ConstructError, packet_formats = _load_structs()
+    try:
+        for ad_type, data in iter_ad_structures(packet):
+            if len(data) < 2:
+                continue
+            packet_format = packet_formats.get((ad_type, data[0] | (data[1] << 8)))
+            if packet_format is not None:
+                return packet_format.decoder(data[2:], packet)
+
+    except (ConstructError, ValueError):
+        return None
 
-                elif data["service_identifier"] == EXPOSURE_NOTIFICATION_UUID:
-                    return ExposureNotificationFrame(data["service_data"])
+    return None
 
+def parse_packet_all(packet):
+    """Parse all beacon frames of an advertisement (e.g. an iBeacon and an Eddystone frame).
 
-            elif ltv['type'] == MANUFACTURER_SPECIFIC_DATA_TYPE:
-                data = ltv["value"]
+    Returns a list of packets in the order of their AD structures, structures which can not
+    be decoded are skipped.
+    """
+    _, ConstructError, packet_formats = _load_structs()
+    packets = []
+    try:
+        for ad_type, data in iter_ad_structures(packet):
+            if len(data) < 2:
+                continue
+            packet_format = packet_formats.get((ad_type, data[0] | (data[1] << 8)))
+            if packet_format is None:
+                continue
+            try:
+                frame = packet_format.decoder(data[2:], packet)
+            except (ConstructError, ValueError):
+                continue
+            if frame is not None:
+                packets.append(frame)
+
+    except ValueError:
+        # structures after a truncated one can not be located
+        pass
+
+    return packets
+
+def parse_local_name(packet):
+    """Get the complete local name of a packet, None if it has none."""
+    for ad_type, data in iter_ad_structures(packet):
+        if ad_type == COMPLETE_LOCALE_NAME_DATA_TYPE:
+            return bytes(data).decode("ascii")
+    return None
 
-                if data["company_identifier"] == ESTIMOTE_MANUFACTURER_ID:
-                    return EstimoteNearable(data['data'])
+def parse_eddystone_service_data(data, payload=None):  # pylint: disable=unused-argument
+    """Parse Eddystone service data (without the service identifier)."""
+    if not data:
+        return None
+    structs = _load_structs()[0]
+    frame_type = data[0]
+    if frame_type == EDDYSTONE_UID_FRAME:
+        return EddystoneUIDFrame(structs.EddystoneUIDFrame.parse(data[1:]))
 
-                elif data["company_identifier"] == CJ_MANUFACTURER_ID:
-                    return CJMonitorAdvertisement(frame)
+    elif frame_type == EDDYSTONE_TLM_FRAME:
+        frame = structs.EddystoneTLMFrame.parse(data[1:])
+        if frame['tlm_version'] == EDDYSTONE_TLM_ENCRYPTED:
+            return EddystoneEncryptedTLMFrame(frame['data'])
+        elif frame['tlm_version'] == EDDYSTONE_TLM_UNENCRYPTED:
+            return EddystoneTLMFrame(frame['data'])
 
-                elif data["company_identifier"] == IBEACON_MANUFACTURER_ID:
-                    return IBeaconAdvertisement(data['data'])
+    elif frame_type == EDDYSTONE_URL_FRAME:
+        return EddystoneURLFrame(structs.EddystoneURLFrame.parse(data[1:]))
 
-    except ConstructError:
-        return None
+    elif frame_type == EDDYSTONE_EID_FRAME:
+        return EddystoneEIDFrame(structs.EddystoneEIDFrame.parse(data[1:]))
 
     return None
 
-def parse_eddystone_service_data(data):
-    """Parse Eddystone service data."""
-    if data['frame_type'] == EDDYSTONE_UID_FRAME:
-        return EddystoneUIDFrame(data['frame'])
+def parse_estimote_service_data(data, payload=None):  # pylint: disable=unused-argument
+    """Parse Estimote service data (without the service identifier)."""
+    if not data:
+        return None
+    frame_type = data[0]
+    if frame_type & 0xF == ESTIMOTE_TELEMETRY_FRAME:
+        protocol_version = (frame_type & 0xF0) >> 4
+        frame = _load_structs()[0].EstimoteTelemetryFrame.parse(data[1:])
+        if frame['subframe_type'] == ESTIMOTE_TELEMETRY_SUBFRAME_A:
+            return EstimoteTelemetryFrameA(frame, protocol_version)
+        elif frame['subframe_type'] == ESTIMOTE_TELEMETRY_SUBFRAME_B:
+            return EstimoteTelemetryFrameB(frame, protocol_version)
+    return None
 
-    elif data['frame_type'] == EDDYSTONE_TLM_FRAME:
-        if data['frame']['tlm_version'] == EDDYSTONE_TLM_ENCRYPTED:
-            return EddystoneEncryptedTLMFrame(data['frame']['data'])
-        elif data['frame']['tlm_version'] == EDDYSTONE_TLM_UNENCRYPTED:
-            return EddystoneTLMFrame(data['frame']['data'])
+def parse_exposure_notification(data, payload=None):  # pylint: disable=unused-argument
+    """Parse Exposure Notification service data (without the service identifier)."""
+    return ExposureNotificationFrame(_load_structs()[0].ExposureNotificationFrame.parse(data))
 
-    elif data['frame_type'] == EDDYSTONE_URL_FRAME:
-        return EddystoneURLFrame(data['frame'])
+def parse_estimote_nearable(data, payload=None):  # pylint: disable=unused-argument
+    """Parse Estimote manufacturer specific data (without the company identifier)."""
+    return EstimoteNearable(_load_structs()[0].EstimoteNearableFrame.parse(data))
 
-    elif data['frame_type'] == EDDYSTONE_EID_FRAME:
-        return EddystoneEIDFrame(data['frame'])
-    else:
-        return None
+def parse_cj_monitor(data, payload):
+    """Parse CJ Monitor manufacturer specific data (without the company identifier)."""
+    return CJMonitorAdvertisement(CJ_MANUFACTURER_ID, _load_structs()[0].CJMonitorMSD.parse(data),
+                                  parse_local_name(payload))
 
-def parse_estimote_service_data(data):
-    """Parse Estimote service data."""
-    if data['frame_type'] & 0xF == ESTIMOTE_TELEMETRY_FRAME:
-        protocol_version = (data['frame_type'] & 0xF0) >> 4
-        if data['frame']['subframe_type'] == ESTIMOTE_TELEMETRY_SUBFRAME_A:
-            return EstimoteTelemetryFrameA(data['frame'], protocol_version)
-        elif data['frame']['subframe_type'] == ESTIMOTE_TELEMETRY_SUBFRAME_B:
-            return EstimoteTelemetryFrameB(data['frame'], protocol_version)
-    return None
+def parse_ibeacon(data, payload=None):  # pylint: disable=unused-argument
+    """Parse iBeacon manufacturer specific data (without the company identifier)."""
+    return IBeaconAdvertisement(_load_structs()[0].IBeaconMSD.parse(data))
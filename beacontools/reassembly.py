@@ -0,0 +1,133 @@
+"""Reassembly of fragmented extended advertising reports (BT 5)."""
+import time
+from collections import OrderedDict
+
+from .const import EXT_ADV_DATA_COMPLETE, EXT_ADV_DATA_INCOMPLETE, EXT_ADV_DATA_TRUNCATED, \
+                   MAX_EXT_ADV_DATA_LENGTH
+
+
+class ExtendedAdvertisingReassembler(object):
+    """Collect the fragments of chained extended advertising reports.
+
+    Extended advertisements of up to 1650 bytes are split over several
+    EVT_LE_EXT_ADVERTISING_REPORT events. The fragments are buffered per
+    (bt_addr, sid) until a report with the data status "complete" arrives.
+    Buffers are bounded in number, size and age; everything which can't be
+    reassembled is counted in stats instead of being passed to the parser.
+    """
+
+    def __init__(self, max_pending=64, timeout=1.0, max_length=MAX_EXT_ADV_DATA_LENGTH):
+        """Initialize reassembler.
+
+        Args:
+            max_pending: maximum number of advertisements which are reassembled at the same time,
+                the oldest one is dropped if a new one does not fit
+            timeout: seconds after which an incomplete advertisement is dropped
+            max_length: maximum length of the reassembled advertising data in bytes
+        """
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_length = max_length
+        # (bt_addr, sid) -> (deadline, buffer), in order of arrival of the first fragment
+        self._pending = OrderedDict()
+        self.stats = {
+            # advertisements which were received in a single report
+            'complete': 0,
+            # advertisements which were reassembled from multiple reports
+            'reassembled': 0,
+            # fragments which were buffered
+            'fragments': 0,
+            # advertisements which the controller reported as truncated
+            'truncated': 0,
+            # advertisements which did not complete in time
+            'timeout': 0,
+            # advertisements which were dropped because too many were pending
+            'evicted': 0,
+            # advertisements which exceeded max_length
+            'overflow': 0,
+            # reports with an unknown data status
+            'invalid': 0,
+            # events which were cut off or whose reports exceed the event (counted by the scanner)
+            'malformed': 0,
+        }
+
+    @property
+    def pending(self):
+        """Number of advertisements which are currently being reassembled."""
+        return len(self._pending)
+
+    def expire(self, now=None):
+        """Drop all advertisements which did not complete in time."""
+        if now is None:
+            now = time.monotonic()
+        while self._pending:
+            key, (deadline, _) = next(iter(self._pending.items()))
+            if deadline > now:
+                break
+            del self._pending[key]
+            self.stats['timeout'] += 1
+
+    def add(self, bt_addr, sid, data_status, data, now=None):
+        """Add the data of an advertising report.
+
+        Args:
+            bt_addr: address of the advertiser (any hashable representation)
+            sid: advertising set id of the report
+            data_status: data status from the event type of the report
+            data: advertising data of the report
+
+        Returns:
+            The complete advertising data or None if it is incomplete or was dropped.
+        """
+        if now is None:
+            now = time.monotonic()
+        self.expire(now)
+        handler = self._HANDLERS.get(data_status)
+        if handler is None:
+            self.stats['invalid'] += 1
+            return None
+        return handler(self, (bt_addr, sid), data, now)
+
+    def _add_complete(self, key, data, now):  # pylint: disable=unused-argument
+        """Handle the last (or only) report of an advertisement."""
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            self.stats['complete'] += 1
+            return bytes(data)
+        buf = pending[1]
+        if not self._append(buf, data):
+            return None
+        self.stats['reassembled'] += 1
+        return bytes(buf)
+
+    def _add_incomplete(self, key, data, now):
+        """Buffer a fragment, more reports of the advertisement follow."""
+        self.stats['fragments'] += 1
+        pending = self._pending.get(key)
+        if pending is None:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.stats['evicted'] += 1
+            pending = self._pending[key] = (now + self.timeout, bytearray())
+        if not self._append(pending[1], data):
+            del self._pending[key]
+
+    def _add_truncated(self, key, data, now):  # pylint: disable=unused-argument
+        """Drop an advertisement which the controller could not receive completely."""
+        self._pending.pop(key, None)
+        self.stats['truncated'] += 1
+
+    def _append(self, buf, data):
+        """Append data to the buffer of an advertisement, False if it exceeds max_length."""
+        if len(buf) + len(data) > self.max_length:
+            self.stats['overflow'] += 1
+            return False
+        buf += data
+        return True
+
+    # data status -> handler of the report
+    _HANDLERS = {
+        EXT_ADV_DATA_COMPLETE: _add_complete,
+        EXT_ADV_DATA_INCOMPLETE: _add_incomplete,
+        EXT_ADV_DATA_TRUNCATED: _add_truncated,
+    }
@@ -0,0 +1,98 @@
+"""Flat records of decoded advertisements.
+
+A record is a namedtuple which contains where and when an advertisement was received and
+all decoded fields of the packet. Records can be turned into rows (JSON, CSV, databases)
+without touching the packet objects again. Identifiers (namespace, instance, uuid and
+the Estimote and Exposure Notification identifiers) are kept as raw bytes in the *_bytes
+fields, so creating a record doesn't format them as strings.
+
+Packet types of formats added with register_packet_format have no record type of their own,
+their packets are turned into a GenericRecord which holds the decoded fields in a dict.
+"""
+from collections import namedtuple
+from operator import attrgetter
+
+from .packet_types import EddystoneUIDFrame, EddystoneURLFrame, EddystoneEncryptedTLMFrame, \
+                          EddystoneTLMFrame, EddystoneEIDFrame, IBeaconAdvertisement, \
+                          EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, EstimoteNearable, \
+                          CJMonitorAdvertisement, ExposureNotificationFrame
+
+# fields which are present in every record, properties are the identifying properties of
+# the beacon as passed to the scanner callback
+HEADER_FIELDS = ('packet_type', 'bt_addr', 'rssi', 'timestamp', 'properties')
+
+# decoded fields of every packet type, in record order
+PACKET_FIELDS = {
+    EddystoneUIDFrame: ('tx_power', 'namespace_bytes', 'instance_bytes'),
+    EddystoneURLFrame: ('tx_power', 'url'),
+    EddystoneEncryptedTLMFrame: ('encrypted_data', 'salt', 'mic'),
+    EddystoneTLMFrame: ('voltage', 'temperature', 'advertising_count', 'seconds_since_boot'),
+    EddystoneEIDFrame: ('tx_power', 'eid'),
+    IBeaconAdvertisement: ('tx_power', 'uuid_bytes', 'major', 'minor', 'cypress_temperature',
+                           'cypress_humidity'),
+    EstimoteTelemetryFrameA: ('protocol_version', 'identifier_bytes', 'acceleration',
+                              'is_moving', 'current_motion_state', 'previous_motion_state',
+                              'gpio_states', 'has_firmware_error', 'has_clock_error', 'pressure'),
+    EstimoteTelemetryFrameB: ('protocol_version', 'identifier_bytes', 'magnetic_field',
+                              'ambient_light', 'uptime', 'uptime_unit', 'temperature',
+                              'has_firmware_error', 'has_clock_error', 'battery_level', 'voltage'),
+    EstimoteNearable: ('identifier_bytes', 'hardware_version', 'firmware_version', 'temperature',
+                       'is_moving'),
+    CJMonitorAdvertisement: ('company_id', 'beacon_type', 'name', 'temperature', 'humidity',
+                             'light'),
+    ExposureNotificationFrame: ('identifier_bytes', 'encrypted_metadata'),
+}
+
+# record class of every packet type, e.g. EddystoneUIDFrame -> EddystoneUIDFrameRecord
+RECORD_TYPES = {cls: namedtuple(cls.__name__ + 'Record', HEADER_FIELDS + fields)
+                for cls, fields in PACKET_FIELDS.items()}
+
+# (record class, packet type name, getter returning a tuple of all decoded fields)
+_CONVERTERS = {cls: (RECORD_TYPES[cls], cls.__name__, attrgetter(*fields))
+               for cls, fields in PACKET_FIELDS.items()}
+
+# record of all other packet types, fields maps the names of the public attributes and
+# properties of the packet to their values
+GenericRecord = namedtuple('GenericRecord', HEADER_FIELDS + ('fields',))
+
+# packet type -> names of its public properties (except properties)
+_GENERIC_PROPERTIES = {}
+
+
+def packet_fields(packet):
+    """Get the public attributes and properties of a packet as dict."""
+    cls = type(packet)
+    names = _GENERIC_PROPERTIES.get(cls)
+    if names is None:
+        names = _GENERIC_PROPERTIES[cls] = tuple(sorted(
+            name for klass in cls.__mro__ for name, value in vars(klass).items()
+            if isinstance(value, property) and not name.startswith('_') and name != 'properties'))
+    fields = {name: value for name, value in getattr(packet, '__dict__', {}).items()
+              if not name.startswith('_') and name != 'properties'}
+    for name in names:
+        fields[name] = getattr(packet, name)
+    return fields
+
+
+def to_record(packet, bt_addr=None, rssi=None, timestamp=None, properties=None):
+    """Create the record of a decoded packet.
+
+    Allocates the namedtuple of the record (besides the packet object and properties which
+    already exist), the decoded fields are referenced as they are.
+
+    Args:
+        packet: Packet object as returned by parse_packet
+        bt_addr: Bluetooth address of the sender as string
+        rssi: Received signal strength
+        timestamp: Time of reception (seconds since the epoch)
+        properties: Identifying properties of the beacon
+
+    Returns:
+        A record of RECORD_TYPES or a GenericRecord for other packet types
+    """
+    converter = _CONVERTERS.get(type(packet))
+    if converter is None:
+        return GenericRecord(type(packet).__name__, bt_addr, rssi, timestamp, properties,
+                             packet_fields(packet))
+    record_type, packet_type, getter = converter
+    return record_type._make((packet_type, bt_addr, rssi, timestamp, properties) + getter(packet))
@@ -0,0 +1,159 @@
+"""Registry of the beacon formats which are recognized by the parser and the scanner.
+
+A format is identified by the type of an AD structure and the 16 bit identifier at its
+start, the service UUID of service data or the company identifier of manufacturer specific
+data. The parser looks up the decoder of every AD structure in a dict, the scanner builds
+its prefilter from the signatures of the formats which are selected by the device and
+packet filters. Formats registered with register_packet_format are treated exactly like
+the built-in ones.
+"""
+from .const import SERVICE_DATA_TYPE, MANUFACTURER_SPECIFIC_DATA_TYPE, EDDYSTONE_UUID, \
+                   ESTIMOTE_UUID, EXPOSURE_NOTIFICATION_UUID, ESTIMOTE_MANUFACTURER_ID, \
+                   CJ_MANUFACTURER_ID, IBEACON_MANUFACTURER_ID, IBEACON_PROXIMITY_TYPE, \
+                   ScannerMode
+from .device_filters import BtAddrFilter, EddystoneFilter, EstimoteFilter, IBeaconFilter, \
+                            CJMonitorFilter, ExposureNotificationFilter
+from .packet_types import EddystoneUIDFrame, EddystoneURLFrame, EddystoneEncryptedTLMFrame, \
+                          EddystoneTLMFrame, EddystoneEIDFrame, IBeaconAdvertisement, \
+                          EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, EstimoteNearable, \
+                          CJMonitorAdvertisement, ExposureNotificationFrame
+from .parser import parse_eddystone_service_data, parse_estimote_service_data, \
+                    parse_exposure_notification, parse_estimote_nearable, parse_cj_monitor, \
+                    parse_ibeacon
+
+# (ad type, identifier) -> PacketFormat, use register_packet_format to modify it
+PACKET_FORMATS = {}
+
+
+class PacketFormat(object):
+    """A beacon format which is recognized by the AD type and a 16 bit identifier."""
+
+    def __init__(self, name, ad_type, identifier, decoder, packet_types, filter_types=(),
+                 signatures=None, mode=ScannerMode.MODE_NONE):
+        """Describe a format.
+
+        Args:
+            name: Name of the format
+            ad_type: Type of the AD structure, e.g. SERVICE_DATA_TYPE or
+                MANUFACTURER_SPECIFIC_DATA_TYPE
+            identifier: 16 bit service UUID or company identifier (e.g. 0x004C for Apple)
+            decoder: Called with the data of the AD structure after the identifier
+                (memoryview) and the whole advertising payload, returns a packet or None.
+                construct errors and ValueErrors are treated as invalid packets.
+            packet_types: Classes of the packets returned by decoder
+            filter_types: DeviceFilter subclasses which select this format
+            signatures: Byte strings of which at least one is contained in every packet of
+                this format (used for prefiltering), defaults to the AD type followed by
+                the identifier in little endian byte order
+            mode: ScannerMode flag of the built-in formats
+        """
+        if not 0 <= identifier <= 0xFFFF:
+            raise ValueError("identifier must be a 16 bit integer")
+        if not 0 <= ad_type <= 0xFF:
+            raise ValueError("ad_type must be a byte")
+        if signatures is None:
+            signatures = [bytes([ad_type]) + identifier.to_bytes(2, 'little')]
+        self.name = name
+        self.ad_type = ad_type
+        self.identifier = identifier
+        self.decoder = decoder
+        self.packet_types = tuple(packet_types)
+        self.filter_types = tuple(filter_types)
+        self.signatures = tuple(bytes(signature) for signature in signatures)
+        self.mode = mode
+
+    @property
+    def key(self):
+        """(ad type, identifier) under which the format is registered."""
+        return (self.ad_type, self.identifier)
+
+    def __repr__(self):
+        return "PacketFormat({}, ad_type=0x{:02x}, identifier=0x{:04x})".format(
+            self.name, self.ad_type, self.identifier)
+
+
+def register_packet_format(packet_format, replace=False):
+    """Register a format with the parser and scanner.
+
+    Scanners only prefilter for the formats which were registered when they were created.
+
+    Raises:
+        ValueError: if another format is registered for the same AD type and identifier
+            and replace is False
+    """
+    existing = PACKET_FORMATS.get(packet_format.key)
+    if existing is not None and existing is not packet_format and not replace:
+        raise ValueError("{!r} is already registered".format(existing))
+    PACKET_FORMATS[packet_format.key] = packet_format
+
+
+def unregister_packet_format(ad_type, identifier):
+    """Remove the format registered for ad_type and identifier."""
+    PACKET_FORMATS.pop((ad_type, identifier), None)
+
+
+def packet_formats():
+    """List of all registered formats."""
+    return list(PACKET_FORMATS.values())
+
+
+def is_registered_packet_type(cls):
+    """Check if cls is returned by one of the registered formats."""
+    return any(cls in packet_format.packet_types for packet_format in PACKET_FORMATS.values())
+
+
+def find_packet_type(name):
+    """Get the packet type with the given class name from the registered formats (or None)."""
+    for packet_format in PACKET_FORMATS.values():
+        for cls in packet_format.packet_types:
+            if cls.__name__ == name:
+                return cls
+    return None
+
+
+def select_packet_formats(device_filter=None, packet_filter=None):
+    """Get the registered formats which can produce packets passing the (validated) filters.
+
+    Without device filters (or with a BtAddrFilter) all formats are selected by the device
+    filters, without packet filters all formats are selected by the packet filters.
+    """
+    formats = packet_formats()
+    if device_filter and not any(isinstance(filtr, BtAddrFilter) for filtr in device_filter):
+        formats = [packet_format for packet_format in formats
+                   if any(isinstance(filtr, packet_format.filter_types) for filtr in device_filter)]
+    if packet_filter:
+        formats = [packet_format for packet_format in formats
+                   if any(cls in packet_format.packet_types for cls in packet_filter)]
+    return formats
+
+
+for _packet_format in (
+        PacketFormat('eddystone', SERVICE_DATA_TYPE, int.from_bytes(EDDYSTONE_UUID, 'little'),
+                     parse_eddystone_service_data,
+                     [EddystoneUIDFrame, EddystoneURLFrame, EddystoneEncryptedTLMFrame,
+                      EddystoneTLMFrame, EddystoneEIDFrame],
+                     [EddystoneFilter], mode=ScannerMode.MODE_EDDYSTONE),
+        PacketFormat('estimote', SERVICE_DATA_TYPE, int.from_bytes(ESTIMOTE_UUID, 'little'),
+                     parse_estimote_service_data,
+                     [EstimoteTelemetryFrameA, EstimoteTelemetryFrameB],
+                     [EstimoteFilter], mode=ScannerMode.MODE_ESTIMOTE),
+        PacketFormat('exposure_notification', SERVICE_DATA_TYPE,
+                     int.from_bytes(EXPOSURE_NOTIFICATION_UUID, 'little'),
+                     parse_exposure_notification, [ExposureNotificationFrame],
+                     [ExposureNotificationFilter], mode=ScannerMode.MODE_EXPOSURE_NOTIFICATION),
+        PacketFormat('estimote_nearable', MANUFACTURER_SPECIFIC_DATA_TYPE,
+                     int.from_bytes(ESTIMOTE_MANUFACTURER_ID, 'little'),
+                     parse_estimote_nearable, [EstimoteNearable],
+                     [EstimoteFilter], mode=ScannerMode.MODE_ESTIMOTE),
+        PacketFormat('cj_monitor', MANUFACTURER_SPECIFIC_DATA_TYPE,
+                     int.from_bytes(CJ_MANUFACTURER_ID, 'little'),
+                     parse_cj_monitor, [CJMonitorAdvertisement],
+                     [CJMonitorFilter], mode=ScannerMode.MODE_CJMONITOR),
+        PacketFormat('ibeacon', MANUFACTURER_SPECIFIC_DATA_TYPE,
+                     int.from_bytes(IBEACON_MANUFACTURER_ID, 'little'),
+                     parse_ibeacon, [IBeaconAdvertisement], [IBeaconFilter],
+                     signatures=[bytes([MANUFACTURER_SPECIFIC_DATA_TYPE]) +
+                                 IBEACON_MANUFACTURER_ID + IBEACON_PROXIMITY_TYPE],
+                     mode=ScannerMode.MODE_IBEACON),
+):
+    register_packet_format(_packet_format)
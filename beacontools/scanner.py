@@ -1,31 +1,36 @@
 """Classes responsible for Beacon scanning."""
 import logging
+import selectors
+import socket
 import struct
 import threading
+import time
+from collections import deque
 from importlib import import_module
 from enum import IntEnum
-from construct import Struct, Byte, Bytes, GreedyRange, ConstructError
 
-from ahocorapy.keywordtree import KeywordTree
-
-from .const import (CJ_MANUFACTURER_ID, EDDYSTONE_UUID,
-                    ESTIMOTE_MANUFACTURER_ID, ESTIMOTE_UUID,
-                    EVT_LE_ADVERTISING_REPORT, EXPOSURE_NOTIFICATION_UUID,
-                    IBEACON_MANUFACTURER_ID, IBEACON_PROXIMITY_TYPE,
-                    LE_META_EVENT, MANUFACTURER_SPECIFIC_DATA_TYPE,
+from .admission import AdmissionPolicy
+from .const import (EVT_LE_ADVERTISING_REPORT, LE_META_EVENT,
                     MS_FRACTION_DIVIDER, OCF_LE_SET_SCAN_ENABLE,
                     OCF_LE_SET_SCAN_PARAMETERS, OGF_LE_CTL,
-                    BluetoothAddressType, ScanFilter, ScannerMode, ScanType,
+                    BluetoothAddressType, ScanFilter, ScanType,
                     OCF_LE_SET_EXT_SCAN_PARAMETERS, OCF_LE_SET_EXT_SCAN_ENABLE,
                     EVT_LE_EXT_ADVERTISING_REPORT, OGF_INFO_PARAM,
-                    OCF_READ_LOCAL_VERSION, EVT_CMD_COMPLETE)
-from .device_filters import BtAddrFilter, DeviceFilter
+                    OCF_READ_LOCAL_VERSION, EVT_CMD_COMPLETE,
+                    OCF_LE_READ_WHITE_LIST_SIZE, OCF_LE_CLEAR_WHITE_LIST,
+                    OCF_LE_ADD_DEVICE_TO_WHITE_LIST, WHITE_LIST_ADDRESS_TYPES,
+                    DUPLICATES_REARM_INTERVAL, HCI_MAX_EVENT_SIZE, MAX_RECV_BATCH,
+                    MIN_SCAN_FRACTIONS, MAX_SCAN_FRACTIONS, MAX_EXT_SCAN_FRACTIONS)
+from .device_filters import BtAddrFilter, check_filters, filters_match
 from .packet_types import (EddystoneEIDFrame, EddystoneEncryptedTLMFrame,
                            EddystoneTLMFrame, EddystoneUIDFrame,
                            EddystoneURLFrame)
-from .parser import parse_packet
-from .utils import (bin_to_int, bt_addr_to_string, get_mode, is_one_of,
-                    is_packet_type, to_int)
+from .parser import parse_packet, parse_packet_all
+from .reassembly import ExtendedAdvertisingReassembler
+from .records import to_record
+from .registry import select_packet_formats
+from .utils import (bin_to_int, bt_addr_to_string, drain_socket, get_mode, is_one_of,
+                    string_to_bt_addr, to_int)
 
 
 class HCIVersion(IntEnum):
@@ -53,51 +58,197 @@ _LOGGER.setLevel(logging.DEBUG)
 # pylint: disable=no-member
 
 
+class CompiledFilters(object):
+    """Device and packet filters of a scanner together with the state derived from them.
+
+    Instances are not modified after they have been compiled, the scanner replaces its
+    instance as a whole when the filters are changed so that the packet path always sees a
+    consistent set of filters without locking.
+    """
+
+    __slots__ = ('device_filter', 'packet_filter', 'mode', 'packet_formats', 'bt_addrs', '_kwtree')
+
+    def __init__(self, device_filter, packet_filter):
+        """Derive the scanner mode and formats from (validated) filters."""
+        self.device_filter = device_filter
+        self.packet_filter = packet_filter
+        self.mode = get_mode(device_filter)
+        # registered formats which can pass the filters, their signatures make up the prefilter
+        self.packet_formats = select_packet_formats(device_filter, packet_filter)
+        # addresses for the white list of the controller if all device filters are BtAddrFilters
+        self.bt_addrs = None
+        if device_filter and all(isinstance(filtr, BtAddrFilter) for filtr in device_filter):
+            self.bt_addrs = [filtr.properties['bt_addr'] for filtr in device_filter]
+        # prefilter search tree, built on first use (see kwtree)
+        self._kwtree = None
+
+    @property
+    def kwtree(self):
+        """Aho-Corasick search tree used for prefiltering, built when it is first needed."""
+        if self._kwtree is None:
+            self._kwtree = self.build_kwtree()
+        return self._kwtree
+
+    def build_kwtree(self):
+        """Construct an aho-corasick search tree for efficient prefiltering."""
+        # pylint: disable=import-outside-toplevel
+        from ahocorapy.keywordtree import KeywordTree
+        # pylint: enable=import-outside-toplevel
+
+        kwtree = KeywordTree()
+        for packet_format in self.packet_formats:
+            for signature in packet_format.signatures:
+                kwtree.add(signature)
+        kwtree.finalize()
+        return kwtree
+
+    def compile(self):
+        """Build the prefilter now instead of on the first packet."""
+        self.kwtree  # pylint: disable=pointless-statement
+        return self
+
+
 class BeaconScanner(object):
     """Scan for Beacon advertisements."""
 
-    def __init__(self, callback, bt_device_id=0, device_filter=None, packet_filter=None, scan_parameters=None):
-        """Initialize scanner."""
-        # check if device filters are valid
-        if device_filter is not None:
-            if not isinstance(device_filter, list):
-                device_filter = [device_filter]
-            if len(device_filter) > 0:
-                for filtr in device_filter:
-                    if not isinstance(filtr, DeviceFilter):
-                        raise ValueError("Device filters must be instances of DeviceFilter")
-            else:
-                device_filter = None
-
-        # check if packet filters are valid
-        if packet_filter is not None:
-            if not isinstance(packet_filter, list):
-                packet_filter = [packet_filter]
-            if len(packet_filter) > 0:
-                for filtr in packet_filter:
-                    if not is_packet_type(filtr):
-                        raise ValueError("Packet filters must be one of the packet types")
-            else:
-                packet_filter = None
+    def __init__(self, callback, bt_device_id=0, device_filter=None, packet_filter=None, scan_parameters=None,
+                 *, filter_duplicates=False, duplicates_rearm_interval=DUPLICATES_REARM_INTERVAL,
+                 scan_scheduler=None, records=False, eid_resolver=None, decrypt_etlm=False,
+                 all_frames=False, admission_policy=None):
+        """Initialize scanner.
+
+        The callback is called with (bt_addr, rssi, packet, properties). If records is True, it is
+        called with a single flat record instead, which contains the same information, the time of
+        reception and all decoded fields of the packet (see beacontools.records).
+
+        If scan_parameters contains filter_type=ScanFilter.WHITELIST_ONLY and all device filters are
+        BtAddrFilters, the addresses are programmed into the white list of the controller so that
+        other advertisements are dropped before they reach the host. If that is not possible
+        (other filter types, white list too small, unsupported backend) scanning falls back to
+        ScanFilter.ALL and filtering is done in software.
+
+        If filter_duplicates is True, the controller only reports the first advertisement of each
+        device. The duplicate filter is re-armed every duplicates_rearm_interval seconds (None to
+        disable) so that RSSI updates keep coming in.
+
+        If a DutyCycleScheduler is passed as scan_scheduler, the scan window is adapted to the
+        observed beacon traffic (see beacontools.scheduler), interval_ms and window_ms from
+        scan_parameters are overridden by it.
+
+        If an EIDResolver is passed as eid_resolver, Eddystone EID frames of registered beacons get
+        their beacon_id as properties (see beacontools.eid), TLM and URL frames sent from the same
+        address as well. The resolver is started and stopped together with the scanner.
+
+        If decrypt_etlm is True, encrypted TLM frames of resolved beacons are decrypted in a worker
+        thread (see beacontools.etlm) and passed to the callback as EddystoneTLMFrame by the
+        scanner thread. The encrypted frame is still passed to the callback as well.
+
+        If all_frames is True, every beacon frame of an advertisement is passed to the callback
+        (e.g. when a device sends an iBeacon and an Eddystone frame at once), otherwise only the
+        first one.
+
+        If an AdmissionPolicy is passed as admission_policy, advertisements are dropped by RSSI,
+        blocklist, flood guard and overload controller before they are prefiltered or parsed
+        and counted in stats()['drops'] (see beacontools.admission).
+        """
+        device_filter, packet_filter = check_filters(device_filter, packet_filter)
 
         if scan_parameters is None:
             scan_parameters = {}
 
-        self._mon = Monitor(callback, bt_device_id, device_filter, packet_filter, scan_parameters)
+        if duplicates_rearm_interval is not None and duplicates_rearm_interval <= 0:
+            raise ValueError("duplicates_rearm_interval must be positive or None")
+
+        if decrypt_etlm and eid_resolver is None:
+            raise ValueError("decrypt_etlm requires an eid_resolver")
+
+        self._mon = Monitor(callback, bt_device_id, device_filter, packet_filter, scan_parameters,
+                            filter_duplicates=filter_duplicates,
+                            duplicates_rearm_interval=duplicates_rearm_interval,
+                            scheduler=scan_scheduler, records=records, eid_resolver=eid_resolver,
+                            decrypt_etlm=decrypt_etlm, all_frames=all_frames,
+                            admission_policy=admission_policy)
 
     def start(self):
         """Start beacon scanning."""
+        if self._mon.eid_resolver is not None:
+            self._mon.eid_resolver.start()
+        if self._mon.etlm_decryptor is not None:
+            self._mon.etlm_decryptor.start()
         self._mon.start()
 
     def stop(self):
-        """Stop beacon scanning."""
+        """Stop beacon scanning.
+
+        Returns as soon as the scanner thread has finished the packet it is processing, even
+        if no advertisements are received.
+        """
         self._mon.terminate()
+        if self._mon.etlm_decryptor is not None:
+            self._mon.etlm_decryptor.stop()
+        if self._mon.eid_resolver is not None:
+            self._mon.eid_resolver.stop()
+
+    def pause(self):
+        """Disable scanning on the controller until resume is called.
+
+        The device stays open and the filters, mappings and counters are kept, so resuming
+        only re-enables the scan.
+        """
+        self._mon.pause()
+
+    def resume(self):
+        """Re-enable scanning after pause."""
+        self._mon.resume()
+
+    def block(self, *bt_addrs):
+        """Drop all advertisements of the given addresses (e.g. "aa:bb:cc:dd:ee:ff").
+
+        Can be called while the scanner is running.
+        """
+        self._mon.admission_policy.block(*bt_addrs)
+
+    def unblock(self, *bt_addrs):
+        """Stop dropping the advertisements of the given addresses."""
+        self._mon.admission_policy.unblock(*bt_addrs)
+
+    def update_filters(self, device_filter=None, packet_filter=None):
+        """Replace the device and packet filters while the scanner is running.
+
+        The new filters are validated and compiled in the calling thread and swapped in
+        atomically, scanning goes on without interruption. Only if the white list of the
+        controller is used (ScanFilter.WHITELIST_ONLY) the scanner thread pauses scanning
+        for a moment to reprogram it.
+
+        Raises:
+            ValueError: if the filters are invalid, the old filters stay active then
+        """
+        device_filter, packet_filter = check_filters(device_filter, packet_filter)
+        self._mon.update_filters(device_filter, packet_filter)
+
+    def stats(self):
+        """Get counters of the scanner, grouped by processing stage."""
+        admission_policy = self._mon.admission_policy
+        stats = {'drops': dict(admission_policy.drops),
+                 'reassembly': dict(self._mon.reassembler.stats)}
+        if self._mon.scheduler is not None:
+            stats['scheduler'] = self._mon.scheduler.stats()
+        if self._mon.etlm_decryptor is not None:
+            stats['etlm'] = dict(self._mon.etlm_decryptor.stats)
+        if admission_policy.flood_guard is not None:
+            stats['flood'] = dict(admission_policy.flood_guard.stats)
+        if admission_policy.overload_controller is not None:
+            stats['overload'] = dict(admission_policy.overload_controller.stats)
+        return stats
 
 
 class Monitor(threading.Thread):
     """Continously scan for BLE advertisements."""
 
-    def __init__(self, callback, bt_device_id, device_filter, packet_filter, scan_parameters):
+    def __init__(self, callback, bt_device_id, device_filter, packet_filter, scan_parameters,
+                 *, filter_duplicates=False, duplicates_rearm_interval=None, scheduler=None,
+                 records=False, eid_resolver=None, decrypt_etlm=False, all_frames=False,
+                 admission_policy=None):
         """Construct interface object."""
         # do import here so that the package can be used in parsing-only mode (no bluez required)
         self.backend = import_module('beacontools.backend')
@@ -105,59 +256,309 @@ class Monitor(threading.Thread):
         threading.Thread.__init__(self)
         self.daemon = False
         self.keep_going = True
+        # scanning is disabled on the controller while paused (see pause and resume)
+        self.paused = False
+        self._scanning = False
         self.callback = callback
+        # call the callback with flat records instead of packet objects
+        self.records = records
+        # decode all beacon frames of an advertisement instead of the first one
+        self.all_frames = all_frames
 
         # number of the bt device (hciX)
         self.bt_device_id = bt_device_id
-        # list of beacons to monitor
-        self.device_filter = device_filter
-        self.mode = get_mode(device_filter)
-        # list of packet types to monitor
-        self.packet_filter = packet_filter
+        # beacons and packet types to monitor, replaced as a whole by update_filters
+        self.filters = CompiledFilters(device_filter, packet_filter)
+        # drops advertisements before they are prefiltered
+        self.admission_policy = admission_policy if admission_policy is not None else AdmissionPolicy()
         # bluetooth socket
         self.socket = None
-        # keep track of Eddystone Beacon <-> bt addr mapping
-        self.eddystone_mappings = []
+        # keep track of Eddystone Beacon <-> bt addr mapping, keyed by the binary address
+        self.eddystone_mappings = {}
+        # resolves EIDs of registered beacons to their identity
+        self.eid_resolver = eid_resolver
+        # decrypts eTLM frames of resolved beacons in a worker thread
+        self.etlm_decryptor = None
+        if decrypt_etlm:
+            # pylint: disable=import-outside-toplevel
+            from .etlm import ETLMDecryptor
+            self.etlm_decryptor = ETLMDecryptor(eid_resolver, self.queue_decrypted)
+        # frames decrypted by the worker thread, delivered by the loop (see _deliver_decrypted)
+        self._decrypted = deque()
         # parameters to pass to bt device
         self.scan_parameters = scan_parameters
+        # let the controller drop duplicate advertisements and reset its filter periodically
+        self.filter_duplicates = filter_duplicates
+        self.duplicates_rearm_interval = duplicates_rearm_interval
+        self._next_rearm = None
+        # whether the white list of the controller has been programmed from the BtAddrFilters
+        self.white_list_active = False
+        # the loop reprograms the white list from the active filters, see update_filters
+        self._reprogram_pending = False
+        # adapts the scan window to the observed traffic
+        self.scheduler = scheduler
+        # scan parameters which have been sent to the controller
+        self.active_scan_parameters = None
         # hci version
         self.hci_version = HCIVersion.BT_CORE_SPEC_1_0
-
-        # construct an aho-corasick search tree for efficient prefiltering
-        service_uuid_prefix = b"\x03\x03"
-        self.kwtree = KeywordTree()
-        if self.mode & ScannerMode.MODE_IBEACON:
-            self.kwtree.add(bytes([MANUFACTURER_SPECIFIC_DATA_TYPE]) + IBEACON_MANUFACTURER_ID + IBEACON_PROXIMITY_TYPE)
-        if self.mode & ScannerMode.MODE_EDDYSTONE:
-            self.kwtree.add(service_uuid_prefix + EDDYSTONE_UUID)
-        if self.mode & ScannerMode.MODE_ESTIMOTE:
-            self.kwtree.add(service_uuid_prefix + ESTIMOTE_UUID)
-            self.kwtree.add(bytes([MANUFACTURER_SPECIFIC_DATA_TYPE]) + ESTIMOTE_MANUFACTURER_ID)
-        if self.mode & ScannerMode.MODE_CJMONITOR:
-            self.kwtree.add(bytes([MANUFACTURER_SPECIFIC_DATA_TYPE]) + CJ_MANUFACTURER_ID)
-        if self.mode & ScannerMode.MODE_EXPOSURE_NOTIFICATION:
-            self.kwtree.add(service_uuid_prefix + EXPOSURE_NOTIFICATION_UUID)
-        self.kwtree.finalize()
+        # reassembles fragmented extended advertising reports
+        self.reassembler = ExtendedAdvertisingReassembler()
+        # waits for the socket and the wakeup socket, see _open_selector
+        self._selector = None
+        self._wakeup_r = self._wakeup_w = None
+
+    @property
+    def device_filter(self):
+        """Active device filters."""
+        return self.filters.device_filter
+
+    @property
+    def packet_filter(self):
+        """Active packet filters."""
+        return self.filters.packet_filter
+
+    @property
+    def mode(self):
+        """ScannerMode of the active device filters."""
+        return self.filters.mode
+
+    @property
+    def kwtree(self):
+        """Prefilter of the active filters."""
+        return self.filters.kwtree
+
+    def update_filters(self, device_filter, packet_filter):
+        """Compile (validated) filters and swap them in, see BeaconScanner.update_filters."""
+        # everything is built before the swap, the packet path only sees the reference change
+        self.filters = CompiledFilters(device_filter, packet_filter).compile()
+        if self.scan_parameters.get("filter_type") == ScanFilter.WHITELIST_ONLY:
+            # the controller is only accessed by the scanner thread
+            self._reprogram_pending = True
+            self._wakeup()
+
+    def _reprogram_white_list(self):
+        """Program the white list from the active filters, called by the loop.
+
+        The white list can not be changed while the controller scans with it, so scanning is
+        disabled meanwhile. Falls back to ScanFilter.ALL if the white list can't be used.
+        """
+        if self._scanning:
+            self.toggle_scan(False)
+        self.white_list_active = False
+        filter_type = ScanFilter.WHITELIST_ONLY if self.program_white_list() else ScanFilter.ALL
+        if self.active_scan_parameters.get("filter_type") != filter_type:
+            self.active_scan_parameters = dict(self.active_scan_parameters, filter_type=filter_type)
+            self.set_scan_parameters(**self.active_scan_parameters)
+        if self._scanning:
+            self.toggle_scan(True, self.filter_duplicates)
 
     def run(self):
         """Continously scan for BLE advertisements."""
         self.socket = self.backend.open_dev(self.bt_device_id)
 
         self.hci_version = self.get_hci_version()
-        self.set_scan_parameters(**self.scan_parameters)
-        self.toggle_scan(True)
-
-        while self.keep_going:
-            pkt = self.socket.recv(255)
+        scan_parameters = dict(self.scan_parameters)
+        if scan_parameters.get("filter_type") == ScanFilter.WHITELIST_ONLY:
+            # programmed from the current filters, earlier updates need no reprogramming
+            self._reprogram_pending = False
+            if not self.program_white_list():
+                scan_parameters["filter_type"] = ScanFilter.ALL
+        if self.scheduler is not None:
+            scan_parameters.update(self.scheduler.scan_parameters())
+        self.set_scan_parameters(**scan_parameters)
+        self.active_scan_parameters = scan_parameters
+        self._open_selector()
+        try:
+            while self.keep_going:
+                if self._reprogram_pending:
+                    self._reprogram_pending = False
+                    self._reprogram_white_list()
+                self._apply_pause()
+                if self._wait_for_packet():
+                    self._read_packets()
+                self._deliver_decrypted()
+        finally:
+            if self._scanning:
+                self.toggle_scan(False)
+                self._scanning = False
+            self._close_selector()
+            self.socket.close()
+
+    def _read_packets(self):
+        """Process the events waiting on the socket, at most MAX_RECV_BATCH at once."""
+        started = time.monotonic()
+        count = 0
+        pkt = self.socket.recv(HCI_MAX_EVENT_SIZE)
+        while True:
+            count += 1
             event = to_int(pkt[1])
             subevent = to_int(pkt[3])
             if event == LE_META_EVENT and subevent in [EVT_LE_ADVERTISING_REPORT, EVT_LE_EXT_ADVERTISING_REPORT]:
                 # we have an BLE advertisement
                 self.process_packet(pkt)
-        self.socket.close()
+            if count >= MAX_RECV_BATCH or not self.keep_going:
+                break
+            try:
+                pkt = self.socket.recv(HCI_MAX_EVENT_SIZE, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+        overload_controller = self.admission_policy.overload_controller
+        if overload_controller is not None:
+            # the number of events read at once tells how many were waiting
+            overload_controller.record_batch(count, started, time.monotonic())
+
+    def _open_selector(self):
+        """Create the selector which waits for the socket and for wakeups (see _wakeup)."""
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.socket, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+
+    def _close_selector(self):
+        """Close the selector and the wakeup socket."""
+        self._selector.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+    def _wakeup(self):
+        """Interrupt _wait_for_packet so that the loop notices stops, pauses, filter updates and
+        decrypted frames."""
+        wakeup_w = self._wakeup_w
+        if wakeup_w is None:
+            return
+        try:
+            wakeup_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            # a wakeup is already pending or the loop has ended
+            pass
+
+    def _wait_for_packet(self):
+        """Block until a packet is available, returns False if a timer fired or a wakeup came first."""
+        timeout = None if self.paused else self._run_timers(time.monotonic())
+        readable = False
+        for key, _ in self._selector.select(timeout):
+            if key.fileobj is self._wakeup_r:
+                drain_socket(self._wakeup_r)
+            else:
+                readable = True
+        return readable
+
+    def _apply_pause(self):
+        """Enable or disable scanning on the controller according to paused."""
+        if self.paused == (not self._scanning):
+            return
+        if self.paused:
+            self.toggle_scan(False)
+            self._scanning = False
+            return
+        self.toggle_scan(True, self.filter_duplicates)
+        self._scanning = True
+        if self.filter_duplicates and self.duplicates_rearm_interval:
+            self._next_rearm = time.monotonic() + self.duplicates_rearm_interval
+        else:
+            self._next_rearm = None
+
+    def pause(self):
+        """Let the loop disable scanning, see BeaconScanner.pause."""
+        self.paused = True
+        self._wakeup()
+
+    def resume(self):
+        """Let the loop re-enable scanning."""
+        self.paused = False
+        self._wakeup()
+
+    def _run_timers(self, now):
+        """Run all timers which are due.
+
+        Returns:
+            Seconds until the next timer is due or None if there are no timers.
+        """
+        deadlines = []
+        if self._next_rearm is not None:
+            if now >= self._next_rearm:
+                self._rearm_duplicates_filter()
+                self._next_rearm = now + self.duplicates_rearm_interval
+            deadlines.append(self._next_rearm)
+        if self.scheduler is not None:
+            self._apply_scan_schedule(now)
+            deadlines.append(self.scheduler.next_deadline)
+        if not deadlines:
+            return None
+        return max(0, min(deadlines) - now)
+
+    def _apply_scan_schedule(self, now=None):
+        """Reprogram the scan parameters if the scheduler wants to change them."""
+        scan_parameters = self.scheduler.update(now)
+        if scan_parameters is None:
+            return
+        _LOGGER.debug("Changing scan parameters to %s", scan_parameters)
+        self.active_scan_parameters = dict(self.active_scan_parameters or {}, **scan_parameters)
+        # the parameters can only be changed while scanning is disabled
+        scanning = self._scanning
+        if scanning:
+            self.toggle_scan(False)
+        self.set_scan_parameters(**self.active_scan_parameters)
+        if scanning and not self.paused:
+            self.toggle_scan(True, self.filter_duplicates)
+        else:
+            # paused meanwhile, _apply_pause enables scanning again on resume
+            self._scanning = False
+
+    def _rearm_duplicates_filter(self):
+        """Reset the duplicate filter of the controller by toggling the scan.
+
+        While duplicate filtering is enabled the controller only reports the first advertisement
+        of a device, re-arming it lets the next advertisement (with a fresh RSSI) through.
+        """
+        self.toggle_scan(False)
+        self.toggle_scan(True, True)
+
+    def _read_white_list_size(self):
+        """Read the number of white list entries supported by the controller (None if unknown)."""
+        try:
+            resp = self.backend.send_req(self.socket, OGF_LE_CTL, OCF_LE_READ_WHITE_LIST_SIZE,
+                                         EVT_CMD_COMPLETE, 2, bytes(), 0)
+        except (NotImplementedError, OSError):
+            return None
+        if len(resp) < 2 or resp[0] != 0:
+            return None
+        return resp[1]
+
+    def program_white_list(self):
+        """Program the white list of the controller with the addresses from the BtAddrFilters.
+
+        Returns:
+            True if the controller can filter by itself, False if filtering must be done in
+            software (not only BtAddrFilters, white list not supported or too small).
+        """
+        addrs = self.filters.bt_addrs
+        if addrs is None:
+            _LOGGER.info("White list requires all device filters to be BtAddrFilters, "
+                         "falling back to software filtering")
+            return False
+        size = self._read_white_list_size()
+        if size is None or len(addrs) * len(WHITE_LIST_ADDRESS_TYPES) > size:
+            _LOGGER.info("White list of the controller is too small (%s entries) for %d addresses, "
+                         "falling back to software filtering", size, len(addrs))
+            return False
+
+        self.backend.send_cmd(self.socket, OGF_LE_CTL, OCF_LE_CLEAR_WHITE_LIST, bytes())
+        for addr in addrs:
+            for address_type in WHITE_LIST_ADDRESS_TYPES:
+                self.backend.send_cmd(self.socket, OGF_LE_CTL, OCF_LE_ADD_DEVICE_TO_WHITE_LIST,
+                                      struct.pack("<B", address_type) + string_to_bt_addr(addr))
+        self.white_list_active = True
+        return True
 
     def get_hci_version(self):
         """Gets the HCI version"""
+        # pylint: disable=import-outside-toplevel
+        from construct import Struct, Byte, Bytes, GreedyRange, ConstructError
+        # pylint: enable=import-outside-toplevel
+
         local_version = Struct(
             "status" / Byte,
             "hci_version" / Byte,
@@ -171,7 +572,7 @@ class Monitor(threading.Thread):
             resp = self.backend.send_req(self.socket, OGF_INFO_PARAM, OCF_READ_LOCAL_VERSION,
                                          EVT_CMD_COMPLETE, local_version.sizeof(), bytes(), 0)
             return HCIVersion(GreedyRange(local_version).parse(resp)[0]["hci_version"])
-        except (ConstructError, NotImplementedError):
+        except (ConstructError, NotImplementedError, OSError):
             return HCIVersion.BT_CORE_SPEC_1_0
 
     def set_scan_parameters(self, scan_type=ScanType.ACTIVE, interval_ms=10, window_ms=10,
@@ -192,21 +593,22 @@ class Monitor(threading.Thread):
             address_type: Bluetooth address type BluetoothAddressType.(PUBLIC|RANDOM)
                 * PUBLIC = use device MAC address
                 * RANDOM = generate a random MAC address and use that
-            filter: ScanFilter.(ALL|WHITELIST_ONLY) only ALL is supported, which will
-                return all fetched bluetooth packets (WHITELIST_ONLY is not supported,
-                because OCF_LE_ADD_DEVICE_TO_WHITE_LIST command is not implemented)
+            filter: ScanFilter.(ALL|WHITELIST_ONLY) ALL will return all fetched bluetooth packets,
+                WHITELIST_ONLY only the ones from devices on the white list of the controller
+                (see program_white_list, the scanner falls back to ALL if it can't be used)
 
         Raises:
             ValueError: A value had an unexpected format or was not in range
         """
-        max_interval = (0x4000 if self.hci_version < HCIVersion.BT_CORE_SPEC_5_0 else 0xFFFF)
+        max_interval = (MAX_SCAN_FRACTIONS if self.hci_version < HCIVersion.BT_CORE_SPEC_5_0
+                        else MAX_EXT_SCAN_FRACTIONS)
         interval_fractions = interval_ms / MS_FRACTION_DIVIDER
-        if interval_fractions < 0x0004 or interval_fractions > max_interval:
+        if interval_fractions < MIN_SCAN_FRACTIONS or interval_fractions > max_interval:
             raise ValueError(
                 "Invalid interval given {}, must be in range of 2.5ms to {}ms!".format(
                     interval_fractions, max_interval * MS_FRACTION_DIVIDER))
         window_fractions = window_ms / MS_FRACTION_DIVIDER
-        if window_fractions < 0x0004 or window_fractions > max_interval:
+        if window_fractions < MIN_SCAN_FRACTIONS or window_fractions > max_interval:
             raise ValueError(
                 "Invalid window given {}, must be in range of 2.5ms to {}ms!".format(
                     window_fractions, max_interval * MS_FRACTION_DIVIDER))
@@ -261,60 +663,145 @@ class Monitor(threading.Thread):
 
     def process_packet(self, pkt):
         """Parse the packet and call callback if one of the filters matches."""
-        payload = pkt[14:-1] if self.hci_version < HCIVersion.BT_CORE_SPEC_5_0 else pkt[29:]
+        if len(pkt) > 3 and to_int(pkt[3]) == EVT_LE_EXT_ADVERTISING_REPORT:
+            self._process_ext_packet(pkt)
+            return
+
+        self.process_advertisement(pkt[7:13], pkt[-1], pkt[14:-1])
+
+    def _process_ext_packet(self, pkt):
+        """Split an extended advertising report event into its reports and reassemble them.
+
+        Layout of a report: event type (2), address type (1), address (6), primary phy (1),
+        secondary phy (1), advertising sid (1), tx power (1), rssi (1), periodic advertising
+        interval (2), direct address type (1), direct address (6), data length (1), data.
+        """
+        num_reports = to_int(pkt[4])
+        offset = 5
+        for _ in range(num_reports):
+            if offset + 24 > len(pkt):
+                self.reassembler.stats['malformed'] += 1
+                return
+            data_length = pkt[offset + 23]
+            data_end = offset + 24 + data_length
+            if data_end > len(pkt):
+                self.reassembler.stats['malformed'] += 1
+                return
+            bt_addr = pkt[offset + 3:offset + 9]
+            # blocked and weak advertisers are dropped before their fragments are buffered
+            if self.admission_policy.check_report(bt_addr, bin_to_int(pkt[offset + 13])):
+                data_status = (pkt[offset] >> 5) & 0x03
+                payload = self.reassembler.add(bt_addr, pkt[offset + 11], data_status,
+                                               pkt[offset + 24:data_end])
+                if payload is not None:
+                    self.process_advertisement(bt_addr, pkt[offset + 13], payload)
+            offset = data_end
+
+    def process_advertisement(self, bt_addr, rssi, payload):
+        """Parse the advertising data of a single report and call callback if one of the filters matches.
+
+        Args:
+            bt_addr: binary address of the advertiser (as received, little endian)
+            rssi: rssi byte of the report (signed)
+            payload: advertising data
+        """
+        # cheap checks of the report header first, before the payload is looked at
+        rssi = bin_to_int(rssi)
+        admission_policy = self.admission_policy
+        if not admission_policy.admit(bt_addr, rssi):
+            return
+        overload_controller = admission_policy.overload_controller
 
         # check if this could be a valid packet before parsing
         # this reduces the CPU load significantly
-        if not self.kwtree.search(payload):
+        if not self.filters.kwtree.search(payload):
             return
 
-        bt_addr = bt_addr_to_string(pkt[7:13])
-        rssi = bin_to_int(pkt[-1] if self.hci_version < HCIVersion.BT_CORE_SPEC_5_0 else pkt[18])
-        # strip bluetooth address and parse packet
-        packet = parse_packet(payload)
+        # the address is kept in its binary form (bytes) until the callback is called,
+        # formatting it is only done for packets which pass the filters
+        bt_addr = bytes(bt_addr)
+        # parse packet
+        if self.all_frames:
+            packets = parse_packet_all(payload)
+        else:
+            packet = parse_packet(payload)
+            packets = (packet,) if packet else ()
 
         # return if packet was not an beacon advertisement
-        if not packet:
+        if not packets:
             return
 
         # we need to remeber which eddystone beacon has which bt address
         # because the TLM and URL frames do not contain the namespace and instance
-        self.save_bt_addr(packet, bt_addr)
-        # properties holds the identifying information for a beacon
-        # e.g. instance and namespace for eddystone; uuid, major, minor for iBeacon
-        properties = self.get_properties(packet, bt_addr)
-
-        if self.device_filter is None and self.packet_filter is None:
-            # no filters selected
-            self.callback(bt_addr, rssi, packet, properties)
-
-        elif self.device_filter is None:
-            # filter by packet type
-            if is_one_of(packet, self.packet_filter):
-                self.callback(bt_addr, rssi, packet, properties)
+        for packet in packets:
+            self.save_bt_addr(packet, bt_addr)
+
+        delivered = False
+        for packet in packets:
+            # properties holds the identifying information for a beacon
+            # e.g. instance and namespace for eddystone; uuid, major, minor for iBeacon
+            properties = self.get_properties(packet, bt_addr)
+            if overload_controller is not None and \
+                    not overload_controller.keep(bt_addr, packet, properties):
+                continue
+
+            if self.etlm_decryptor is not None and isinstance(packet, EddystoneEncryptedTLMFrame) \
+                    and properties is not None and 'beacon_id' in properties:
+                # decrypted in the background, delivered as EddystoneTLMFrame later
+                self.etlm_decryptor.submit(bt_addr, rssi, packet, properties)
+
+            if self.deliver(bt_addr, rssi, packet, properties):
+                delivered = True
+
+        # only beacons which pass the filters count as traffic
+        if delivered and self.scheduler is not None and self.scheduler.record_packet(bt_addr):
+            # a new beacon appeared, scan with the full duty cycle right away
+            self._apply_scan_schedule()
+
+    def deliver(self, bt_addr, rssi, packet, properties, timestamp=None):
+        """Call the callback if one of the filters matches (bt_addr is the binary address).
+
+        Returns:
+            True if the callback was called
+        """
+        # read the reference once, the filters may be replaced concurrently
+        filters = self.filters
+        if not filters_match(bt_addr, packet, properties, filters.device_filter,
+                             filters.packet_filter):
+            return False
+        if self.records:
+            self.callback(to_record(packet, bt_addr_to_string(bt_addr), rssi,
+                                    time.time() if timestamp is None else timestamp,
+                                    properties))
         else:
-            # filter by device and packet type
-            if self.packet_filter and not is_one_of(packet, self.packet_filter):
-                # return if packet filter does not match
-                return
+            self.callback(bt_addr_to_string(bt_addr), rssi, packet, properties)
+        return True
 
-            # iterate over filters and call .matches() on each
-            for filtr in self.device_filter:
-                if isinstance(filtr, BtAddrFilter):
-                    if filtr.matches({'bt_addr':bt_addr}):
-                        self.callback(bt_addr, rssi, packet, properties)
-                        return
+    def queue_decrypted(self, bt_addr, rssi, packet, properties, timestamp):
+        """Hand a frame decrypted by the ETLMDecryptor over to the scanner thread."""
+        self._decrypted.append((bt_addr, rssi, packet, properties, timestamp))
+        self._wakeup()
 
-                elif filtr.matches(properties):
-                    self.callback(bt_addr, rssi, packet, properties)
-                    return
+    def _deliver_decrypted(self):
+        """Deliver the decrypted frames, so that the callback is only called by one thread."""
+        decrypted = self._decrypted
+        while decrypted:
+            self.deliver(*decrypted.popleft())
 
     def save_bt_addr(self, packet, bt_addr):
-        """Add to the list of mappings."""
+        """Add to the mappings (bt_addr is the binary address)."""
         if isinstance(packet, EddystoneUIDFrame):
-            # remove out old mapping
-            new_mappings = [m for m in self.eddystone_mappings if m[0] != bt_addr]
-            new_mappings.append((bt_addr, packet.properties))
+            properties = packet.properties
+        elif isinstance(packet, EddystoneEIDFrame) and self.eid_resolver is not None:
+            properties = self.eid_resolver.resolve(packet.eid)
+            if properties is None:
+                return
+        else:
+            return
+        if self.eddystone_mappings.get(bt_addr) != properties:
+            # replace the mapping instead of modifying it, the dict may be read concurrently
+            new_mappings = dict(self.eddystone_mappings)
+            new_mappings[bt_addr] = properties
             self.eddystone_mappings = new_mappings
 
     def get_properties(self, packet, bt_addr):
@@ -325,17 +812,15 @@ class Monitor(threading.Thread):
             # eddystone beacon with this bt address
             return self.properties_from_mapping(bt_addr)
         else:
-            return packet.properties
+            return getattr(packet, 'properties', None)
 
     def properties_from_mapping(self, bt_addr):
-        """Retrieve properties (namespace, instance) for the specified bt address."""
-        for addr, properties in self.eddystone_mappings:
-            if addr == bt_addr:
-                return properties
-        return None
+        """Retrieve properties (namespace, instance) for the specified binary bt address."""
+        return self.eddystone_mappings.get(bt_addr)
 
     def terminate(self):
-        """Signal runner to stop and join thread."""
-        self.toggle_scan(False)
+        """Signal runner to stop and join thread, the runner disables scanning before it exits."""
         self.keep_going = False
-        self.join()
+        self._wakeup()
+        if self.ident is not None:
+            self.join()
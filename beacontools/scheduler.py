@@ -0,0 +1,184 @@
+"""Adaptive scan duty cycle."""
+import time
+
+from .const import MS_FRACTION_DIVIDER, MIN_SCAN_FRACTIONS, MAX_SCAN_FRACTIONS
+
+
+class DutyCyclePolicy(object):
+    """Configuration of the DutyCycleScheduler.
+
+    The scan interval stays fixed, the scan window is adjusted between
+    min_duty_cycle * interval_ms and max_duty_cycle * interval_ms.
+    """
+
+    def __init__(self, interval_ms=1000, min_duty_cycle=0.1, max_duty_cycle=1.0, quiet_rate=1.0,
+                 backoff_factor=0.5, evaluation_period=10.0, forget_after=300.0):
+        """Initialize policy.
+
+        Args:
+            interval_ms: scan interval in ms (2.5ms - 10240ms)
+            min_duty_cycle: lowest fraction of the interval which is used for scanning
+            max_duty_cycle: fraction of the interval which is used when beacons are active
+            quiet_rate: if less beacon packets per second are received, the duty cycle is reduced
+            backoff_factor: the duty cycle is multiplied with this factor every quiet period
+            evaluation_period: seconds after which the packet rate is evaluated
+            forget_after: seconds after which a beacon is considered new again
+
+        Raises:
+            ValueError: A value was not in range
+        """
+        interval_fractions = interval_ms / MS_FRACTION_DIVIDER
+        if interval_fractions < MIN_SCAN_FRACTIONS or interval_fractions > MAX_SCAN_FRACTIONS:
+            raise ValueError("Invalid interval given {}, must be in range of 2.5ms to {}ms!".format(
+                interval_ms, MAX_SCAN_FRACTIONS * MS_FRACTION_DIVIDER))
+        if not 0 < min_duty_cycle <= max_duty_cycle <= 1:
+            raise ValueError("Duty cycles must satisfy 0 < min_duty_cycle <= max_duty_cycle <= 1")
+        if min_duty_cycle * interval_fractions < MIN_SCAN_FRACTIONS:
+            raise ValueError("min_duty_cycle results in a scan window below 2.5ms")
+        if not 0 < backoff_factor < 1:
+            raise ValueError("backoff_factor must be between 0 and 1")
+        if evaluation_period <= 0 or forget_after <= 0:
+            raise ValueError("evaluation_period and forget_after must be positive")
+        self.interval_ms = interval_ms
+        self.min_duty_cycle = min_duty_cycle
+        self.max_duty_cycle = max_duty_cycle
+        self.quiet_rate = quiet_rate
+        self.backoff_factor = backoff_factor
+        self.evaluation_period = evaluation_period
+        self.forget_after = forget_after
+
+    def window_ms(self, duty_cycle):
+        """Scan window for the given duty cycle, rounded to the resolution of the controller."""
+        fractions = int(self.interval_ms * duty_cycle / MS_FRACTION_DIVIDER)
+        fractions = min(max(fractions, MIN_SCAN_FRACTIONS), int(self.interval_ms / MS_FRACTION_DIVIDER))
+        return fractions * MS_FRACTION_DIVIDER
+
+
+class DutyCycleScheduler(object):
+    """Adapt scan window and interval to the observed beacon traffic.
+
+    The scanner reports every beacon packet which passes its filters with
+    record_packet and calls update regularly (at the latest at next_deadline).
+    Whenever update returns new scan parameters, the scanner reprograms the
+    controller. The duty cycle is reduced
+    by the backoff factor for every evaluation period with less than quiet_rate
+    packets per second and is set to the maximum as soon as a new beacon appears.
+    """
+
+    def __init__(self, policy=None, now=None):
+        """Initialize scheduler."""
+        self.policy = policy if policy is not None else DutyCyclePolicy()
+        if now is None:
+            now = time.monotonic()
+        self.duty_cycle = self.policy.max_duty_cycle
+        # bt_addr -> last time it was seen
+        self._last_seen = {}
+        self._packets = 0
+        self._new_beacon = False
+        self._period_start = now
+        self._started = now
+        # (time until which the saved radio time is accounted, saved radio time), replaced as
+        # a whole so that stats can read it from another thread
+        self._accounting = (now, 0.0)
+        self._reprogrammed = 0
+
+    @property
+    def next_deadline(self):
+        """Time (monotonic clock) at which update must be called at the latest."""
+        return self._period_start + self.policy.evaluation_period
+
+    def scan_parameters(self):
+        """Current scan interval and window as keyword arguments for set_scan_parameters."""
+        return {"interval_ms": self.policy.interval_ms,
+                "window_ms": self.policy.window_ms(self.duty_cycle)}
+
+    def record_packet(self, bt_addr, now=None):
+        """Record a received beacon packet.
+
+        Returns:
+            True if update should be called right away because a new beacon appeared.
+        """
+        if now is None:
+            now = time.monotonic()
+        self._packets += 1
+        last_seen = self._last_seen.get(bt_addr)
+        self._last_seen[bt_addr] = now
+        if last_seen is None or now - last_seen > self.policy.forget_after:
+            self._new_beacon = True
+            return self.duty_cycle < self.policy.max_duty_cycle
+        return False
+
+    def update(self, now=None):
+        """Evaluate the observed traffic.
+
+        Returns:
+            New scan parameters (see scan_parameters) or None if they did not change.
+        """
+        if now is None:
+            now = time.monotonic()
+        self._account(now)
+
+        if self._new_beacon:
+            duty_cycle = self.policy.max_duty_cycle
+        elif now >= self.next_deadline:
+            rate = self._packets / max(now - self._period_start, 1e-9)
+            duty_cycle = self.duty_cycle
+            if rate < self.policy.quiet_rate:
+                duty_cycle = max(self.policy.min_duty_cycle, duty_cycle * self.policy.backoff_factor)
+        else:
+            return None
+
+        self._new_beacon = False
+        if now >= self.next_deadline:
+            self._packets = 0
+            self._period_start = now
+            self._forget(now)
+
+        if duty_cycle == self.duty_cycle:
+            return None
+        self.duty_cycle = duty_cycle
+        self._reprogrammed += 1
+        return self.scan_parameters()
+
+    def stats(self, now=None):
+        """Get metrics of the scheduler.
+
+        radio_time_saved is the time in seconds the radio was not scanning compared to
+        running at the maximum duty cycle all the time. Doesn't change the state of the
+        scheduler, so it can be called from any thread.
+        """
+        if now is None:
+            now = time.monotonic()
+        saved = self._saved_until(now)
+        elapsed = now - self._started
+        return {
+            'duty_cycle': self.duty_cycle,
+            'window_ms': self.policy.window_ms(self.duty_cycle),
+            'interval_ms': self.policy.interval_ms,
+            'elapsed': elapsed,
+            'radio_time_saved': saved,
+            'radio_time_saved_ratio': saved / (elapsed * self.policy.max_duty_cycle) if elapsed else 0.0,
+            'reprogrammed': self._reprogrammed,
+            'known_beacons': len(self._last_seen),
+        }
+
+    def _account(self, now):
+        """Add the radio time saved since the last call."""
+        if now > self._accounting[0]:
+            self._accounting = (now, self._saved_until(now))
+
+    def _saved_until(self, now):
+        """Radio time saved until now, without accounting it."""
+        accounted_until, saved = self._accounting
+        if now > accounted_until:
+            window_ratio = self.policy.window_ms(self.duty_cycle) / self.policy.interval_ms
+            max_ratio = self.policy.window_ms(self.policy.max_duty_cycle) / self.policy.interval_ms
+            saved += (max_ratio - window_ratio) * (now - accounted_until)
+        return saved
+
+    def _forget(self, now):
+        """Remove beacons which have not been seen for a while."""
+        expired = [addr for addr, last_seen in self._last_seen.items()
+                   if now - last_seen > self.policy.forget_after]
+        for addr in expired:
+            del self._last_seen[addr]
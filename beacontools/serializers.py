@@ -0,0 +1,305 @@
+"""Encoders for shipping records (see beacontools.records) to files or sockets.
+
+Two formats are supported:
+
+* JSON Lines: one JSON object per record, bytes (e.g. identifiers) are written as hex strings.
+* Binary: every record is prefixed with its length (uint16, little endian) and consists of a
+  fixed size part which is packed with one struct per packet type, followed by the variable
+  length fields and the properties. Strings and bytes are length prefixed. Records of
+  registered packet types (records.GenericRecord) carry the name of the packet type and
+  their fields in the encoding of fanout.encode_value instead.
+
+Both encoders take any number of records and append them to a single buffer.
+"""
+import json
+import struct
+
+from .fanout import PACKET_TYPES, PACKET_TYPE_INDEX, REGISTERED_PACKET_TYPE, encode_value, \
+                    decode_value
+from .packet_types import EddystoneUIDFrame, EddystoneURLFrame, EddystoneEncryptedTLMFrame, \
+                          EddystoneTLMFrame, EddystoneEIDFrame, IBeaconAdvertisement, \
+                          EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, EstimoteNearable, \
+                          CJMonitorAdvertisement, ExposureNotificationFrame
+from .records import HEADER_FIELDS, PACKET_FIELDS, RECORD_TYPES, GenericRecord
+from .utils import bt_addr_to_string, string_to_bt_addr
+
+# Binary encoding of the decoded fields of every packet type, in the order of
+# records.PACKET_FIELDS. Kinds are either struct format characters or one of:
+#   rawN  N bytes (identifiers)
+#   d3    tuple of 3 floats
+#   ?4    tuple of 4 bools
+#   str   variable length string
+#   bytes variable length bytes
+FIELD_KINDS = {
+    EddystoneUIDFrame: ('b', 'raw10', 'raw6'),
+    EddystoneURLFrame: ('b', 'str'),
+    EddystoneEncryptedTLMFrame: ('bytes', 'H', 'H'),
+    EddystoneTLMFrame: ('H', 'd', 'I', 'I'),
+    EddystoneEIDFrame: ('b', 'bytes'),
+    IBeaconAdvertisement: ('b', 'raw16', 'H', 'H', 'd', 'd'),
+    EstimoteTelemetryFrameA: ('B', 'raw8', 'd3', '?', 'I', 'I', '?4', '?', '?', 'd'),
+    EstimoteTelemetryFrameB: ('B', 'raw8', 'd3', 'd', 'I', 'I', 'd', '?', '?', 'B', 'H'),
+    EstimoteNearable: ('raw8', 'B', 'B', 'd', '?'),
+    CJMonitorAdvertisement: ('bytes', 'H', 'str', 'd', 'B', 'd'),
+    ExposureNotificationFrame: ('raw16', 'bytes'),
+}
+
+# packet type index, bt_addr, rssi, timestamp, bitmask of fields which are None
+BINARY_HEADER_FORMAT = "B6sbdH"
+_LENGTH = struct.Struct("<H")
+_INDEX_BT_ADDR = HEADER_FIELDS.index('bt_addr')
+_INDEX_RSSI = HEADER_FIELDS.index('rssi')
+_INDEX_TIMESTAMP = HEADER_FIELDS.index('timestamp')
+_INDEX_PROPERTIES = HEADER_FIELDS.index('properties')
+
+
+def _encode_header(record):
+    """Get bt_addr, rssi, timestamp and the null mask of the header fields of a record."""
+    null_mask = 0
+    bt_addr = record[_INDEX_BT_ADDR]
+    if bt_addr is None:
+        null_mask |= 1 << _INDEX_BT_ADDR
+        bt_addr = bytes(6)
+    else:
+        bt_addr = string_to_bt_addr(bt_addr)
+    rssi = record[_INDEX_RSSI]
+    if rssi is None:
+        null_mask |= 1 << _INDEX_RSSI
+        rssi = 0
+    timestamp = record[_INDEX_TIMESTAMP]
+    if timestamp is None:
+        null_mask |= 1 << _INDEX_TIMESTAMP
+        timestamp = 0.0
+    return bt_addr, rssi, timestamp, null_mask
+
+
+def _decode_header(packet_type, values, null_mask):
+    """Restore the header fields (without properties) from the unpacked header values."""
+    header = [packet_type, bt_addr_to_string(values[1]), values[2], values[3], None]
+    for index in (_INDEX_BT_ADDR, _INDEX_RSSI, _INDEX_TIMESTAMP):
+        if null_mask & (1 << index):
+            header[index] = None
+    return header
+
+
+def _raw_kind(size):
+    """(struct format, encode, decode, default) for size bytes."""
+    return ("%ds" % size, None, None, bytes(size))
+
+
+def _tuple_kind(code, size):
+    """(struct format, encode, decode, default) for tuples of size values."""
+    return (code * size, None, None, (0,) * size)
+
+
+def _kind(kind):
+    """Get (struct format, encode, decode, default) of a fixed size field kind."""
+    if kind.startswith('raw'):
+        return _raw_kind(int(kind[3:]))
+    elif kind == 'd3':
+        return _tuple_kind('d', 3)
+    elif kind == '?4':
+        return _tuple_kind('?', 4)
+    return (kind, None, None, 0)
+
+
+class _BinarySchema(object):
+    """Precompiled binary layout of the records of one packet type."""
+
+    def __init__(self, cls):
+        self.index = PACKET_TYPE_INDEX[cls]
+        self.record_type = RECORD_TYPES[cls]
+        fmt = "<" + BINARY_HEADER_FORMAT
+        # (position in record, encode, decode, default, number of struct values or None)
+        self.fixed = []
+        # (position in record, is string)
+        self.variable = []
+        for position, kind in enumerate(FIELD_KINDS[cls], len(HEADER_FIELDS)):
+            if kind in ('str', 'bytes'):
+                self.variable.append((position, kind == 'str'))
+                continue
+            code, encode, decode, default = _kind(kind)
+            fmt += code
+            self.fixed.append((position, encode, decode, default,
+                               len(default) if isinstance(default, tuple) else None))
+        self.struct = struct.Struct(fmt)
+
+    def encode(self, record, out):
+        """Append the encoding of record to the bytearray out."""
+        bt_addr, rssi, timestamp, null_mask = _encode_header(record)
+        values, null_mask = self._encode_fixed(record, null_mask)
+        variable, null_mask = self._encode_variable(record, null_mask)
+
+        start = len(out)
+        out += b"\x00\x00"
+        out += self.struct.pack(self.index, bt_addr, rssi, timestamp, null_mask, *values)
+        for value in variable:
+            out += _LENGTH.pack(len(value))
+            out += value
+        encode_value(record[_INDEX_PROPERTIES], out)
+        _LENGTH.pack_into(out, start, len(out) - start - _LENGTH.size)
+
+    def _encode_fixed(self, record, null_mask):
+        """Get the struct values of the fixed size fields and the null mask including them."""
+        values = []
+        for position, encode, _, default, size in self.fixed:
+            value = record[position]
+            if value is None:
+                null_mask |= 1 << position
+                value = default
+            elif encode is not None:
+                value = encode(value)
+            if size is None:
+                values.append(value)
+            else:
+                values.extend(value)
+        return values, null_mask
+
+    def _encode_variable(self, record, null_mask):
+        """Get the bytes of the variable length fields and the null mask including them."""
+        variable = []
+        for position, is_string in self.variable:
+            value = record[position]
+            if value is None:
+                null_mask |= 1 << position
+                value = b""
+            elif is_string:
+                value = value.encode("utf-8")
+            variable.append(value)
+        return variable, null_mask
+
+    def decode(self, data, offset, end):
+        """Decode a record which has been encoded with encode."""
+        values = self.struct.unpack_from(data, offset)
+        offset += self.struct.size
+        null_mask = values[4]
+        header = _decode_header(PACKET_TYPES[self.index].__name__, values, null_mask)
+        fields = []
+        value_index = 5
+        for position, _, decode, _, size in self.fixed:
+            if size is None:
+                value = values[value_index]
+                value_index += 1
+                if decode is not None:
+                    value = decode(value)
+            else:
+                value = values[value_index:value_index + size]
+                value_index += size
+            fields.append((position, None if null_mask & (1 << position) else value))
+        for position, is_string in self.variable:
+            length = _LENGTH.unpack_from(data, offset)[0]
+            offset += _LENGTH.size
+            value = bytes(data[offset:offset + length])
+            offset += length
+            if null_mask & (1 << position):
+                value = None
+            elif is_string:
+                value = value.decode("utf-8")
+            fields.append((position, value))
+        header[_INDEX_PROPERTIES], offset = decode_value(data, offset)
+        if offset != end:
+            raise ValueError("Record has trailing data")
+        fields.sort()
+        return self.record_type._make(header + [value for _, value in fields])
+
+
+class _GenericSchema(object):
+    """Binary layout of GenericRecords: header, packet type name, fields and properties."""
+
+    index = REGISTERED_PACKET_TYPE
+    record_type = GenericRecord
+    struct = struct.Struct("<" + BINARY_HEADER_FORMAT)
+
+    def encode(self, record, out):
+        """Append the encoding of record to the bytearray out."""
+        bt_addr, rssi, timestamp, null_mask = _encode_header(record)
+        start = len(out)
+        out += b"\x00\x00"
+        out += self.struct.pack(self.index, bt_addr, rssi, timestamp, null_mask)
+        encode_value(record.packet_type, out)
+        encode_value(record.fields, out)
+        encode_value(record[_INDEX_PROPERTIES], out)
+        _LENGTH.pack_into(out, start, len(out) - start - _LENGTH.size)
+
+    def decode(self, data, offset, end):
+        """Decode a record which has been encoded with encode."""
+        values = self.struct.unpack_from(data, offset)
+        packet_type, offset = decode_value(data, offset + self.struct.size)
+        header = _decode_header(packet_type, values, values[4])
+        fields, offset = decode_value(data, offset)
+        header[_INDEX_PROPERTIES], offset = decode_value(data, offset)
+        if offset != end:
+            raise ValueError("Record has trailing data")
+        return GenericRecord._make(header + [fields])
+
+
+_SCHEMAS = {cls: _BinarySchema(cls) for cls in PACKET_FIELDS}
+_SCHEMAS[None] = _GenericSchema()
+_SCHEMAS_BY_RECORD_TYPE = {schema.record_type: schema for schema in _SCHEMAS.values()}
+_SCHEMAS_BY_INDEX = {schema.index: schema for schema in _SCHEMAS.values()}
+
+
+def encode_binary(records, out=None):
+    """Append the binary encoding of all records to the bytearray out (a new one if None).
+
+    Returns:
+        The bytearray
+
+    Raises:
+        KeyError: A record is not one of records.RECORD_TYPES or a GenericRecord
+        ValueError: The fields of a GenericRecord can't be encoded
+    """
+    if out is None:
+        out = bytearray()
+    for record in records:
+        _SCHEMAS_BY_RECORD_TYPE[type(record)].encode(record, out)
+    return out
+
+
+def decode_binary(data):
+    """Decode all records which have been encoded with encode_binary.
+
+    Raises:
+        ValueError: The data is malformed
+    """
+    records = []
+    offset = 0
+    try:
+        while offset < len(data):
+            length = _LENGTH.unpack_from(data, offset)[0]
+            offset += _LENGTH.size
+            end = offset + length
+            if end > len(data):
+                raise ValueError("Record exceeds data")
+            schema = _SCHEMAS_BY_INDEX[data[offset]]
+            records.append(schema.decode(data, offset, end))
+            offset = end
+    except (struct.error, KeyError) as exc:
+        raise ValueError("Malformed record") from exc
+    return records
+
+
+def _json_default(value):
+    """Encode values which are not supported by JSON."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return value.hex()
+    raise TypeError("Can't encode value of type {}".format(type(value).__name__))
+
+
+_JSON_ENCODER = json.JSONEncoder(separators=(',', ':'), default=_json_default)
+
+
+def encode_json_lines(records, out=None):
+    """Append one JSON object per record to the bytearray out (a new one if None).
+
+    Returns:
+        The bytearray
+    """
+    if out is None:
+        out = bytearray()
+    encode = _JSON_ENCODER.encode
+    lines = [encode(dict(zip(record._fields, record))) for record in records]
+    if lines:
+        lines.append("")
+        out += "\n".join(lines).encode("utf-8")
+    return out
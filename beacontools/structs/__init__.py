@@ -1,2 +1,8 @@
-"""Packets supported by the parser."""
-from .common import LTVFrame
+"""Packets supported by the parser.
+
+Each struct parses the payload of a single AD structure, see parser.iter_ad_structures."""
+from .ibeacon import IBeaconMSD
+from .eddystone import EddystoneUIDFrame, EddystoneURLFrame, EddystoneTLMFrame, EddystoneEIDFrame
+from .estimote import EstimoteTelemetryFrame, EstimoteNearableFrame
+from .controlj import CJMonitorMSD
+from .exposure_notification import ExposureNotificationFrame
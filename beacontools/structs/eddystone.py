@@ -1,6 +1,6 @@
 """All low level structures used for parsing eddystone packets."""
-from construct import Struct, Byte, Switch, OneOf, Int8sl, Array, \
-                      GreedyString, Int16ub, Int16ul, Int32ub
+from construct import Struct, Byte, Switch, OneOf, Int8sl, Bytes, \
+                      GreedyBytes, Int16ub, Int16ul, Int32ub
 
 from ..const import EDDYSTONE_URL_SCHEMES, EDDYSTONE_TLM_UNENCRYPTED, EDDYSTONE_TLM_ENCRYPTED
 
@@ -8,8 +8,8 @@ from ..const import EDDYSTONE_URL_SCHEMES, EDDYSTONE_TLM_UNENCRYPTED, EDDYSTONE_
 
 EddystoneUIDFrame = Struct(
     "tx_power" / Int8sl,
-    "namespace" / Array(10, Byte),
-    "instance" / Array(6, Byte),
+    "namespace" / Bytes(10),
+    "instance" / Bytes(6),
     # commented out because it is not used anyway and there seem to be beacons which
     # don't send it at all (see https://github.com/citruz/beacontools/issues/39)
     # "rfu" / Array(2, Byte)
@@ -18,7 +18,8 @@ EddystoneUIDFrame = Struct(
 EddystoneURLFrame = Struct(
     "tx_power" / Int8sl,
     "url_scheme" / OneOf(Byte, list(EDDYSTONE_URL_SCHEMES)),
-    "url" / GreedyString(encoding="ascii")
+    # expanded by the packet class, see decode_url
+    "url" / GreedyBytes
 )
 
 UnencryptedTLMFrame = Struct(
@@ -29,7 +30,7 @@ UnencryptedTLMFrame = Struct(
 )
 
 EncryptedTLMFrame = Struct(
-    "encrypted_data" / Array(12, Byte),
+    "encrypted_data" / Bytes(12),
     "salt" / Int16ul,
     "mic" / Int16ul
 )
@@ -44,5 +45,5 @@ EddystoneTLMFrame = Struct(
 
 EddystoneEIDFrame = Struct(
     "tx_power" / Int8sl,
-    "eid" / Array(8, Byte)
+    "eid" / Bytes(8)
 )
@@ -1,5 +1,5 @@
 """All low level structures used for parsing Estimote packets."""
-from construct import Struct, Byte, Switch, Int8sl, Array, Int8ul, Const, Int16ul
+from construct import Struct, Byte, Switch, Int8sl, Array, Bytes, Int8ul, Const, Int16ul
 
 from ..const import ESTIMOTE_TELEMETRY_SUBFRAME_A, ESTIMOTE_TELEMETRY_SUBFRAME_B, \
                     ESTIMOTE_NEARABLE_FRAME
@@ -21,7 +21,7 @@ EstimoteTelemetrySubFrameB = Struct(
 )
 
 EstimoteTelemetryFrame = Struct(
-    "identifier" / Array(8, Byte),
+    "identifier" / Bytes(8),
     "subframe_type" / Byte,
     "sub_frame" / Switch(lambda ctx: ctx.subframe_type, {
         ESTIMOTE_TELEMETRY_SUBFRAME_A: EstimoteTelemetrySubFrameA,
@@ -31,7 +31,7 @@ EstimoteTelemetryFrame = Struct(
 
 EstimoteNearableFrame = Struct(
     Const(ESTIMOTE_NEARABLE_FRAME),
-    "identifier" / Array(8, Byte),
+    "identifier" / Bytes(8),
     "hardware_version" / Int8ul,
     "firmware_version" / Int8ul,
     "temperature" / Int16ul,
@@ -1,5 +1,4 @@
 """Utilities for byte conversion."""
-from binascii import hexlify
 from re import compile as compile_regex
 import array
 import struct
@@ -17,8 +16,8 @@ def is_valid_mac(mac):
 
 
 def data_to_hexstring(data):
-    """Convert an array of binary data to the hex representation as a string."""
-    return hexlify(data_to_binstring(data)).decode('ascii')
+    """Convert binary data (bytes or an array of ints) to the hex representation as a string."""
+    return data_to_binstring(data).hex()
 
 
 def data_to_uuid(data):
@@ -28,7 +27,9 @@ def data_to_uuid(data):
 
 
 def data_to_binstring(data):
-    """Convert an array of binary data to a binary string."""
+    """Convert binary data (bytes or an array of ints) to a binary string."""
+    if isinstance(data, bytes):
+        return data
     return array.array('B', data).tobytes()
 
 def mulaw_to_value(mudata):
@@ -36,13 +37,20 @@ def mulaw_to_value(mudata):
     position = ((mudata & 0xF0) >> 4) + 5
     return ((1 << position) | ((mudata & 0xF) << (position - 4)) | (1 << (position - 5))) - 33
 
+# two digit hex representation of every byte value
+_HEX_BYTES = tuple('%02x' % value for value in range(256))
+
+
 def bt_addr_to_string(addr):
     """Convert a binary string to the hex representation."""
-    addr_str = array.array('B', addr)
-    addr_str.reverse()
-    hex_str = hexlify(addr_str.tobytes()).decode('ascii')
-    # insert ":" seperator between the bytes
-    return ':'.join(a+b for a, b in zip(hex_str[::2], hex_str[1::2]))
+    # the address is transmitted in little endian byte order
+    return ':'.join([_HEX_BYTES[value] for value in bytes(addr)[::-1]])
+
+
+def string_to_bt_addr(addr_str):
+    """Convert the hex representation of a bluetooth address to a binary string (inverse of
+    bt_addr_to_string)."""
+    return bytes(reversed(bytes.fromhex(addr_str.replace(':', ''))))
 
 
 def is_one_of(obj, types):
@@ -54,19 +62,9 @@ def is_one_of(obj, types):
 
 
 def is_packet_type(cls):
-    """Check if class is one the packet types."""
-    # pylint: disable=import-outside-toplevel
-    from .packet_types import EddystoneUIDFrame, EddystoneURLFrame, \
-                              EddystoneEncryptedTLMFrame, EddystoneTLMFrame, \
-                              EddystoneEIDFrame, IBeaconAdvertisement, \
-                              EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, \
-                              ExposureNotificationFrame
-    # pylint: enable=import-outside-toplevel
-
-    return (cls in [EddystoneURLFrame, EddystoneUIDFrame, EddystoneEncryptedTLMFrame, \
-                    EddystoneTLMFrame, EddystoneEIDFrame, IBeaconAdvertisement, \
-                    EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, \
-                    ExposureNotificationFrame])
+    """Check if class is one the packet types (of a registered format)."""
+    from .registry import is_registered_packet_type  # pylint: disable=import-outside-toplevel
+    return is_registered_packet_type(cls)
 
 
 def to_int(string):
@@ -86,27 +84,19 @@ def bin_to_int(string):
 
 
 def get_mode(device_filter):
-    """Determine which beacons the scanner should look for."""
-    from .device_filters import IBeaconFilter, EddystoneFilter, BtAddrFilter, EstimoteFilter, \
-                                CJMonitorFilter, ExposureNotificationFilter  # pylint: disable=import-outside-toplevel
-
-    if device_filter is None or len(device_filter) == 0:
-        return ScannerMode.MODE_ALL
+    """Determine which beacons the scanner should look for (built-in formats only)."""
+    from .registry import select_packet_formats  # pylint: disable=import-outside-toplevel
 
     mode = ScannerMode.MODE_NONE
-    for filtr in device_filter:
-        if isinstance(filtr, IBeaconFilter):
-            mode |= ScannerMode.MODE_IBEACON
-        elif isinstance(filtr, EddystoneFilter):
-            mode |= ScannerMode.MODE_EDDYSTONE
-        elif isinstance(filtr, EstimoteFilter):
-            mode |= ScannerMode.MODE_ESTIMOTE
-        elif isinstance(filtr, CJMonitorFilter):
-            mode |= ScannerMode.MODE_CJMONITOR
-        elif isinstance(filtr, ExposureNotificationFilter):
-            mode |= ScannerMode.MODE_EXPOSURE_NOTIFICATION
-        elif isinstance(filtr, BtAddrFilter):
-            mode |= ScannerMode.MODE_ALL
-            break
-
+    for packet_format in select_packet_formats(device_filter):
+        mode |= packet_format.mode
     return mode
+
+
+def drain_socket(sock):
+    """Read everything which is waiting on a non-blocking socket (e.g. wakeup bytes)."""
+    try:
+        while sock.recv(4096):
+            pass
+    except BlockingIOError:
+        pass
@@ -0,0 +1,57 @@
+"""Micro benchmarks for the hot path of the scanner.
+
+Run with `python benchmarks/bench_scanner.py` with beacontools installed (or on the
+PYTHONPATH), no bluetooth hardware is needed.
+"""
+import array
+import timeit
+from binascii import hexlify
+
+from beacontools import BeaconScanner, BtAddrFilter, EddystoneFilter
+from beacontools.utils import bt_addr_to_string
+
+NUMBER = 100000
+
+BT_ADDR = b"\x35\x94\xef\xcd\xd6\x1c"
+UID_PACKET = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa" \
+             b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00" \
+             b"\x00\x00\x01\x00\x00\xdd"
+TLM_PACKET = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa" \
+             b"\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+
+
+def bt_addr_to_string_array(addr):
+    """Previous implementation of bt_addr_to_string, kept for comparison."""
+    addr_str = array.array('B', addr)
+    addr_str.reverse()
+    hex_str = hexlify(addr_str.tobytes()).decode('ascii')
+    # insert ":" seperator between the bytes
+    return ':'.join(a+b for a, b in zip(hex_str[::2], hex_str[1::2]))
+
+
+def bench(name, func, number=NUMBER):
+    """Run func number times and print the time per call."""
+    seconds = min(timeit.repeat(func, number=number, repeat=3))
+    print("{:<48} {:8.3f} us/call".format(name, seconds / number * 1e6))
+
+
+def main():
+    """Run all benchmarks."""
+    bench("bt_addr_to_string (array, hexlify)", lambda: bt_addr_to_string_array(BT_ADDR))
+    bench("bt_addr_to_string", lambda: bt_addr_to_string(BT_ADDR))
+
+    monitors = [
+        ("process_packet (no filter)", BeaconScanner(lambda *args: None)),
+        ("process_packet (eddystone filter)",
+         BeaconScanner(lambda *args: None, device_filter=EddystoneFilter(instance="000000000001"))),
+        ("process_packet (bt_addr filter, no match)",
+         BeaconScanner(lambda *args: None, device_filter=BtAddrFilter("aa:bb:cc:dd:ee:ff"))),
+    ]
+    for name, scanner in monitors:
+        mon = scanner._mon  # pylint: disable=protected-access
+        bench(name + " UID", lambda mon=mon: mon.process_packet(UID_PACKET), number=NUMBER // 10)
+        bench(name + " TLM", lambda mon=mon: mon.process_packet(TLM_PACKET), number=NUMBER // 10)
+
+
+if __name__ == "__main__":
+    main()
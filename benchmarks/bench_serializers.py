@@ -0,0 +1,50 @@
+"""Micro benchmarks for encoding records.
+
+Run with `python benchmarks/bench_serializers.py` with beacontools installed (or on the
+PYTHONPATH).
+"""
+import json
+import timeit
+
+from beacontools import parse_packet, parse_record
+from beacontools.serializers import encode_binary, encode_json_lines
+
+BATCH = 1000
+
+PACKETS = [
+    b"\x02\x01\x06\x03\x03\xaa\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89"
+    b"\x01\x00\x00\x00\x00\x00\x01\x00\x00",
+    b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00\x14\x67\x00"
+    b"\x00\x2a\xc4\xe4",
+    b"\x02\x01\x04\x1a\xff\x4c\x00\x02\x15\x00\x05\x00\x01\x00\x00\x10\x00\x80\x00\x00\x80\x5f"
+    b"\x9b\x01\x31\x00\x02\x6c\x66\xc3",
+    b"\x02\x01\x04\x03\x03\x9a\xfe\x17\x16\x9a\xfe\x22\x47\xa0\x38\xd5\xeb\x03\x26\x40\x01\xd8"
+    b"\x42\xed\x73\x49\x25\x66\xbc\x2e\x50",
+]
+
+
+def reflect(packet):
+    """Turn a packet into a dict by reflecting over its properties."""
+    return {name: getattr(packet, name) for name, value in vars(type(packet)).items()
+            if isinstance(value, property) and name != 'properties'}
+
+
+def bench(name, func, number=20):
+    """Run func number times and print the time per record."""
+    seconds = min(timeit.repeat(func, number=number, repeat=3))
+    print("{:<40} {:8.3f} us/record".format(name, seconds / number / BATCH * 1e6))
+
+
+def main():
+    """Run all benchmarks."""
+    packets = [parse_packet(PACKETS[i % len(PACKETS)]) for i in range(BATCH)]
+    records = [parse_record(PACKETS[i % len(PACKETS)], "1c:d6:cd:ef:94:35", -35, 1600000000.0)
+               for i in range(BATCH)]
+    bench("json.dumps per packet (reflection)",
+          lambda: "\n".join(json.dumps(reflect(packet), default=bytes.hex) for packet in packets))
+    bench("encode_json_lines", lambda: encode_json_lines(records))
+    bench("encode_binary", lambda: encode_binary(records))
+
+
+if __name__ == "__main__":
+    main()
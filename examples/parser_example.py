@@ -32,7 +32,7 @@ print("Seconds since boot: %d" % tlm_frame.seconds_since_boot)
 print("-----")
 
 # Eddystone TLM packet (encrypted)
-enc_tlm_packet = b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16\xaa\xfe\x20\x01\x41\x41\x41\x41\x41" \
+enc_tlm_packet = b"\x02\x01\x06\x03\x03\xaa\xfe\x15\x16\xaa\xfe\x20\x01\x41\x41\x41\x41\x41" \
                  b"\x41\x41\x41\x41\x41\x41\x41\xDE\xAD\xBE\xFF"
 enc_tlm_frame = parse_packet(enc_tlm_packet)
 print("Data: %s" % enc_tlm_frame.encrypted_data)
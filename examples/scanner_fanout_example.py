@@ -0,0 +1,29 @@
+import sys
+import time
+
+from beacontools import BeaconScanner, BeaconPublisher, BeaconSubscriber, IBeaconAdvertisement
+
+SOCKET_PATH = "/tmp/beacontools.sock"
+
+def callback(bt_addr, rssi, packet, additional_info):
+    print("<%s, %d> %s %s" % (bt_addr, rssi, packet, additional_info))
+
+if len(sys.argv) > 1 and sys.argv[1] == "publish":
+    # run a single scanner which shares all advertisements with the subscribers
+    publisher = BeaconPublisher(SOCKET_PATH)
+    publisher.start()
+    scanner = BeaconScanner(publisher)
+    scanner.start()
+    try:
+        while True:
+            time.sleep(10)
+            print(publisher.stats())
+    except KeyboardInterrupt:
+        scanner.stop()
+        publisher.stop()
+else:
+    # receive all iBeacon advertisements from the publisher
+    subscriber = BeaconSubscriber(callback, SOCKET_PATH, packet_filter=IBeaconAdvertisement)
+    subscriber.start()
+    time.sleep(10)
+    subscriber.stop()
@@ -3,7 +3,6 @@
 from setuptools import setup, find_packages
 from codecs import open
 from os import path
-import sys
 
 here = path.abspath(path.dirname(__file__))
 
@@ -34,11 +33,13 @@ setup(
         'License :: OSI Approved :: MIT License',
 
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
     ],
 
+    # lazy loading of the submodules relies on module level __getattr__ (PEP 562)
+    python_requires='>=3.7',
+
     keywords='beacons ibeacon eddystone bluetooth low energy ble',
 
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
@@ -61,13 +62,16 @@ setup(
     # for example:
     # $ pip install -e .[dev,test]
     extras_require={
-        'scan': ['PyBluez==0.23'] if sys.platform.startswith("linux") else [],
+        # scanning only needs the standard library, kept for compatibility
+        'scan': [],
+        'crypto': ['cryptography'],
         'dev': ['check-manifest'],
         'test': [
             'coveralls~=2.1',
             'pytest~=6.0',
             'pytest-cov~=2.10',
             'mock~=4.0',
+            'cryptography',
             'check-manifest',
             'pylint',
             'readme_renderer',
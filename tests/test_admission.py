@@ -0,0 +1,38 @@
+"""Test the admission policy of the scanner."""
+import unittest
+
+from beacontools.admission import AdmissionPolicy
+from beacontools.flood import FloodGuard
+
+ADDR = b"\xff\xee\xdd\xcc\xbb\xaa"
+OTHER = b"\x35\x94\xef\xcd\xd6\x1c"
+
+
+class TestAdmissionPolicy(unittest.TestCase):
+    """Test the checks of the report header."""
+
+    def test_admit(self):
+        """Advertisements are dropped by blocklist, RSSI and flood guard and counted."""
+        policy = AdmissionPolicy(min_rssi=-80, blocklist=["aa:bb:cc:dd:ee:ff"],
+                                 flood_guard=FloodGuard(max_rate=1, window=1.0))
+        self.assertEqual(policy.blocklist, {ADDR})
+        self.assertFalse(policy.admit(ADDR, -20))
+        self.assertFalse(policy.admit(OTHER, -90))
+        self.assertTrue(policy.admit(OTHER, -20))
+        self.assertFalse(policy.admit(OTHER, -20))
+        self.assertEqual(policy.drops, {'rssi': 1, 'blocked': 1, 'flood': 1, 'overload': 0})
+
+    def test_block(self):
+        """Addresses can be blocked and unblocked with their string form."""
+        policy = AdmissionPolicy()
+        self.assertTrue(policy.admit(ADDR, -20))
+        policy.block("aa:bb:cc:dd:ee:ff", "1c:d6:cd:ef:94:35")
+        self.assertEqual(policy.blocklist, {ADDR, OTHER})
+        self.assertFalse(policy.admit(ADDR, -20))
+        policy.unblock("aa:bb:cc:dd:ee:ff")
+        self.assertEqual(policy.blocklist, {OTHER})
+        self.assertTrue(policy.admit(ADDR, -20))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""Test the Linux hci socket backend."""
+import socket
+import struct
+import threading
+import unittest
+
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+from beacontools.backend import linux
+from beacontools.const import SOL_HCI, HCI_FILTER, LE_META_EVENT, EVT_CMD_COMPLETE, \
+                              EVT_CMD_STATUS, OGF_LE_CTL, OCF_LE_READ_WHITE_LIST_SIZE, \
+                              OGF_INFO_PARAM, OCF_READ_LOCAL_VERSION
+
+
+class FakeHciSocket(object):
+    """One end of a socketpair which remembers the hci filter."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.hci_filter = linux.hci_filter([LE_META_EVENT])
+        self.filters = []
+
+    def setsockopt(self, level, option, value):
+        assert (level, option) == (SOL_HCI, HCI_FILTER)
+        self.hci_filter = value
+        self.filters.append(value)
+
+    def getsockopt(self, level, option, size):
+        assert (level, option, size) == (SOL_HCI, HCI_FILTER, len(self.hci_filter))
+        return self.hci_filter
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+class FakeController(threading.Thread):
+    """Answer every command with the given events."""
+
+    def __init__(self, sock, responses):
+        super(FakeController, self).__init__(daemon=True)
+        self.sock = sock
+        self.responses = responses
+        self.commands = []
+
+    def run(self):
+        command = self.sock.recv(260)
+        self.commands.append(command)
+        for event, params in self.responses:
+            self.sock.send(bytes([0x04, event, len(params)]) + params)
+
+
+class TestLinuxBackend(unittest.TestCase):
+    """Test the hci requests without a controller."""
+
+    def setUp(self):
+        # hci sockets preserve packet boundaries
+        host, controller = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.addCleanup(host.close)
+        self.addCleanup(controller.close)
+        self.host = FakeHciSocket(host)
+        self.controller = controller
+
+    def request(self, responses, ogf=OGF_LE_CTL, ocf=OCF_LE_READ_WHITE_LIST_SIZE,
+                event=EVT_CMD_COMPLETE, rlen=2, timeout=0):
+        """Run a request against a fake controller."""
+        controller = FakeController(self.controller, responses)
+        controller.start()
+        try:
+            return linux.send_req(self.host, ogf, ocf, event, rlen, bytes(), timeout)
+        finally:
+            controller.join(1)
+            self.assertEqual(controller.commands,
+                             [struct.pack("<BHB", 1, linux.opcode_of(ogf, ocf), 0)])
+
+    def test_filter(self):
+        """Only the given events pass the filter."""
+        self.assertEqual(linux.hci_filter([LE_META_EVENT]),
+                         struct.pack("<IIIH", 0x10, 0, 1 << 30, 0))
+        self.assertEqual(linux.hci_filter([EVT_CMD_COMPLETE, EVT_CMD_STATUS], 0x200f),
+                         struct.pack("<IIIH", 0x10, 0xc000, 0, 0x200f))
+
+    def test_command_complete(self):
+        """The return parameters of command complete are returned."""
+        opcode = linux.opcode_of(OGF_LE_CTL, OCF_LE_READ_WHITE_LIST_SIZE)
+        resp = self.request([
+            # other command and unrelated status first
+            (EVT_CMD_COMPLETE, struct.pack("<BH", 1, opcode + 1) + b"\x01\x02"),
+            (EVT_CMD_STATUS, struct.pack("<BBH", 0, 1, opcode + 1)),
+            (EVT_CMD_COMPLETE, struct.pack("<BH", 1, opcode) + b"\x00\x08\xff"),
+        ])
+        self.assertEqual(resp, b"\x00\x08")
+        # the filter was widened for the request and restored afterwards
+        self.assertEqual(self.host.filters, [
+            linux.hci_filter([EVT_CMD_COMPLETE, EVT_CMD_STATUS], opcode),
+            linux.hci_filter([LE_META_EVENT]),
+        ])
+
+    def test_command_rejected(self):
+        """A failed command status raises an OSError."""
+        opcode = linux.opcode_of(OGF_INFO_PARAM, OCF_READ_LOCAL_VERSION)
+        with self.assertRaises(OSError):
+            self.request([(EVT_CMD_STATUS, struct.pack("<BBH", 0x01, 1, opcode))],
+                         OGF_INFO_PARAM, OCF_READ_LOCAL_VERSION)
+        self.assertEqual(self.host.hci_filter, linux.hci_filter([LE_META_EVENT]))
+
+    def test_timeout(self):
+        """Requests without a response time out and restore the filter."""
+        with self.assertRaises(TimeoutError):
+            self.request([], timeout=50)
+        self.assertEqual(self.host.hci_filter, linux.hci_filter([LE_META_EVENT]))
+
+    def test_send_cmd(self):
+        """Commands are prefixed with the packet type, opcode and length."""
+        linux.send_cmd(self.host, OGF_LE_CTL, 0x000c, b"\x01\x00")
+        self.assertEqual(self.controller.recv(260), b"\x01\x0c\x20\x02\x01\x00")
+
+    def test_open_dev(self):
+        """The device socket is bound to the device and only receives LE meta events."""
+        with patch.object(linux, 'socket') as socket_module:
+            sock = linux.open_dev(1)
+        self.assertIs(sock, socket_module.socket.return_value)
+        socket_module.socket.assert_called_once_with(socket_module.AF_BLUETOOTH,
+                                                     socket_module.SOCK_RAW,
+                                                     socket_module.BTPROTO_HCI)
+        sock.bind.assert_called_once_with((1,))
+        sock.setsockopt.assert_called_once_with(SOL_HCI, HCI_FILTER,
+                                                linux.hci_filter([LE_META_EVENT]))
+
+    def test_open_dev_failure(self):
+        """The socket is closed if the device can not be bound."""
+        sock = MagicMock()
+        sock.bind.side_effect = OSError(19, "No such device")
+        with patch.object(linux, 'socket') as socket_module:
+            socket_module.socket.return_value = sock
+            with self.assertRaises(OSError):
+                linux.open_dev(5)
+        sock.close.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Test counting distinct devices."""
+import os
+import unittest
+
+from beacontools import parse_packet
+from beacontools.density import DistinctCounter, DistinctDeviceCounter, HyperLogLog, \
+                                hash_identifier
+
+EXPOSURE_PACKET = b"\x02\x01\x1a\x03\x03\x6f\xfd\x17\x16\x6f\xfd\x0d\x3b\x4f\x65\x58\x4c\x58" \
+                  b"\x21\x60\x57\x1d\xd1\x90\x10\xd4\x1c\x26\x60\xee\x34\xd1"
+IBEACON_PACKET = b"\x02\x01\x06\x1a\xff\x4c\x00\x02\x15\x41\x41\x41\x41\x41\x41\x41\x41\x41" \
+                 b"\x41\x41\x41\x41\x41\x41\x41\x00\x01\x00\x02\xf8"
+
+
+class TestDensity(unittest.TestCase):
+    """Test the distinct counters."""
+
+    def test_hyperloglog(self):
+        """The estimate is close to the real number of distinct values."""
+        for count in (10, 1000, 50000):
+            estimator = HyperLogLog(precision=12)
+            for i in range(count):
+                hashed = hash_identifier(i.to_bytes(16, "big"))
+                estimator.add(hashed)
+                estimator.add(hashed)
+            self.assertAlmostEqual(estimator.count() / count, 1.0, delta=0.05)
+        self.assertEqual(HyperLogLog().count(), 0)
+        for precision in (3, 17):
+            with self.assertRaises(ValueError):
+                HyperLogLog(precision)
+
+    def test_distinct_counter(self):
+        """Exact up to the threshold, estimated afterwards."""
+        counter = DistinctCounter(threshold=100)
+        for i in range(100):
+            counter.add(hash_identifier(str(i)))
+            counter.add(hash_identifier(str(i)))
+        self.assertEqual((counter.count(), counter.exact), (100, True))
+        for i in range(100, 5000):
+            counter.add(hash_identifier(str(i)))
+        self.assertFalse(counter.exact)
+        self.assertAlmostEqual(counter.count() / 5000, 1.0, delta=0.05)
+
+    def test_windows(self):
+        """Identifiers are counted per window, old windows are dropped."""
+        counter = DistinctDeviceCounter(window=60, max_windows=2)
+        for i in range(10):
+            counter.add(os.urandom(16), timestamp=120.0 + i)
+        counter.add("a", timestamp=60.0)
+        counter.add("a", timestamp=61.0)
+        counter.add("a", timestamp=125.0)
+        self.assertEqual(counter.counts(), [(60.0, 1, True), (120.0, 11, True)])
+        counter.add("b", timestamp=190.0)
+        self.assertEqual(counter.counts(), [(120.0, 11, True), (180.0, 1, True)])
+        # too late for the kept windows
+        counter.add("c", timestamp=10.0)
+        self.assertEqual([start for start, _, _ in counter.counts()], [120.0, 180.0])
+        for kwargs in ({"window": 0}, {"max_windows": 0}):
+            with self.assertRaises(ValueError):
+                DistinctDeviceCounter(**kwargs)
+
+    def test_callback(self):
+        """Only exposure notifications are counted."""
+        counter = DistinctDeviceCounter()
+        counter("aa:bb:cc:dd:ee:ff", -50, parse_packet(EXPOSURE_PACKET), {})
+        counter("aa:bb:cc:dd:ee:ff", -50, parse_packet(EXPOSURE_PACKET), {})
+        counter("aa:bb:cc:dd:ee:ff", -50, parse_packet(IBEACON_PACKET), {})
+        self.assertEqual([count for _, count, _ in counter.counts()], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
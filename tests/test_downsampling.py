@@ -0,0 +1,96 @@
+"""Test downsampling of telemetry."""
+import unittest
+
+from beacontools import parse_packet, EddystoneTLMFrame
+from beacontools.downsampling import AGGREGATE_TYPES, Downsampler, beacon_identity
+
+TLM_PACKET = b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00" \
+             b"\x14\x67\x00\x00\x2a\xc4\xe4"
+ESTIMOTE_B_PACKET = b"\x02\x01\x04\x03\x03\x9a\xfe\x17\x16\x9a\xfe\x22\x47\xa0\x38\xd5\xeb\x03" \
+                    b"\x26\x40\x01\xd8\x42\xed\x73\x49\x25\x66\xbc\x2e\x50"
+IBEACON_PACKET = b"\x02\x01\x06\x1a\xff\x4c\x00\x02\x15\x41\x41\x41\x41\x41\x41\x41\x41\x41" \
+                 b"\x41\x41\x41\x41\x41\x41\x41\x00\x01\x00\x02\xf8"
+
+
+def tlm(voltage, temperature):
+    """Build a TLM frame with the given voltage and temperature."""
+    return EddystoneTLMFrame({'voltage': voltage, 'temperature': int(temperature * 256),
+                              'advertising_count': 0, 'seconds_since_boot': 0})
+
+
+class TestDownsampling(unittest.TestCase):
+    """Test the Downsampler."""
+
+    def test_windows(self):
+        """One aggregate per beacon and window with exact statistics."""
+        aggregates = []
+        downsampler = Downsampler(aggregates.append, window=10)
+        downsampler.add("a", tlm(3000, 20.0), timestamp=100.0)
+        downsampler.add("a", tlm(2900, 22.0), timestamp=101.0)
+        downsampler.add("a", tlm(2950, 21.5), timestamp=109.9)
+        downsampler.add("b", tlm(3100, 25.0), timestamp=105.0)
+        self.assertEqual(aggregates, [])
+        # next window of beacon a, the window of the quiet beacon b is over as well
+        downsampler.add("a", tlm(2800, 19.0), timestamp=110.0)
+        # too late, the windows have been emitted
+        downsampler.add("a", tlm(1, 1.0), timestamp=108.0)
+        downsampler.add("b", tlm(1, 1.0), timestamp=109.0)
+        self.assertEqual(aggregates[0], AGGREGATE_TYPES[EddystoneTLMFrame](
+            "EddystoneTLMFrame", "a", 100.0, 110.0, 3,
+            2900, 3000, 2950, 2950, 20.0, 22.0, 21.166666666666668, 21.5))
+        self.assertEqual(aggregates[0].voltage_mean, 2950)
+        self.assertEqual([(agg.beacon, agg.window_start, agg.samples) for agg in aggregates[1:]],
+                         [("b", 100.0, 1)])
+
+        downsampler.flush(now=115.0)
+        self.assertEqual(len(aggregates), 2)
+        downsampler.flush()
+        self.assertEqual([(agg.beacon, agg.window_start, agg.voltage_last)
+                          for agg in aggregates[2:]], [("a", 110.0, 2800)])
+        self.assertEqual(downsampler._windows, {})
+        with self.assertRaises(ValueError):
+            Downsampler(aggregates.append, window=0)
+
+    def test_quiet_beacons(self):
+        """Windows of beacons which stopped sending are emitted and forgotten."""
+        aggregates = []
+        downsampler = Downsampler(aggregates.append, window=10)
+        for beacon in range(100):
+            downsampler.add(beacon, tlm(3000, 20.0), timestamp=100.0 + beacon * 0.01)
+        downsampler.add("other", tlm(3000, 20.0), timestamp=125.0)
+        self.assertEqual(len(aggregates), 100)
+        self.assertEqual(list(downsampler._windows), [(EddystoneTLMFrame, "other")])
+
+    def test_callback(self):
+        """Telemetry packets are aggregated per beacon, None values are skipped."""
+        aggregates = []
+        downsampler = Downsampler(aggregates.append)
+        estimote = parse_packet(ESTIMOTE_B_PACKET)
+        for _ in range(3):
+            downsampler("aa:bb:cc:dd:ee:ff", -50, estimote, estimote.properties)
+            downsampler("aa:bb:cc:dd:ee:ff", -50, parse_packet(TLM_PACKET), None)
+            downsampler("aa:bb:cc:dd:ee:ff", -50, parse_packet(IBEACON_PACKET), {})
+        estimote._battery_level = None
+        downsampler("aa:bb:cc:dd:ee:ff", -50, estimote, estimote.properties)
+        downsampler.flush()
+        self.assertEqual(sorted((agg.packet_type, agg.beacon, agg.samples) for agg in aggregates),
+                         [("EddystoneTLMFrame", "aa:bb:cc:dd:ee:ff", 3),
+                          ("EstimoteTelemetryFrameB", "47a038d5eb032640", 4)])
+        estimote_aggregate = [agg for agg in aggregates if agg.samples == 4][0]
+        self.assertEqual(estimote_aggregate.battery_level_mean, 80)
+        self.assertEqual(estimote_aggregate.battery_level_last, 80)
+        self.assertEqual(estimote_aggregate.temperature_mean, estimote.temperature)
+
+    def test_identity(self):
+        """Test the identity of beacons."""
+        packet = parse_packet(TLM_PACKET)
+        self.assertEqual(beacon_identity("x", packet, {"beacon_id": "a"}), "a")
+        self.assertEqual(beacon_identity("x", packet, {"namespace": "n", "instance": "i"}),
+                         ("n", "i"))
+        self.assertEqual(beacon_identity("x", packet, None), "x")
+        self.assertEqual(beacon_identity("x", parse_packet(ESTIMOTE_B_PACKET), {}),
+                         "47a038d5eb032640")
+
+
+if __name__ == "__main__":
+    unittest.main()
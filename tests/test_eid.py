@@ -0,0 +1,140 @@
+"""Test resolution of Eddystone EIDs."""
+import sys
+import time
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+try:
+    import cryptography  # pylint: disable=unused-import
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+from beacontools import BeaconScanner, EddystoneEIDFrame, EddystoneTLMFrame
+
+IDENTITY_KEY = bytes(range(16))
+
+
+def eid_event(eid):
+    """Build an advertising report event with an EID frame sent from 1c:d6:cd:ef:94:35."""
+    data = b"\x02\x01\x06\x03\x03\xaa\xfe\x0d\x16\xaa\xfe\x30\xe3" + eid
+    return b"\x04\x3e" + bytes([len(data) + 12, 0x02, 0x01, 0x03, 0x01]) + \
+        b"\x35\x94\xef\xcd\xd6\x1c" + bytes([len(data)]) + data + b"\xdd"
+
+
+@unittest.skipUnless(HAS_CRYPTOGRAPHY, "requires cryptography")
+class TestEID(unittest.TestCase):
+    """Test the EIDResolver."""
+
+    def setUp(self):
+        # pylint: disable=import-outside-toplevel
+        from beacontools.eid import EIDResolver, compute_eid
+        self.resolver_cls = EIDResolver
+        self.compute_eid = compute_eid
+
+    def test_compute_eid(self):
+        """The EID only changes at the start of a rotation period."""
+        eid = self.compute_eid(IDENTITY_KEY, 4, 32)
+        self.assertEqual(len(eid), 8)
+        self.assertEqual(self.compute_eid(IDENTITY_KEY, 4, 47), eid)
+        self.assertNotEqual(self.compute_eid(IDENTITY_KEY, 4, 48), eid)
+        self.assertNotEqual(self.compute_eid(IDENTITY_KEY, 5, 32), eid)
+        self.assertNotEqual(self.compute_eid(bytes(16), 4, 32), eid)
+
+    def test_resolve(self):
+        """Current and adjacent EIDs are resolved."""
+        resolver = self.resolver_cls()
+        resolver.register("a", IDENTITY_KEY, 4, beacon_time=1000, timestamp=5000.0)
+        resolver.register("b", bytes(16), 10, beacon_time=0, timestamp=5000.0)
+        resolver.refresh(now=5005.0)
+        # beacon "a" is at 1005 now, its period started at 992
+        for beacon_time in (976, 992, 1007, 1008, 1023):
+            self.assertEqual(resolver.resolve(self.compute_eid(IDENTITY_KEY, 4, beacon_time)),
+                             {"beacon_id": "a"}, beacon_time)
+        for beacon_time in (975, 1024):
+            self.assertIsNone(resolver.resolve(self.compute_eid(IDENTITY_KEY, 4, beacon_time)))
+        self.assertEqual(resolver.resolve(self.compute_eid(bytes(16), 10, 5)), {"beacon_id": "b"})
+        self.assertEqual(resolver.next_refresh, 5000.0 - 1000 + 1008)
+
+        resolver.unregister("b")
+        resolver.refresh(now=5005.0)
+        self.assertIsNone(resolver.resolve(self.compute_eid(bytes(16), 10, 5)))
+
+        for args in [(bytes(15), 4), (IDENTITY_KEY, -1), (IDENTITY_KEY, 16)]:
+            with self.assertRaises(ValueError):
+                resolver.register("c", *args)
+        with self.assertRaises(ValueError):
+            self.resolver_cls(adjacent_periods=-1)
+
+    def test_incremental(self):
+        """Only the EIDs of registered, removed or rotated beacons are computed."""
+        resolver = self.resolver_cls(adjacent_periods=0)
+        aes_encrypt = resolver._aes_encrypt
+        resolver._aes_encrypt = MagicMock(side_effect=aes_encrypt)
+        for beacon in range(20):
+            resolver.register(beacon, bytes([beacon]) * 16, 15, timestamp=1000.0)
+        # one EID per beacon, two AES operations per EID
+        self.assertEqual(resolver._aes_encrypt.call_count, 40)
+
+        resolver.register("fast", IDENTITY_KEY, 0, timestamp=1000.0)
+        self.assertEqual(resolver._aes_encrypt.call_count, 42)
+        removed_eid = resolver._entries[3][0][0]
+        self.assertEqual(resolver.resolve(removed_eid), {"beacon_id": 3})
+        resolver.unregister(3)
+        self.assertEqual(resolver._aes_encrypt.call_count, 42)
+        self.assertIsNone(resolver.resolve(removed_eid))
+        self.assertEqual(resolver.resolve(resolver._entries[4][0][0]), {"beacon_id": 4})
+        self.assertEqual(len(resolver._table), 20)
+
+        # the beacon with the short rotation is due, the others are not
+        now = resolver.next_refresh
+        self.assertLess(now, resolver._entries[0][1])
+        resolver.refresh_due(now)
+        self.assertEqual(resolver._aes_encrypt.call_count, 44)
+        self.assertGreater(resolver.next_refresh, now)
+        self.assertEqual(len(resolver._table), 20)
+
+    def test_background_refresh(self):
+        """The table is recomputed when a beacon rotates."""
+        resolver = self.resolver_cls(adjacent_periods=0)
+        # the beacon clock reaches 1 in 50ms
+        resolver.register("a", IDENTITY_KEY, 0, beacon_time=0.95)
+        self.assertIsNotNone(resolver.resolve(self.compute_eid(IDENTITY_KEY, 0, 0)))
+        resolver.start()
+        try:
+            deadline = time.monotonic() + 5
+            while resolver.resolve(self.compute_eid(IDENTITY_KEY, 0, 0)) is not None:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+        finally:
+            resolver.stop()
+
+    def test_scanner(self):
+        """Resolved EIDs are reported in the properties, also for TLM frames."""
+        sys.platform = "linux"
+        resolver = self.resolver_cls()
+        resolver.register("a", IDENTITY_KEY, 8, beacon_time=256, timestamp=time.time())
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, eid_resolver=resolver)
+
+        scanner._mon.process_packet(eid_event(b"\x00" * 8))
+        self.assertIsNone(callback.call_args[0][3])
+
+        scanner._mon.process_packet(eid_event(self.compute_eid(IDENTITY_KEY, 8, 256)))
+        self.assertIsInstance(callback.call_args[0][2], EddystoneEIDFrame)
+        self.assertEqual(callback.call_args[0][3], {"beacon_id": "a"})
+
+        tlm = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+              b"\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+        scanner._mon.process_packet(tlm)
+        self.assertIsInstance(callback.call_args[0][2], EddystoneTLMFrame)
+        self.assertEqual(callback.call_args[0][3], {"beacon_id": "a"})
+        self.assertEqual(callback.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
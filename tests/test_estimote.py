@@ -0,0 +1,112 @@
+"""Test the table driven decoding of Estimote packets."""
+import unittest
+
+from beacontools.packet_types.estimote import EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, \
+                                              EstimoteNearable
+
+IDENTIFIER = [0x47, 0xa0, 0x38, 0xd5, 0xeb, 0x03, 0x26, 0x40]
+
+
+def reference_motion_state(val):
+    """Motion state in seconds as specified by Estimote."""
+    number = val & 0b00111111
+    unit = (val & 0b11000000) >> 6
+    if unit == 1:
+        number *= 60
+    elif unit == 2:
+        number *= 60 * 60
+    elif unit == 3 and number < 32:
+        number *= 60 * 60 * 24
+    elif unit == 3:
+        number -= 32
+        number *= 60 * 60 * 24 * 7
+    return number
+
+
+def reference_ambient_light(val):
+    """Ambient light in lux as specified by Estimote."""
+    upper = (val & 0b11110000) >> 4
+    lower = val & 0b00001111
+    if upper == 0xf and lower == 0xf:
+        return None
+    return pow(2, upper) * lower * 0.72
+
+
+def reference_uptime(byte0, byte1):
+    """Uptime in seconds as specified by Estimote."""
+    unit = (byte1 & 0b00110000) >> 4
+    number = ((byte1 & 0b00001111) << 8) | byte0
+    return number * {1: 60, 2: 60 * 60, 3: 60 * 60 * 24}.get(unit, 0)
+
+
+def reference_temperature(raw):
+    """Temperature in celsius from a 12 bit signed value."""
+    raw &= 0x0fff
+    if raw > 2047:
+        raw -= 4096
+    return raw / 16.0
+
+
+def subframe_a(acceleration=(0, 0, 0), previous=0, current=0, combined=(0, 0, 0, 0, 0)):
+    """Build the data of a telemetry subframe A."""
+    return {'identifier': IDENTIFIER, 'sub_frame': {
+        'acceleration': list(acceleration), 'previous_motion': previous,
+        'current_motion': current, 'combined_fields': list(combined)}}
+
+
+def subframe_b(magnetic_field=(0, 0, 0), ambient_light=0, combined=(0, 0, 0, 0, 0), battery=0):
+    """Build the data of a telemetry subframe B."""
+    return {'identifier': IDENTIFIER, 'sub_frame': {
+        'magnetic_field': list(magnetic_field), 'ambient_light': ambient_light,
+        'combined_fields': list(combined), 'battery_level': battery}}
+
+
+class TestEstimoteTables(unittest.TestCase):
+    """Compare the decoded values with the formulas for all byte values."""
+
+    def test_subframe_a(self):
+        """Motion state, acceleration and GPIO states."""
+        for val in range(256):
+            signed = val - 256 if val > 127 else val
+            frame = EstimoteTelemetryFrameA(subframe_a((signed, 0, ~signed), val, 255 - val,
+                                                       (val, 0, 0, 0, 0)), 2)
+            self.assertEqual(frame.previous_motion_state, reference_motion_state(val))
+            self.assertEqual(frame.current_motion_state, reference_motion_state(255 - val))
+            self.assertEqual(EstimoteTelemetryFrameA.parse_motion_state(val),
+                             reference_motion_state(val))
+            self.assertEqual(frame.acceleration, (signed * 2 / 127.0, 0.0, ~signed * 2 / 127.0))
+            self.assertEqual(frame.gpio_states, tuple((val & (1 << (4+i))) != 0 for i in range(4)))
+            self.assertIsInstance(frame.gpio_states, tuple)
+            self.assertEqual(frame.is_moving, (val & 0b11) == 1)
+
+    def test_subframe_b(self):
+        """Ambient light, magnetic field, uptime and temperature."""
+        for val in range(256):
+            signed = val - 256 if val > 127 else val
+            frame = EstimoteTelemetryFrameB(subframe_b((signed, 1, 0), val, (0, 0, 0, 0, 0)), 1)
+            self.assertEqual(frame.ambient_light, reference_ambient_light(val))
+            self.assertEqual(frame.magnetic_field, (signed / 128.0, 1 / 128.0, 0.0))
+        self.assertIsNone(EstimoteTelemetryFrameB(subframe_b((-1, -1, -1)), 1).magnetic_field)
+
+        for byte1 in range(256):
+            for byte0 in (0, 1, 0x80, 0xff):
+                frame = EstimoteTelemetryFrameB(subframe_b(combined=(byte0, byte1, 0, 0, 0)), 1)
+                self.assertEqual(frame.uptime, reference_uptime(byte0, byte1))
+
+        for raw in range(4096):
+            combined = (0, (raw & 0b11) << 6, (raw >> 2) & 0xff, raw >> 10, 0)
+            frame = EstimoteTelemetryFrameB(subframe_b(combined=combined), 1)
+            self.assertEqual(frame.temperature, reference_temperature(raw))
+
+    def test_nearable(self):
+        """Temperature of nearables, the upper 4 bits are ignored."""
+        for raw in range(0, 65536, 7):
+            frame = EstimoteNearable({'identifier': IDENTIFIER, 'hardware_version': 1,
+                                      'firmware_version': 1, 'temperature': raw,
+                                      'is_moving': raw & 0xff})
+            self.assertEqual(frame.temperature, reference_temperature(raw))
+            self.assertEqual(frame.is_moving, raw & 0b01000000 != 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+"""Test decryption of Eddystone eTLM frames."""
+import struct
+import sys
+import threading
+import time
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+try:
+    from cryptography.hazmat.primitives import cmac
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+from beacontools import BeaconScanner, parse_packet, EddystoneEncryptedTLMFrame, EddystoneTLMFrame
+
+IDENTITY_KEY = bytes(range(16))
+TLM_DATA = struct.pack(">HHII", 2840, 0x1380, 5223, 10948)
+BT_ADDR = b"\x35\x94\xef\xcd\xd6\x1c"
+
+
+def eax_encrypt(key, nonce, header, message):
+    """EAX encryption, returns ciphertext and tag."""
+    def omac(tweak, data):
+        mac = cmac.CMAC(algorithms.AES(key))
+        mac.update(b"\x00" * 15 + bytes([tweak]) + data)
+        return mac.finalize()
+    nonce_mac = omac(0, nonce)
+    header_mac = omac(1, header)
+    encryptor = Cipher(algorithms.AES(key), modes.CTR(nonce_mac)).encryptor()
+    ciphertext = encryptor.update(message) + encryptor.finalize()
+    tag = bytes(a ^ b ^ c for a, b, c in zip(nonce_mac, header_mac, omac(2, ciphertext)))
+    return ciphertext, tag
+
+
+def etlm_packet(beacon_time, rotation_exponent, salt=b"\xbe\xef", data=TLM_DATA):
+    """Build an eTLM frame as sent by a beacon with IDENTITY_KEY."""
+    beacon_time = (beacon_time >> rotation_exponent) << rotation_exponent
+    ciphertext, tag = eax_encrypt(IDENTITY_KEY, struct.pack(">I", beacon_time) + salt, b"", data)
+    return b"\x02\x01\x06\x03\x03\xaa\xfe\x15\x16\xaa\xfe\x20\x01" + ciphertext + salt + tag[:2]
+
+
+def advertising_report(data):
+    """Build an advertising report event sent from BT_ADDR."""
+    return b"\x04\x3e" + bytes([len(data) + 12, 0x02, 0x01, 0x03, 0x01]) + BT_ADDR + \
+        bytes([len(data)]) + data + b"\xdd"
+
+
+@unittest.skipUnless(HAS_CRYPTOGRAPHY, "requires cryptography")
+class TestETLM(unittest.TestCase):
+    """Test the ETLMDecryptor."""
+
+    def setUp(self):
+        # pylint: disable=import-outside-toplevel
+        from beacontools.eid import EIDResolver
+        from beacontools.etlm import ETLMDecryptor
+        self.resolver = EIDResolver()
+        self.resolver.register("a", IDENTITY_KEY, 10, beacon_time=5000, timestamp=100000.0)
+        self.decryptor_cls = ETLMDecryptor
+
+    def test_eax(self):
+        """The EAX helper of the tests matches the test vectors of the EAX paper."""
+        tests = [
+            ("233952DEE4D5ED5F9B9C6D6FF80FF478", "62EC67F9C3A4A407FCB2A8C49031A8B3",
+             "6BFB914FD07EAE6B", "", "E037830E8389F27B025A2D6527E79D01"),
+            ("91945D3F4DCBEE0BF45EF52255F095A4", "BECAF043B0A23D843194BA972C66DEBD",
+             "FA3BFD4806EB53FA", "F7FB", "19DD5C4C9331049D0BDAB0277408F67967E5"),
+        ]
+        for key, nonce, header, message, expected in tests:
+            ciphertext, tag = eax_encrypt(bytes.fromhex(key), bytes.fromhex(nonce),
+                                          bytes.fromhex(header), bytes.fromhex(message))
+            self.assertEqual((ciphertext + tag).hex().upper(), expected)
+
+    def test_decrypt(self):
+        """Frames of the current and adjacent periods are decrypted."""
+        decryptor = self.decryptor_cls(self.resolver, MagicMock())
+        # beacon time is 5000 + 100 at this point
+        for beacon_time in (5100, 4000, 5200):
+            packet = parse_packet(etlm_packet(beacon_time, 10))
+            self.assertIsInstance(packet, EddystoneEncryptedTLMFrame)
+            tlm = decryptor.decrypt("a", packet, timestamp=100100.0)
+            self.assertIsInstance(tlm, EddystoneTLMFrame)
+            self.assertEqual((tlm.voltage, tlm.temperature, tlm.advertising_count,
+                              tlm.seconds_since_boot), (2840, 19.5, 5223, 10948))
+
+        self.assertIsNone(decryptor.decrypt("a", parse_packet(etlm_packet(2000, 10)), 100100.0))
+        self.assertIsNone(decryptor.decrypt("b", parse_packet(etlm_packet(5100, 10)), 100100.0))
+        # wrong rotation exponent
+        self.assertIsNone(decryptor.decrypt("a", parse_packet(etlm_packet(5100, 9)), 100100.0))
+        self.assertEqual(decryptor.stats["decrypted"], 3)
+        self.assertEqual(decryptor.stats["invalid_mic"], 2)
+        self.assertEqual(decryptor.stats["unknown_beacon"], 1)
+
+        # key material is updated when the beacon is registered again
+        self.resolver.register("a", IDENTITY_KEY, 9, beacon_time=5000, timestamp=100000.0)
+        self.assertIsNotNone(decryptor.decrypt("a", parse_packet(etlm_packet(5100, 9)), 100100.0))
+
+    def test_worker(self):
+        """Frames are decrypted in the background, the oldest ones are dropped on overflow."""
+        callback = MagicMock()
+        decryptor = self.decryptor_cls(self.resolver, callback, max_queue=2)
+        packet = parse_packet(etlm_packet(5100, 10))
+        for rssi in (-1, -2, -3):
+            decryptor.submit(BT_ADDR, rssi, packet, {"beacon_id": "a"}, timestamp=100100.0)
+        self.assertEqual(decryptor.stats["dropped"], 1)
+        decryptor.start()
+        try:
+            deadline = time.monotonic() + 5
+            while callback.call_count < 2:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+        finally:
+            decryptor.stop()
+        self.assertEqual([call[0][1] for call in callback.call_args_list], [-2, -3])
+        bt_addr, _, tlm, properties, timestamp = callback.call_args[0]
+        self.assertEqual((bt_addr, properties, timestamp), (BT_ADDR, {"beacon_id": "a"}, 100100.0))
+        self.assertIsInstance(tlm, EddystoneTLMFrame)
+
+    def test_scanner(self):
+        """The scanner delivers the encrypted and the decrypted frame."""
+        sys.platform = "linux"
+        with self.assertRaises(ValueError):
+            BeaconScanner(None, decrypt_etlm=True)
+
+        # pylint: disable=import-outside-toplevel
+        from beacontools.eid import compute_eid
+        now = time.time()
+        self.resolver.register("a", IDENTITY_KEY, 10, beacon_time=5000, timestamp=now)
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, eid_resolver=self.resolver, decrypt_etlm=True,
+                                packet_filter=[EddystoneTLMFrame, EddystoneEncryptedTLMFrame])
+        mon = scanner._mon
+        eid = compute_eid(IDENTITY_KEY, 10, 5000)
+        mon.process_packet(advertising_report(b"\x02\x01\x06\x03\x03\xaa\xfe\x0d\x16\xaa\xfe\x30"
+                                              b"\xe3" + eid))
+        mon.process_packet(advertising_report(etlm_packet(5000, 10)))
+        self.assertEqual(callback.call_count, 1)
+        self.assertIsInstance(callback.call_args[0][2], EddystoneEncryptedTLMFrame)
+
+        # the frame is decrypted by the worker thread but delivered by the scanner thread
+        worker = threading.Thread(target=mon.etlm_decryptor.process_batch,
+                                  args=([mon.etlm_decryptor._queue.popleft()],))
+        worker.start()
+        worker.join()
+        self.assertEqual(callback.call_count, 1)
+        mon._deliver_decrypted()
+        self.assertEqual(callback.call_count, 2)
+        bt_addr, rssi, packet, properties = callback.call_args[0]
+        self.assertEqual((bt_addr, rssi, properties), ("1c:d6:cd:ef:94:35", -35, {"beacon_id": "a"}))
+        self.assertIsInstance(packet, EddystoneTLMFrame)
+        self.assertEqual(scanner.stats()["etlm"]["decrypted"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
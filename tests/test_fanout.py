@@ -0,0 +1,204 @@
+"""Test sharing advertisements between processes."""
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+from beacontools import parse_packet, BtAddrFilter, CJMonitorFilter, EddystoneFilter, \
+                        EddystoneTLMFrame, EddystoneUIDFrame, IBeaconAdvertisement
+from beacontools.fanout import BeaconPublisher, BeaconSubscriber, encode_record, \
+                               decode_record, encode_subscription, decode_subscription, \
+                               encode_value, decode_value
+
+UID_PACKET = b"\x02\x01\x06\x03\x03\xaa\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90" \
+             b"\x12\x34\x67\x89\x01\x00\x00\x00\x00\x00\x01\x00\x00"
+TLM_PACKET = b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00" \
+             b"\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+IBEACON_PACKET = b"\x02\x01\x06\x1a\xff\x4c\x00\x02\x15\x41\x41\x41\x41\x41\x41\x41\x41\x41" \
+                 b"\x41\x41\x41\x41\x41\x41\x41\x00\x01\x00\x01\xf8"
+CJ_PACKET = b"\x02\x01\x06\x05\x02\x1A\x18\x00\x18\x09\xFF\x72\x04\xFE\x10\xD1\x0C\x33\x61" \
+            b"\x09\x09\x4D\x6F\x6E\x20\x35\x36\x34\x33"
+UID_PROPERTIES = {"namespace": "12345678901234678901", "instance": "000000000001"}
+
+
+def wait_for(condition, timeout=5.0):
+    """Wait until condition() is true."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timeout")
+        time.sleep(0.01)
+
+
+class TestEncoding(unittest.TestCase):
+    """Test the binary encoding."""
+
+    def test_values(self):
+        """Test round trip of simple values."""
+        value = {"a": [None, True, False, -1, 2**40, 0.5, "ä", b"\x00\xff", (1, (2.0, "x"))], 1: {}}
+        out = bytearray()
+        encode_value(value, out)
+        self.assertEqual(decode_value(out), (value, len(out)))
+        with self.assertRaises(ValueError):
+            encode_value(object(), bytearray())
+        for data in [b"x", b"s\x05\x00ab", b"i\x00", b""]:
+            with self.assertRaises(ValueError):
+                decode_value(data)
+
+    def test_records(self):
+        """Packets are restored with all attributes."""
+        for data, properties in [(UID_PACKET, UID_PROPERTIES), (TLM_PACKET, None),
+                                 (CJ_PACKET, {"name": "Mon 5643"})]:
+            packet = parse_packet(data)
+            encoded = encode_record(12.5, b"\x35\x94\xef\xcd\xd6\x1c", -35, packet, properties)
+            timestamp, bt_addr, rssi, decoded, decoded_properties = decode_record(encoded[4:])
+            self.assertEqual(timestamp, 12.5)
+            self.assertEqual(bt_addr, "1c:d6:cd:ef:94:35")
+            self.assertEqual(rssi, -35)
+            self.assertEqual(decoded_properties, properties)
+            self.assertIs(type(decoded), type(packet))
+            self.assertEqual(vars(decoded), vars(packet))
+            self.assertEqual(str(decoded), str(packet))
+
+    def test_subscription(self):
+        """Filters are restored exactly."""
+        device_filter = [EddystoneFilter(namespace="12345678901234678901"),
+                         CJMonitorFilter(company_id=None, beacon_type=1),
+                         BtAddrFilter("aa:bb:cc:dd:ee:ff")]
+        packet_filter = [EddystoneUIDFrame, IBeaconAdvertisement]
+        decoded_device_filter, decoded_packet_filter = decode_subscription(
+            encode_subscription(device_filter, packet_filter)[4:])
+        self.assertEqual([repr(filtr) for filtr in decoded_device_filter],
+                         [repr(filtr) for filtr in device_filter])
+        self.assertEqual(decoded_packet_filter, packet_filter)
+        self.assertEqual(decode_subscription(encode_subscription(None, None)[4:]), (None, None))
+
+        tests = [{"device_filter": [{"type": "DeviceFilter", "properties": {}}], "packet_filter": []},
+                 {"device_filter": [{"type": "check_filters", "properties": {}}], "packet_filter": []},
+                 {"device_filter": [], "packet_filter": ["str"]},
+                 {"device_filter": []}]
+        for subscription in tests:
+            out = bytearray()
+            encode_value(subscription, out)
+            with self.assertRaises(ValueError):
+                decode_subscription(bytes(out))
+
+
+class TestFanout(unittest.TestCase):
+    """Test publisher and subscribers."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "beacons.sock")
+        self.publisher = BeaconPublisher(self.path, max_queue=8)
+        self.publisher.start()
+
+    def tearDown(self):
+        self.publisher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_subscribers(self):
+        """Every subscriber only receives what matches its filters."""
+        received = {"all": [], "uid": [], "ibeacon": []}
+        subscribers = [
+            BeaconSubscriber(lambda *args: received["all"].append(args), self.path),
+            BeaconSubscriber(lambda *args: received["uid"].append(args), self.path,
+                             device_filter=EddystoneFilter(namespace="12345678901234678901"),
+                             packet_filter=EddystoneUIDFrame),
+            BeaconSubscriber(lambda *args: received["ibeacon"].append(args), self.path,
+                             packet_filter=IBeaconAdvertisement),
+        ]
+        for subscriber in subscribers:
+            subscriber.start()
+        wait_for(lambda: len(self.publisher.stats()) == 3 and
+                 all(sub.subscribed for sub in self.publisher._subscribers))
+
+        self.publisher("1c:d6:cd:ef:94:35", -35, parse_packet(UID_PACKET), UID_PROPERTIES)
+        self.publisher("1c:d6:cd:ef:94:35", -36, parse_packet(TLM_PACKET), UID_PROPERTIES)
+        ibeacon = parse_packet(IBEACON_PACKET)
+        self.publisher("aa:bb:cc:dd:ee:ff", -70, ibeacon, ibeacon.properties)
+
+        wait_for(lambda: len(received["all"]) == 3)
+        wait_for(lambda: len(received["uid"]) == 1 and len(received["ibeacon"]) == 1)
+        bt_addr, rssi, packet, properties = received["uid"][0]
+        self.assertEqual((bt_addr, rssi, properties), ("1c:d6:cd:ef:94:35", -35, UID_PROPERTIES))
+        self.assertIsInstance(packet, EddystoneUIDFrame)
+        self.assertEqual(packet.namespace, "12345678901234678901")
+        self.assertIsInstance(received["all"][1][2], EddystoneTLMFrame)
+        self.assertEqual(received["ibeacon"][0][2].uuid, ibeacon.uuid)
+
+        stats = self.publisher.stats()
+        self.assertEqual([stats[i]["sent"] for i in range(3)], [3, 1, 1])
+        self.assertEqual([stats[i]["dropped"] for i in range(3)], [0, 0, 0])
+
+        for subscriber in subscribers:
+            subscriber.stop()
+        wait_for(lambda: len(self.publisher.stats()) == 0)
+
+    def test_bt_addr_subscriber(self):
+        """Address filters are restored by the publisher and match the sender."""
+        received = []
+        subscriber = BeaconSubscriber(lambda *args: received.append(args), self.path,
+                                      device_filter=BtAddrFilter("aa:bb:cc:dd:ee:ff"))
+        subscriber.start()
+        wait_for(lambda: len(self.publisher.stats()) == 1 and
+                 all(sub.subscribed for sub in self.publisher._subscribers))
+
+        ibeacon = parse_packet(IBEACON_PACKET)
+        self.publisher("1c:d6:cd:ef:94:35", -35, parse_packet(UID_PACKET), UID_PROPERTIES)
+        self.publisher("aa:bb:cc:dd:ee:ff", -70, ibeacon, ibeacon.properties)
+        wait_for(lambda: len(received) == 1)
+        self.assertEqual(received[0][:2], ("aa:bb:cc:dd:ee:ff", -70))
+        self.assertIsInstance(received[0][2], IBeaconAdvertisement)
+        subscriber.stop()
+
+    def test_socket_path(self):
+        """Only stale sockets are replaced, a missing socket file doesn't break stop."""
+        path = os.path.join(self.tmpdir, "other")
+        with open(path, "w") as other:
+            other.write("data")
+        publisher = BeaconPublisher(path)
+        with self.assertRaises(FileExistsError):
+            publisher.start()
+        publisher.stop()
+        with open(path) as other:
+            self.assertEqual(other.read(), "data")
+
+        # the socket of a publisher which was not stopped
+        path = os.path.join(self.tmpdir, "stale.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        publisher = BeaconPublisher(path)
+        publisher.start()
+        os.unlink(path)
+        publisher.stop()
+
+    def test_slow_subscriber(self):
+        """A subscriber which does not read gets records dropped, others are not affected."""
+        slow = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        slow.connect(self.path)
+        slow.sendall(encode_subscription(None, None))
+        received = []
+        fast = BeaconSubscriber(lambda *args: received.append(args), self.path)
+        fast.start()
+        wait_for(lambda: len(self.publisher.stats()) == 2 and
+                 all(sub.subscribed for sub in self.publisher._subscribers))
+
+        packet = parse_packet(UID_PACKET)
+        for _ in range(3000):
+            self.publisher("1c:d6:cd:ef:94:35", -35, packet, UID_PROPERTIES)
+            # give the fast subscriber a chance to keep up with the small queue
+            time.sleep(0.0001)
+        stats = self.publisher.stats()
+        self.assertGreater(stats[0]["dropped"], 0)
+        self.assertGreater(stats[0]["lag"], 0)
+        wait_for(lambda: len(received) > 0)
+        fast.stop()
+        slow.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""Test the flood guard."""
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from beacontools import BeaconScanner
+from beacontools.admission import AdmissionPolicy
+from beacontools.flood import SpaceSaving, FloodGuard
+
+FLOODER = b"\x01\x00\x00\x00\x00\xaa"
+BEACON = b"\x02\x00\x00\x00\x00\xbb"
+
+
+class TestSpaceSaving(unittest.TestCase):
+    """Test the heavy hitter counters."""
+
+    def test_exact(self):
+        """Counts are exact while there are free counters."""
+        counters = SpaceSaving(4)
+        for key in "aababc":
+            counters.add(key)
+        self.assertEqual(counters.top(), [("a", 3, 0), ("b", 2, 0), ("c", 1, 0)])
+        self.assertEqual(counters.top(1), [("a", 3, 0)])
+
+    def test_heavy_hitter(self):
+        """A frequent key is found among many distinct keys with a few counters."""
+        counters = SpaceSaving(8)
+        for i in range(1000):
+            counters.add("heavy")
+            counters.add(i)
+        self.assertEqual(len(counters), 8)
+        key, count, error = counters.top(1)[0]
+        self.assertEqual(key, "heavy")
+        self.assertGreaterEqual(count, 1000)
+        self.assertLessEqual(count - error, 1000)
+
+        counters.clear()
+        self.assertEqual(counters.top(), [])
+        with self.assertRaises(ValueError):
+            SpaceSaving(0)
+
+
+class TestFloodGuard(unittest.TestCase):
+    """Test detection and shedding of flooding addresses."""
+
+    def test_shed(self):
+        """Addresses above the rate are shed until shed_time has passed."""
+        guard = FloodGuard(max_rate=10, window=1.0, shed_time=5.0, capacity=4)
+        admitted = [guard.admit(FLOODER, 100 + i * 0.01) for i in range(20)]
+        # shed as soon as the rate is certainly exceeded
+        self.assertEqual(admitted, [True] * 10 + [False] * 10)
+        self.assertTrue(guard.admit(BEACON, 100.5))
+        self.assertEqual(guard.stats, {'detected': 1, 'shed': 10})
+        self.assertEqual(list(guard.shed_addresses(101)), ["aa:00:00:00:00:01"])
+
+        # still shed in the next window, counted again after shed_time
+        self.assertFalse(guard.admit(FLOODER, 103))
+        self.assertEqual(guard.top_talkers(), [("aa:00:00:00:00:01", 11.0),
+                                               ("bb:00:00:00:00:02", 1.0)])
+        self.assertTrue(guard.admit(FLOODER, 105.5))
+        self.assertEqual(guard.shed_addresses(105.5), {})
+
+        guard.admit(FLOODER, 99 + 10)
+        guard.forgive("aa:00:00:00:00:01")
+        self.assertTrue(guard.admit(FLOODER, 109))
+
+    def test_top_talkers(self):
+        """The most active addresses of the last window are exported with their rate."""
+        guard = FloodGuard(max_rate=100, window=2.0)
+        for i in range(10):
+            guard.admit(BEACON, i * 0.1)
+            if i % 2:
+                guard.admit(FLOODER, i * 0.1)
+        self.assertEqual(guard.top_talkers(), [])
+        guard.admit(BEACON, 2.5)
+        self.assertEqual(guard.top_talkers(), [("bb:00:00:00:00:02", 5.0),
+                                               ("aa:00:00:00:00:01", 2.5)])
+        self.assertEqual(guard.top_talkers(1), [("bb:00:00:00:00:02", 5.0)])
+
+        with self.assertRaises(ValueError):
+            FloodGuard(max_rate=0)
+
+    def test_adversarial(self):
+        """Random addresses use a bounded number of counters and are not shed."""
+        guard = FloodGuard(max_rate=10, capacity=16)
+        for i in range(10000):
+            self.assertTrue(guard.admit(i.to_bytes(6, 'little'), i * 0.0001))
+        self.assertEqual(len(guard._counters), 16)
+        self.assertEqual(guard.stats['detected'], 0)
+
+    def test_scanner(self):
+        """The scanner drops advertisements of shed addresses before parsing them."""
+        callback = MagicMock()
+        guard = FloodGuard(max_rate=2, window=1.0)
+        scanner = BeaconScanner(callback, admission_policy=AdmissionPolicy(flood_guard=guard))
+        pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+              b"\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+        for _ in range(5):
+            scanner._mon.process_packet(pkt)
+        self.assertEqual(callback.call_count, 2)
+        self.assertEqual(scanner.stats()['drops']['flood'], 3)
+        self.assertEqual(scanner.stats()['flood'], {'detected': 1, 'shed': 3})
+        self.assertIn("1c:d6:cd:ef:94:35", guard.shed_addresses())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Test detection of failing beacons."""
+import unittest
+
+from beacontools import parse_packet, EddystoneTLMFrame, EstimoteTelemetryFrameB
+from beacontools.health import HealthMonitor, HealthEvent, REBOOT, COUNTER_RESET, \
+                               BATTERY_DRAIN, FIRMWARE_ERROR, CLOCK_ERROR
+
+HOUR = 3600.0
+
+
+def tlm(seconds_since_boot, advertising_count=0, voltage=3000):
+    """Build a TLM frame."""
+    return EddystoneTLMFrame({'voltage': voltage, 'temperature': 0x1400,
+                              'advertising_count': advertising_count,
+                              'seconds_since_boot': seconds_since_boot})
+
+
+def estimote_b(errors):
+    """Build an Estimote telemetry B frame (protocol version 0) with error flags."""
+    return parse_packet(b"\x02\x01\x04\x03\x03\x9a\xfe\x17\x16\x9a\xfe\x02\x47\xa0\x38\xd5\xeb"
+                        b"\x03\x26\x40\x01\xd8\x42\xed\x73\x49\x25\x66\xbc\x2e" +
+                        bytes([0x50 | errors]))
+
+
+def estimote_uptime(number, unit):
+    """Build an Estimote telemetry B frame with an uptime of number units (1 minutes,
+    2 hours, 3 days)."""
+    return EstimoteTelemetryFrameB({'identifier': [0] * 8, 'sub_frame': {
+        'magnetic_field': [0, 0, 0], 'ambient_light': 0, 'battery_level': 0,
+        'combined_fields': [number & 0xff, (unit << 4) | (number >> 8), 0, 0, 0]}}, 1)
+
+
+class TestHealth(unittest.TestCase):
+    """Test the HealthMonitor."""
+
+    def test_reboot(self):
+        """Uptime going backwards is a reboot, a decreasing counter alone a counter reset."""
+        events = []
+        monitor = HealthMonitor(events.append)
+        monitor.add("a", tlm(100, 1000), timestamp=1.0)
+        monitor.add("a", tlm(110, 1100), timestamp=2.0)
+        monitor.add("a", tlm(5, 10), timestamp=3.0)
+        monitor.add("a", tlm(15, 5), timestamp=4.0)
+        monitor.add("b", tlm(1, 1), timestamp=4.0)
+        self.assertEqual(events, [HealthEvent(REBOOT, "a", 3.0, True, 110),
+                                  HealthEvent(COUNTER_RESET, "a", 4.0, True, 10)])
+
+    def test_quantized_uptime(self):
+        """Estimote uptime changing its unit or rounding down by one unit is no reboot."""
+        events = []
+        monitor = HealthMonitor(events.append)
+        # 4095 hours are 170.6 days, which are reported as 170 days
+        monitor.add("a", estimote_uptime(4095, 2), timestamp=1.0)
+        monitor.add("a", estimote_uptime(170, 3), timestamp=2.0)
+        monitor.add("a", estimote_uptime(169, 3), timestamp=3.0)
+        self.assertEqual(events, [])
+        monitor.add("a", estimote_uptime(167, 3), timestamp=4.0)
+        monitor.add("a", estimote_uptime(5, 1), timestamp=5.0)
+        self.assertEqual(events, [HealthEvent(REBOOT, "a", 4.0, True, 169 * 86400),
+                                  HealthEvent(REBOOT, "a", 5.0, True, 167 * 86400)])
+
+    def test_counter_wrap(self):
+        """The 32 bit counters of TLM frames wrap around without a reboot or reset."""
+        events = []
+        monitor = HealthMonitor(events.append)
+        monitor.add("a", tlm(2 ** 32 - 10, 2 ** 32 - 100), timestamp=1.0)
+        monitor.add("a", tlm(5, 2 ** 32 - 1), timestamp=2.0)
+        monitor.add("a", tlm(15, 50), timestamp=3.0)
+        self.assertEqual(events, [])
+        monitor.add("a", tlm(20, 40), timestamp=4.0)
+        monitor.add("a", tlm(10, 60), timestamp=5.0)
+        self.assertEqual(events, [HealthEvent(COUNTER_RESET, "a", 4.0, True, 50),
+                                  HealthEvent(REBOOT, "a", 5.0, True, 20)])
+
+    def test_battery_drain(self):
+        """A draining battery is reported once, recovery after a reboot (new battery)."""
+        events = []
+        monitor = HealthMonitor(events.append, voltage_drain=20.0)
+        # stable battery with noise, the drain is evaluated after 10 samples over 6 hours
+        for hour in range(48):
+            monitor.add("stable", tlm(hour * HOUR, voltage=3000 + (hour % 3) * 5),
+                        timestamp=hour * HOUR)
+        self.assertEqual(events, [])
+
+        for hour in range(48):
+            monitor.add("a", tlm(hour * HOUR, voltage=3000 - 2 * hour), timestamp=hour * HOUR)
+        self.assertEqual([event[:4] for event in events], [(BATTERY_DRAIN, "a", 9 * HOUR, True)])
+        self.assertAlmostEqual(events[0].value, 48.0)
+
+        # new battery, no drain
+        for hour in range(48, 96):
+            monitor.add("a", tlm((hour - 48) * HOUR, voltage=3100), timestamp=hour * HOUR)
+        self.assertEqual([event.event for event in events[1:]], [REBOOT])
+
+        with self.assertRaises(ValueError):
+            HealthMonitor(events.append, half_life=0)
+
+    def test_error_flags(self):
+        """Error flags are reported when they are set and cleared."""
+        events = []
+        monitor = HealthMonitor(events.append)
+        monitor("aa:bb:cc:dd:ee:ff", -50, estimote_b(0), {})
+        monitor("aa:bb:cc:dd:ee:ff", -50, estimote_b(1), {})
+        monitor("aa:bb:cc:dd:ee:ff", -50, estimote_b(3), {})
+        monitor("aa:bb:cc:dd:ee:ff", -50, estimote_b(3), {})
+        monitor("aa:bb:cc:dd:ee:ff", -50, estimote_b(0), {})
+        monitor("aa:bb:cc:dd:ee:ff", -50, parse_packet(b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16"
+                                                       b"\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00"
+                                                       b"\x00\x14\x67\x00\x00\x2a\xc4\xe4"), None)
+        self.assertEqual([(event.event, event.beacon, event.active) for event in events], [
+            (FIRMWARE_ERROR, "47a038d5eb032640", True),
+            (CLOCK_ERROR, "47a038d5eb032640", True),
+            (FIRMWARE_ERROR, "47a038d5eb032640", False),
+            (CLOCK_ERROR, "47a038d5eb032640", False),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
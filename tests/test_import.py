@@ -0,0 +1,96 @@
+"""Test the import behaviour and startup time of the package."""
+import ast
+import os
+import subprocess
+import sys
+import unittest
+
+# upper bound for the cumulative import time of `import beacontools` in microseconds,
+# can be raised on slow machines via the environment
+IMPORT_TIME_BUDGET_US = int(os.environ.get("BEACONTOOLS_IMPORT_BUDGET_US", 100000))
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(*args):
+    """Run a fresh interpreter with the repository on the path and return stderr/stdout."""
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    result = subprocess.run([sys.executable] + list(args), env=env, cwd=ROOT_DIR,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    return result.stdout, result.stderr
+
+
+def parse_importtime(output):
+    """Parse the output of `python -X importtime` into a dict of module -> cumulative us."""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        try:
+            modules[name.strip()] = int(cumulative)
+        except ValueError:
+            # header line
+            continue
+    return modules
+
+
+def loaded_modules(code):
+    """Return the set of modules loaded after executing code in a fresh interpreter."""
+    stdout, _ = run_python("-c", code + "\nimport sys\nprint('\\n'.join(sys.modules))")
+    return set(stdout.splitlines())
+
+
+class TestImport(unittest.TestCase):
+    """Test lazy loading of the submodules."""
+
+    def test_import_time(self):
+        """`import beacontools` must not load the heavy dependencies and stay within budget."""
+        _, stderr = run_python("-X", "importtime", "-c", "import beacontools")
+        modules = parse_importtime(stderr)
+        self.assertIn("beacontools", modules)
+        for name in modules:
+            self.assertFalse(name.startswith("construct"), name)
+            self.assertFalse(name.startswith("ahocorapy"), name)
+            self.assertNotEqual(name, "beacontools.scanner")
+            self.assertNotEqual(name, "beacontools.structs")
+        self.assertLess(modules["beacontools"], IMPORT_TIME_BUDGET_US)
+
+    def test_parser_only(self):
+        """Importing the parser does not build any structs until a packet is parsed."""
+        modules = loaded_modules("from beacontools import parse_packet")
+        self.assertIn("beacontools.parser", modules)
+        self.assertNotIn("beacontools.scanner", modules)
+        self.assertNotIn("beacontools.structs", modules)
+        self.assertNotIn("construct", modules)
+        self.assertNotIn("ahocorapy", modules)
+
+        modules = loaded_modules("from beacontools import parse_packet\nparse_packet(b'')")
+        self.assertIn("beacontools.structs", modules)
+        self.assertIn("construct", modules)
+        self.assertNotIn("ahocorapy", modules)
+
+    def test_public_names(self):
+        """All public names can be resolved."""
+        import beacontools
+        for name in beacontools.__all__:
+            self.assertIsNotNone(getattr(beacontools, name))
+            self.assertIn(name, dir(beacontools))
+        with self.assertRaises(AttributeError):
+            beacontools.DoesNotExist  # pylint: disable=pointless-statement
+
+    def test_type_checking_names(self):
+        """The names bound for type checkers are the lazy names."""
+        import beacontools
+        with open(beacontools.__file__) as init_file:
+            tree = ast.parse(init_file.read())
+        block = next(node for node in tree.body if isinstance(node, ast.If) and
+                     getattr(node.test, 'id', None) == 'TYPE_CHECKING')
+        names = [alias.name for node in block.body for alias in node.names]
+        # pylint: disable=protected-access
+        self.assertEqual(sorted(names), sorted(beacontools._LAZY_ATTRIBUTES))
+
+
+if __name__ == "__main__":
+    unittest.main()
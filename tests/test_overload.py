@@ -0,0 +1,116 @@
+"""Test the overload controller."""
+import socket
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from beacontools import BeaconScanner, BtAddrFilter, EddystoneFilter, EddystoneTLMFrame, \
+                        EddystoneUIDFrame
+from beacontools.admission import AdmissionPolicy
+from beacontools.overload import OverloadController, NORMAL, DEGRADED
+
+BEACON = b"\x35\x94\xef\xcd\xd6\x1c"
+OTHER = b"\x01\x02\x03\x04\x05\x06"
+
+TLM_EVENT = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+            b"\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+UID_EVENT = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+            b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+            b"\x00\x00\x01\x00\x00\xdd"
+
+
+class TestOverloadController(unittest.TestCase):
+    """Test mode transitions and shedding decisions."""
+
+    def test_transitions(self):
+        """Backlog or load above the budget degrade, the normal mode returns after hold_time."""
+        on_transition = MagicMock()
+        controller = OverloadController(max_load=0.5, max_backlog=10, interval=1.0,
+                                        hold_time=5.0, on_transition=on_transition)
+        controller.record_batch(5, 0.0, 0.1)
+        self.assertEqual(controller.mode, NORMAL)
+        controller.record_batch(5, 0.5, 1.0)
+        self.assertAlmostEqual(controller.stats['load'], 0.6)
+        self.assertAlmostEqual(controller.stats['latency'], 0.06)
+        # load was above budget
+        self.assertTrue(controller.degraded)
+        on_transition.assert_called_once()
+        self.assertEqual(on_transition.call_args[0][0], DEGRADED)
+        self.assertEqual(on_transition.call_args[0][1]['transitions'], 1)
+
+        # relaxed, but held in degraded mode for hold_time
+        for second in range(2, 6):
+            controller.record_batch(1, second, second + 0.01)
+        self.assertTrue(controller.degraded)
+        controller.record_batch(1, 6.5, 6.51)
+        self.assertFalse(controller.degraded)
+        self.assertEqual(controller.stats['mode'], NORMAL)
+        self.assertEqual(controller.stats['transitions'], 2)
+
+        # a full batch means events are piling up
+        controller.record_batch(10, 7.0, 7.6)
+        self.assertEqual(controller.stats['backlog'], 10)
+        self.assertTrue(controller.degraded)
+
+        with self.assertRaises(ValueError):
+            OverloadController(max_load=0)
+        with self.assertRaises(ValueError):
+            OverloadController(priority_filter="foo")
+
+    def test_sampling(self):
+        """Only every n-th advertisement of a device is parsed, priority beacons always."""
+        controller = OverloadController(sample_rate=3, priority_filter=BtAddrFilter("1c:d6:cd:ef:94:35"))
+        self.assertEqual([controller.admit(OTHER) for _ in range(6)],
+                         [True, False, False, True, False, False])
+        self.assertEqual(controller.stats['sampled_out'], 4)
+
+        # the beacon is learned as priority beacon when it is parsed
+        packet = MagicMock()
+        self.assertTrue(controller.keep(BEACON, packet, None))
+        self.assertTrue(all(controller.admit(BEACON) for _ in range(6)))
+
+    def test_telemetry(self):
+        """Telemetry frames are skipped in degraded mode unless they belong to a priority beacon."""
+        controller = OverloadController(priority_filter=EddystoneFilter(instance="000000000001"))
+        tlm = MagicMock(spec=EddystoneTLMFrame)
+        uid = MagicMock(spec=EddystoneUIDFrame)
+        self.assertTrue(controller.keep(OTHER, tlm, None))
+        controller.degraded = True
+        self.assertFalse(controller.keep(OTHER, tlm, None))
+        self.assertTrue(controller.keep(OTHER, uid, {"instance": "000000000002"}))
+        self.assertTrue(controller.keep(BEACON, tlm, {"instance": "000000000001"}))
+        self.assertEqual(controller.stats['telemetry_skipped'], 1)
+
+    def test_scanner(self):
+        """The scanner reports its batches and sheds load in degraded mode."""
+        callback = MagicMock()
+        controller = OverloadController(max_backlog=16, sample_rate=2, interval=0.0)
+        scanner = BeaconScanner(callback,
+                                admission_policy=AdmissionPolicy(overload_controller=controller))
+        mon = scanner._mon
+        mon.socket, controller_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.addCleanup(mon.socket.close)
+        self.addCleanup(controller_end.close)
+
+        for _ in range(20):
+            controller_end.send(TLM_EVENT)
+        mon._read_packets()
+        self.assertEqual(callback.call_count, 20)
+        self.assertTrue(controller.degraded)
+        self.assertEqual(scanner.stats()['overload']['backlog'], 20)
+
+        # telemetry is skipped, identity frames are sampled
+        mon.process_packet(TLM_EVENT)
+        for _ in range(4):
+            mon.process_packet(UID_EVENT)
+        self.assertEqual(callback.call_count, 22)
+        self.assertIsInstance(callback.call_args[0][2], EddystoneUIDFrame)
+        self.assertEqual(scanner.stats()['drops']['overload'], 2)
+        self.assertEqual(scanner.stats()['overload']['telemetry_skipped'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,7 @@ from beacontools import parse_packet, EddystoneUIDFrame, EddystoneURLFrame, \
                         IBeaconAdvertisement, EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, \
                         ExposureNotificationFrame
 from beacontools.packet_types import EstimoteNearable
+from beacontools.parser import iter_ad_structures, parse_packet_all
 
 class TestParser(unittest.TestCase):
     """Test the parser."""
@@ -25,6 +26,36 @@ class TestParser(unittest.TestCase):
             frame = parse_packet(test)
             self.assertIsNone(frame)
 
+    def test_iter_ad_structures(self):
+        """AD structures are yielded as (type, memoryview), bounds are checked."""
+        payload = b"\x02\x01\x06\x03\x03\xaa\xfe\x01\x08\x04\x09abc"
+        structures = list(iter_ad_structures(payload))
+        self.assertEqual([(ad_type, bytes(data)) for ad_type, data in structures],
+                         [(0x01, b"\x06"), (0x03, b"\xaa\xfe"), (0x08, b""), (0x09, b"abc")])
+        self.assertIsInstance(structures[0][1], memoryview)
+        # zero length marks the start of the padding
+        self.assertEqual(len(list(iter_ad_structures(b"\x02\x01\x06\x00\x00\x00"))), 1)
+        self.assertEqual(list(iter_ad_structures(b"")), [])
+        with self.assertRaises(ValueError):
+            list(iter_ad_structures(payload + b"\x05\xff\x00"))
+        # a truncated beacon frame is not parsed
+        self.assertIsNone(parse_packet(b"\x02\x01\x06\x03\x03\xaa\xfe\x06\x16\xaa\xfe\x00\xe3"
+                                       b"\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01"))
+
+    def test_parse_packet_all(self):
+        """All frames of an advertisement are parsed, invalid ones are skipped."""
+        ibeacon = b"\x1a\xff\x4c\x00\x02\x15" + b"\x41" * 16 + b"\x00\x01\x00\x02\xf8"
+        uid = b"\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01" \
+              b"\x00\x00\x00\x00\x00\x01\x00\x00"
+        invalid_uid = b"\x07\x16\xaa\xfe\x00\xe3\x12\x34"
+        payload = b"\x02\x01\x06" + ibeacon + invalid_uid + b"\x03\x03\xaa\xfe" + uid
+        frames = parse_packet_all(payload)
+        self.assertEqual([type(frame) for frame in frames], [IBeaconAdvertisement, EddystoneUIDFrame])
+        self.assertEqual(frames[1].instance, "000000000001")
+        self.assertIsInstance(parse_packet(payload), IBeaconAdvertisement)
+        # frames before a truncated structure are kept
+        self.assertEqual(len(parse_packet_all(payload + b"\x05\x16")), 2)
+        self.assertEqual(parse_packet_all(b"\x02\x01\x06"), [])
 
     def test_eddystone_uid(self):
         """Test UID frame."""
@@ -35,6 +66,8 @@ class TestParser(unittest.TestCase):
         self.assertIsInstance(frame, EddystoneUIDFrame)
         self.assertEqual(frame.namespace, "12345678901234678901")
         self.assertEqual(frame.instance, "000000000001")
+        self.assertEqual(frame.namespace_bytes, b"\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01")
+        self.assertEqual(frame.instance_bytes, b"\x00\x00\x00\x00\x00\x01")
         self.assertEqual(frame.tx_power, -29)
         self.assertEqual(frame.properties, {
             "namespace":"12345678901234678901",
@@ -52,6 +85,25 @@ class TestParser(unittest.TestCase):
         self.assertEqual(frame.tx_power, -8)
         self.assertIsNotNone(str(frame))
 
+    def test_eddystone_url_encodings(self):
+        """Test expansion of all TLD codes and handling of reserved bytes."""
+        tests = [
+            (b"\x00a\x01b\x02c\x03d\x04e\x05f\x06", 0,
+             "http://www..com/a.org/b.edu/c.net/d.info/e.biz/f.gov/"),
+            (b"a\x07b\x08c\x09d\x0ae\x0bf\x0cg\x0d", 1,
+             "https://www.a.comb.orgc.edud.nete.infof.bizg.gov"),
+            (b"x\x80y\xffz", 2, "http://xyz"),
+            (b"", 3, "https://"),
+        ]
+        for url, scheme, expected in tests:
+            service_data = b"\xAA\xFE\x10\xF8" + bytes([scheme]) + url
+            url_packet = b"\x03\x03\xAA\xFE" + bytes([len(service_data) + 1, 0x16]) + service_data
+            frame = parse_packet(url_packet)
+            self.assertIsInstance(frame, EddystoneURLFrame)
+            self.assertEqual(frame.url, expected)
+            # decoded URLs are shared between frames
+            self.assertIs(parse_packet(url_packet).url, frame.url)
+
     def test_eddystone_tlm(self):
         """Test TLM frame."""
         tlm_packet = b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00" \
@@ -78,7 +130,7 @@ class TestParser(unittest.TestCase):
 
     def test_eddystone_tlm_enc(self):
         """Test encrypted TLM frame."""
-        enc_tlm_packet = b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16\xaa\xfe\x20\x01\x41\x41\x41" \
+        enc_tlm_packet = b"\x02\x01\x06\x03\x03\xaa\xfe\x15\x16\xaa\xfe\x20\x01\x41\x41\x41" \
                          b"\x41\x41\x41\x41\x41\x41\x41\x41\x41\xDE\xAD\xBE\xFF"
         frame = parse_packet(enc_tlm_packet)
         self.assertIsInstance(frame, EddystoneEncryptedTLMFrame)
@@ -104,6 +156,7 @@ class TestParser(unittest.TestCase):
         frame = parse_packet(ibeacon_packet)
         self.assertIsInstance(frame, IBeaconAdvertisement)
         self.assertEqual(frame.uuid, "41424344-4546-4748-4940-414243444546")
+        self.assertEqual(frame.uuid_bytes, b"ABCDEFGHI@ABCDEF")
         self.assertEqual(frame.major, 1)
         self.assertEqual(frame.minor, 2)
         self.assertEqual(frame.tx_power, -8)
@@ -230,6 +283,7 @@ class TestParser(unittest.TestCase):
         frame = parse_packet(nearable_packet)
         self.assertIsInstance(frame, EstimoteNearable)
         self.assertEqual("1efe427eb6f4bc2f", frame.identifier)
+        self.assertEqual(b"\x1e\xfe\x42\x7e\xb6\xf4\xbc\x2f", frame.identifier_bytes)
         self.assertEqual(22.5, frame.temperature)
         self.assertEqual(1, frame.firmware_version)
         self.assertEqual(4, frame.hardware_version)
@@ -242,6 +296,7 @@ class TestParser(unittest.TestCase):
         frame = parse_packet(exposure_packet)
         self.assertIsInstance(frame, ExposureNotificationFrame)
         self.assertEqual("0d3b4f65584c582160571dd19010d41c", frame.identifier)
+        self.assertEqual(bytes.fromhex("0d3b4f65584c582160571dd19010d41c"), frame.identifier_bytes)
         self.assertEqual(b"\x26\x60\xee\x34", frame.encrypted_metadata)
 
 
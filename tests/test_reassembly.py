@@ -0,0 +1,72 @@
+"""Test the reassembly of extended advertising reports."""
+import unittest
+
+from beacontools.reassembly import ExtendedAdvertisingReassembler
+from beacontools.const import EXT_ADV_DATA_COMPLETE, EXT_ADV_DATA_INCOMPLETE, EXT_ADV_DATA_TRUNCATED
+
+ADDR = b"\x35\x94\xef\xcd\xd6\x1c"
+ADDR2 = b"\x36\x94\xef\xcd\xd6\x1c"
+
+
+class TestReassembly(unittest.TestCase):
+    """Test the ExtendedAdvertisingReassembler."""
+
+    def test_complete(self):
+        """Single complete reports are passed through."""
+        reassembler = ExtendedAdvertisingReassembler()
+        self.assertEqual(reassembler.add(ADDR, 1, EXT_ADV_DATA_COMPLETE, b"abc", now=0), b"abc")
+        self.assertEqual(reassembler.stats['complete'], 1)
+        self.assertEqual(reassembler.pending, 0)
+
+    def test_chained(self):
+        """Fragments are joined per address and sid."""
+        reassembler = ExtendedAdvertisingReassembler()
+        self.assertIsNone(reassembler.add(ADDR, 1, EXT_ADV_DATA_INCOMPLETE, b"ab", now=0))
+        self.assertIsNone(reassembler.add(ADDR, 2, EXT_ADV_DATA_INCOMPLETE, b"xy", now=0))
+        self.assertIsNone(reassembler.add(ADDR2, 1, EXT_ADV_DATA_INCOMPLETE, b"12", now=0))
+        self.assertIsNone(reassembler.add(ADDR, 1, EXT_ADV_DATA_INCOMPLETE, b"cd", now=0))
+        self.assertEqual(reassembler.pending, 3)
+        self.assertEqual(reassembler.add(ADDR, 1, EXT_ADV_DATA_COMPLETE, b"ef", now=0), b"abcdef")
+        self.assertEqual(reassembler.add(ADDR2, 1, EXT_ADV_DATA_COMPLETE, b"3", now=0), b"123")
+        self.assertEqual(reassembler.add(ADDR, 2, EXT_ADV_DATA_COMPLETE, b"", now=0), b"xy")
+        self.assertEqual(reassembler.stats['reassembled'], 3)
+        self.assertEqual(reassembler.stats['fragments'], 4)
+        self.assertEqual(reassembler.pending, 0)
+
+    def test_truncated(self):
+        """Truncated data is dropped and counted."""
+        reassembler = ExtendedAdvertisingReassembler()
+        self.assertIsNone(reassembler.add(ADDR, 1, EXT_ADV_DATA_INCOMPLETE, b"ab", now=0))
+        self.assertIsNone(reassembler.add(ADDR, 1, EXT_ADV_DATA_TRUNCATED, b"cd", now=0))
+        self.assertEqual(reassembler.pending, 0)
+        self.assertEqual(reassembler.stats['truncated'], 1)
+        # the next advertisement starts fresh
+        self.assertEqual(reassembler.add(ADDR, 1, EXT_ADV_DATA_COMPLETE, b"ef", now=0), b"ef")
+        # invalid data status
+        self.assertIsNone(reassembler.add(ADDR, 1, 3, b"ef", now=0))
+        self.assertEqual(reassembler.stats['invalid'], 1)
+
+    def test_bounds(self):
+        """Timeouts, number of pending advertisements and length are bounded."""
+        reassembler = ExtendedAdvertisingReassembler(max_pending=2, timeout=1.0, max_length=4)
+        reassembler.add(ADDR, 1, EXT_ADV_DATA_INCOMPLETE, b"ab", now=0)
+        reassembler.add(ADDR, 2, EXT_ADV_DATA_INCOMPLETE, b"ab", now=0.5)
+        reassembler.add(ADDR, 3, EXT_ADV_DATA_INCOMPLETE, b"ab", now=0.5)
+        self.assertEqual(reassembler.stats['evicted'], 1)
+        self.assertEqual(reassembler.pending, 2)
+
+        reassembler.expire(now=1.6)
+        self.assertEqual(reassembler.stats['timeout'], 2)
+        self.assertEqual(reassembler.pending, 0)
+
+        reassembler.add(ADDR, 1, EXT_ADV_DATA_INCOMPLETE, b"abc", now=2)
+        self.assertIsNone(reassembler.add(ADDR, 1, EXT_ADV_DATA_INCOMPLETE, b"de", now=2))
+        self.assertEqual(reassembler.stats['overflow'], 1)
+        self.assertEqual(reassembler.pending, 0)
+        reassembler.add(ADDR, 1, EXT_ADV_DATA_INCOMPLETE, b"abc", now=2)
+        self.assertIsNone(reassembler.add(ADDR, 1, EXT_ADV_DATA_COMPLETE, b"de", now=2))
+        self.assertEqual(reassembler.stats['overflow'], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
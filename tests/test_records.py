@@ -0,0 +1,96 @@
+"""Test flat records of advertisements."""
+import sys
+import time
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from beacontools import BeaconScanner, parse_packet, parse_record, EddystoneFilter, \
+                        EddystoneUIDFrame, EddystoneTLMFrame
+from beacontools.records import HEADER_FIELDS, PACKET_FIELDS, RECORD_TYPES, to_record
+
+UID_PACKET = b"\x02\x01\x06\x03\x03\xaa\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90" \
+             b"\x12\x34\x67\x89\x01\x00\x00\x00\x00\x00\x01\x00\x00"
+IBEACON_PACKET = b"\x02\x01\x06\x1a\xff\x4c\x00\x02\x15\x41\x41\x41\x41\x41\x41\x41\x41\x41" \
+                 b"\x41\x41\x41\x41\x41\x41\x41\x00\x01\x00\x02\xf8"
+
+
+class TestRecords(unittest.TestCase):
+    """Test the records."""
+
+    def test_fields(self):
+        """Every public attribute of the packet types is part of the record.
+
+        Records hold the raw *_bytes form of identifiers instead of the formatted one."""
+        for cls, fields in PACKET_FIELDS.items():
+            attributes = {name for name, value in vars(cls).items()
+                          if isinstance(value, property) and name != 'properties'
+                          and name + '_bytes' not in vars(cls)}
+            self.assertEqual(set(fields), attributes, cls)
+            self.assertEqual(RECORD_TYPES[cls]._fields, HEADER_FIELDS + fields)
+
+    def test_parse_record(self):
+        """Test parsing packets into records."""
+        record = parse_record(UID_PACKET, "1c:d6:cd:ef:94:35", -35, 12.5)
+        self.assertEqual(record, ("EddystoneUIDFrame", "1c:d6:cd:ef:94:35", -35, 12.5,
+                                  {"namespace": "12345678901234678901", "instance": "000000000001"},
+                                  -29, bytes.fromhex("12345678901234678901"),
+                                  bytes.fromhex("000000000001")))
+        self.assertEqual(record.namespace_bytes.hex(), "12345678901234678901")
+        self.assertEqual(record._asdict()["instance_bytes"], b"\x00\x00\x00\x00\x00\x01")
+
+        # identifiers are not formatted
+        packet = parse_packet(IBEACON_PACKET)
+        record = to_record(packet)
+        self.assertIsNone(packet._uuid)
+        self.assertEqual(record.uuid_bytes, b"A" * 16)
+
+        record = parse_record(IBEACON_PACKET)
+        self.assertEqual(record.packet_type, "IBeaconAdvertisement")
+        self.assertIsNone(record.bt_addr)
+        self.assertEqual((record.major, record.minor), (1, 2))
+        self.assertEqual(record.properties, parse_packet(IBEACON_PACKET).properties)
+
+        self.assertIsNone(parse_record(b"\x02\x01\x06"))
+        record = to_record(object(), "1c:d6:cd:ef:94:35", -28, 1.0)
+        self.assertEqual(record.packet_type, "object")
+        self.assertEqual(record.fields, {})
+
+
+class TestScannerRecords(unittest.TestCase):
+    """Test the record mode of the scanner."""
+
+    def setUp(self):
+        # the Linux backend is used, it only needs the socket module
+        sys.platform = "linux"
+
+    def test_process_packet(self):
+        """The callback is called with records, including the properties of the UID frame."""
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, device_filter=EddystoneFilter(instance="000000000001"),
+                                records=True)
+        uid = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\x00\x00\x01\x00\x00\xdd"
+        tlm = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+              b"\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+        start = time.time()
+        scanner._mon.process_packet(uid)
+        scanner._mon.process_packet(tlm)
+        self.assertEqual(callback.call_count, 2)
+        uid_record = callback.call_args_list[0][0][0]
+        tlm_record = callback.call_args_list[1][0][0]
+        self.assertIsInstance(uid_record, RECORD_TYPES[EddystoneUIDFrame])
+        self.assertIsInstance(tlm_record, RECORD_TYPES[EddystoneTLMFrame])
+        self.assertEqual(tlm_record.bt_addr, "1c:d6:cd:ef:94:35")
+        self.assertEqual(tlm_record.rssi, -28)
+        self.assertGreaterEqual(tlm_record.timestamp, start)
+        self.assertEqual(tlm_record.properties, uid_record.properties)
+        self.assertEqual(tlm_record.voltage, 2840)
+
+
+if __name__ == "__main__":
+    unittest.main()
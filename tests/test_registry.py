@@ -0,0 +1,170 @@
+"""Test the registry of packet formats."""
+import sys
+import unittest
+
+try:
+    from unittest.mock import ANY, MagicMock
+except ImportError:
+    from mock import ANY, MagicMock
+
+from beacontools import BeaconScanner, parse_packet, parse_record, EddystoneFilter, \
+                        BtAddrFilter, EddystoneTLMFrame, IBeaconAdvertisement
+from beacontools.const import MANUFACTURER_SPECIFIC_DATA_TYPE, ScannerMode
+from beacontools.device_filters import DeviceFilter, check_filters
+from beacontools.fanout import BeaconPublisher, encode_record, decode_record, \
+                              encode_subscription, decode_subscription
+from beacontools.records import GenericRecord
+from beacontools.registry import PacketFormat, register_packet_format, \
+                                 unregister_packet_format, select_packet_formats, \
+                                 find_packet_type
+from beacontools.serializers import encode_binary, decode_binary, encode_json_lines
+from beacontools.utils import get_mode, is_packet_type
+
+# manufacturer specific data of company 0x0499 with a temperature in 1/100 degree Celsius
+PLUGIN_PAYLOAD = b"\x02\x01\x06\x05\xff\x99\x04\x2c\x01"
+PLUGIN_EVENT = b"\x04\x3e\x15\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c" + \
+               bytes([len(PLUGIN_PAYLOAD)]) + PLUGIN_PAYLOAD + b"\xdd"
+
+
+class TemperatureAdvertisement(object):
+    """Packet of the plugin format."""
+
+    def __init__(self, temperature):
+        self.temperature = temperature
+
+    @property
+    def properties(self):
+        """Get beacon properties."""
+        return {'sensor': 'temperature'}
+
+
+class TemperatureFilter(DeviceFilter):
+    """Device filter of the plugin format."""
+
+    def __init__(self):
+        super().__init__()
+        self.properties['sensor'] = 'temperature'
+
+
+def decode_temperature(data, payload):  # pylint: disable=unused-argument
+    """Decoder of the plugin format."""
+    if len(data) != 2:
+        raise ValueError("invalid length")
+    return TemperatureAdvertisement(int.from_bytes(data, 'little') / 100.0)
+
+
+class TestRegistry(unittest.TestCase):
+    """Test registering formats."""
+
+    def setUp(self):
+        self.packet_format = PacketFormat('temperature', MANUFACTURER_SPECIFIC_DATA_TYPE, 0x0499,
+                                          decode_temperature, [TemperatureAdvertisement],
+                                          [TemperatureFilter])
+        register_packet_format(self.packet_format)
+
+    def tearDown(self):
+        unregister_packet_format(MANUFACTURER_SPECIFIC_DATA_TYPE, 0x0499)
+
+    def test_parser(self):
+        """Registered formats are parsed, decoder errors yield None."""
+        self.assertEqual(self.packet_format.signatures, (b"\xff\x99\x04",))
+        self.assertEqual(parse_packet(PLUGIN_PAYLOAD).temperature, 3.0)
+        self.assertIsNone(parse_packet(b"\x02\x01\x06\x04\xff\x99\x04\x2c"))
+        unregister_packet_format(MANUFACTURER_SPECIFIC_DATA_TYPE, 0x0499)
+        self.assertIsNone(parse_packet(PLUGIN_PAYLOAD))
+
+    def test_register(self):
+        """Formats can only be replaced explicitly."""
+        other = PacketFormat('other', MANUFACTURER_SPECIFIC_DATA_TYPE, 0x0499,
+                             decode_temperature, [TemperatureAdvertisement])
+        with self.assertRaises(ValueError):
+            register_packet_format(other)
+        register_packet_format(self.packet_format)
+        register_packet_format(other, replace=True)
+        self.assertEqual(select_packet_formats(packet_filter=[TemperatureAdvertisement]),
+                         [other])
+        with self.assertRaises(ValueError):
+            PacketFormat('invalid', MANUFACTURER_SPECIFIC_DATA_TYPE, 0x10000, decode_temperature,
+                         [TemperatureAdvertisement])
+
+    def test_select(self):
+        """Filters select the formats the scanner is looking for."""
+        self.assertTrue(is_packet_type(TemperatureAdvertisement))
+        check_filters(None, [TemperatureAdvertisement])
+        self.assertEqual(select_packet_formats([TemperatureFilter()]), [self.packet_format])
+        self.assertEqual([fmt.name for fmt in select_packet_formats([EddystoneFilter("a")])],
+                         ["eddystone"])
+        self.assertEqual([fmt.name for fmt in select_packet_formats(
+            [BtAddrFilter("aa:bb:cc:dd:ee:ff")], [EddystoneTLMFrame, IBeaconAdvertisement])],
+                         ["eddystone", "ibeacon"])
+        self.assertIn(self.packet_format, select_packet_formats())
+        self.assertEqual(get_mode(None), ScannerMode.MODE_ALL)
+        self.assertEqual(get_mode([TemperatureFilter()]), ScannerMode.MODE_NONE)
+
+    def test_scanner(self):
+        """The scanner prefilters and filters registered formats like built-in ones."""
+        sys.platform = "linux"
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, device_filter=TemperatureFilter())
+        scanner._mon.process_packet(PLUGIN_EVENT)
+        self.assertEqual(callback.call_count, 1)
+        self.assertEqual(callback.call_args[0][2].temperature, 3.0)
+        self.assertEqual(callback.call_args[0][3], {'sensor': 'temperature'})
+
+        # the format is not part of the prefilter
+        scanner = BeaconScanner(callback, device_filter=EddystoneFilter("a"))
+        self.assertIsNone(scanner._mon.kwtree.search(PLUGIN_PAYLOAD))
+        self.assertIsNotNone(BeaconScanner(callback)._mon.kwtree.search(PLUGIN_PAYLOAD))
+
+    def test_records(self):
+        """Packets of registered formats become generic records and can be shipped."""
+        self.assertIs(find_packet_type('TemperatureAdvertisement'), TemperatureAdvertisement)
+        record = parse_record(PLUGIN_PAYLOAD, "1c:d6:cd:ef:94:35", -35, 1.5)
+        self.assertEqual(record, GenericRecord('TemperatureAdvertisement', "1c:d6:cd:ef:94:35",
+                                               -35, 1.5, {'sensor': 'temperature'},
+                                               {'temperature': 3.0}))
+        self.assertEqual(decode_binary(encode_binary([record, record._replace(rssi=None)])),
+                         [record, record._replace(rssi=None)])
+        self.assertEqual(encode_json_lines([record]),
+                         b'{"packet_type":"TemperatureAdvertisement","bt_addr":"1c:d6:cd:ef:94:35",'
+                         b'"rssi":-35,"timestamp":1.5,"properties":{"sensor":"temperature"},'
+                         b'"fields":{"temperature":3.0}}\n')
+
+        sys.platform = "linux"
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, device_filter=TemperatureFilter(), records=True)
+        scanner._mon.process_packet(PLUGIN_EVENT)
+        self.assertEqual(callback.call_args[0][0].fields, {'temperature': 3.0})
+
+    def test_publisher(self):
+        """Packets of registered formats are published with the name of their type."""
+        packet = parse_packet(PLUGIN_PAYLOAD)
+        message = encode_record(1.5, b"\x35\x94\xef\xcd\xd6\x1c", -35, packet,
+                                packet.properties)
+        _, bt_addr, rssi, decoded, properties = decode_record(message[4:])
+        self.assertEqual((bt_addr, rssi, properties),
+                         ("1c:d6:cd:ef:94:35", -35, {'sensor': 'temperature'}))
+        self.assertIsInstance(decoded, TemperatureAdvertisement)
+        self.assertEqual(decoded.temperature, 3.0)
+        self.assertEqual(decode_subscription(
+            encode_subscription(None, [TemperatureAdvertisement])[4:]),
+                         (None, [TemperatureAdvertisement]))
+
+        # the scanner callback survives packets which can't be encoded
+        publisher = BeaconPublisher("unused")
+        self.addCleanup(publisher._wakeup_r.close)
+        self.addCleanup(publisher._wakeup_w.close)
+        publisher._subscribers = [MagicMock(subscribed=True, device_filter=None,
+                                            packet_filter=None)]
+        publisher("1c:d6:cd:ef:94:35", -35, TemperatureAdvertisement(object()), {})
+        publisher._subscribers[0].enqueue.assert_not_called()
+        publisher("1c:d6:cd:ef:94:35", -35, packet, packet.properties)
+        publisher._subscribers[0].enqueue.assert_called_once_with(ANY)
+
+        unregister_packet_format(MANUFACTURER_SPECIFIC_DATA_TYPE, 0x0499)
+        with self.assertRaises(ValueError):
+            decode_record(message[4:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,15 @@
 """Test the scanner component."""
+import socket
+import struct
 import sys
+import threading
+import time
 import unittest
 
-from beacontools.const import CJ_TEMPHUM_TYPE, CJ_MANUFACTURER_ID
+from beacontools.const import CJ_TEMPHUM_TYPE, CJ_MANUFACTURER_ID, OGF_LE_CTL, \
+                             OCF_LE_CLEAR_WHITE_LIST, OCF_LE_ADD_DEVICE_TO_WHITE_LIST, \
+                             OCF_LE_SET_SCAN_ENABLE, OCF_LE_SET_SCAN_PARAMETERS, \
+                             OCF_LE_READ_WHITE_LIST_SIZE, ScanFilter
 
 try:
     from unittest.mock import MagicMock
@@ -13,13 +20,25 @@ from beacontools import BeaconScanner, EddystoneFilter, EddystoneTLMFrame, Eddys
                         BtAddrFilter, IBeaconFilter, IBeaconAdvertisement, EstimoteFilter, \
                         EstimoteTelemetryFrameB, EstimoteTelemetryFrameA, CJMonitorFilter, CJMonitorAdvertisement, \
                         ExposureNotificationFilter, ExposureNotificationFrame
+from beacontools.admission import AdmissionPolicy
+
+def ext_adv_report(data_status, addr, sid, rssi, data):
+    """Build a single report of an extended advertising report event."""
+    return struct.pack("<HB6sBBBbbHB6sB", data_status << 5, 1, addr, 1, 0, sid, 127, rssi, 0, 0,
+                       b"\x00" * 6, len(data)) + data
+
+
+def ext_adv_event(*reports):
+    """Build an extended advertising report event."""
+    params = b"\x0d" + bytes([len(reports)]) + b"".join(reports)
+    return b"\x04\x3e" + bytes([len(params)]) + params
+
 
 class TestScanner(unittest.TestCase):
     """Test the BeaconScanner."""
 
     def setUp(self):
-        # mock import so that tests can run without PyBluez installed
-        sys.modules['bluetooth'] = MagicMock()
+        # the Linux backend is used, it only needs the socket module
         sys.platform = "linux"
 
     def test_invalid_device_filters(self):
@@ -80,7 +99,7 @@ class TestScanner(unittest.TestCase):
         callback = MagicMock()
         scanner = BeaconScanner(callback, device_filter=EddystoneFilter(instance="000000000001"))
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
-              b"\xfe\x11\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
               b"\x00\x00\x01\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         self.assertEqual(callback.call_count, 1)
@@ -93,6 +112,27 @@ class TestScanner(unittest.TestCase):
             "instance":"000000000001"
         })
 
+    def test_process_packet_eddystone_mapping(self):
+        """TLM frames get the properties of the UID frame sent from the same address."""
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, device_filter=EddystoneFilter(instance="000000000001"))
+        uid = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\x00\x00\x01\x00\x00\xdd"
+        tlm = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+              b"\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+        scanner._mon.process_packet(uid)
+        scanner._mon.process_packet(tlm)
+        self.assertEqual(callback.call_count, 2)
+        args = callback.call_args[0]
+        self.assertEqual(args[0], "1c:d6:cd:ef:94:35")
+        self.assertIsInstance(args[2], EddystoneTLMFrame)
+        self.assertEqual(args[3], {
+            "namespace":"12345678901234678901",
+            "instance":"000000000001"
+        })
+        self.assertEqual(list(scanner._mon.eddystone_mappings), [b"\x35\x94\xef\xcd\xd6\x1c"])
+
     def test_process_packet_dev_filter2(self):
         """Test processing of a packet and callback execution."""
         callback = MagicMock()
@@ -121,6 +161,32 @@ class TestScanner(unittest.TestCase):
             "minor":2
         })
 
+    def test_process_packet_all_frames(self):
+        """All frames of an advertisement are passed to the callback with all_frames."""
+        payload = b"\x02\x01\x06\x1a\xff\x4c\x00\x02\x15" + b"\x41" * 16 + \
+                  b"\x00\x01\x00\x02\xf8\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12" \
+                  b"\x34\x67\x89\x01\x00\x00\x00\x00\x00\x01\x00\x00"
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, all_frames=True)
+        scanner._mon.process_advertisement(b"\x35\x94\xef\xcd\xd6\x1c", 0xdd, payload)
+        self.assertEqual(callback.call_count, 2)
+        self.assertIsInstance(callback.call_args_list[0][0][2], IBeaconAdvertisement)
+        self.assertIsInstance(callback.call_args_list[1][0][2], EddystoneUIDFrame)
+        for call in callback.call_args_list:
+            self.assertEqual(call[0][:2], ("1c:d6:cd:ef:94:35", -35))
+
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, device_filter=EddystoneFilter(instance="000000000001"),
+                                all_frames=True)
+        scanner._mon.process_advertisement(b"\x35\x94\xef\xcd\xd6\x1c", 0xdd, payload)
+        self.assertEqual(callback.call_count, 1)
+        self.assertIsInstance(callback.call_args[0][2], EddystoneUIDFrame)
+
+        callback = MagicMock()
+        scanner = BeaconScanner(callback)
+        scanner._mon.process_advertisement(b"\x35\x94\xef\xcd\xd6\x1c", 0xdd, payload)
+        self.assertEqual(callback.call_count, 1)
+
     def test_process_packet_dev_filter4(self):
         """Test processing of a packet and callback execution with cj Monitor device filter."""
         callback = MagicMock()
@@ -159,7 +225,7 @@ class TestScanner(unittest.TestCase):
             packet_filter=EddystoneUIDFrame
         )
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
-              b"\xfe\x11\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
               b"\x00\x00\x01\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         self.assertEqual(callback.call_count, 1)
@@ -180,7 +246,7 @@ class TestScanner(unittest.TestCase):
             packet_filter=EddystoneUIDFrame
         )
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
-              b"\xfe\x11\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
               b"\x00\x00\x01\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         self.assertEqual(callback.call_count, 1)
@@ -201,7 +267,7 @@ class TestScanner(unittest.TestCase):
             packet_filter=EddystoneTLMFrame
         )
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
-              b"\xfe\x11\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
               b"\x00\x00\x01\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         callback.assert_not_called()
@@ -225,7 +291,7 @@ class TestScanner(unittest.TestCase):
             device_filter=BtAddrFilter("1c:d6:cd:ef:94:35")
         )
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
-              b"\xfe\x11\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
               b"\x00\x00\x01\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         self.assertEqual(callback.call_count, 1)
@@ -362,7 +428,7 @@ class TestScanner(unittest.TestCase):
               b"\xf0\x01\x00\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
-              b"\xfe\x11\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
               b"\x00\x00\x01\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
@@ -383,15 +449,15 @@ class TestScanner(unittest.TestCase):
               b"\xf0\x01\x00\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
-              b"\xfe\x11\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
               b"\x00\x00\x01\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
-              b"\xfe\x11\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
               b"\x00\x00\x02\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
-              b"\xfe\x11\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
               b"\x00\x00\x01\x00\x00\xdd"
         scanner._mon.process_packet(pkt)
         self.assertEqual(callback.call_count, 3)
@@ -410,5 +476,328 @@ class TestScanner(unittest.TestCase):
         scanner._mon.process_packet(ios_pkt)
         self.assertEqual(callback.call_count, 2)
 
+    def test_process_ext_packet(self):
+        """Test processing of chained extended advertising reports."""
+        callback = MagicMock()
+        scanner = BeaconScanner(callback)
+        addr = b"\x35\x94\xef\xcd\xd6\x1c"
+        payload = b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00" \
+                  b"\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+        # complete advertisement in one report
+        scanner._mon.process_packet(ext_adv_event(ext_adv_report(0, addr, 1, -40, payload)))
+        self.assertEqual(callback.call_count, 1)
+        args = callback.call_args[0]
+        self.assertEqual(args[0], "1c:d6:cd:ef:94:35")
+        self.assertEqual(args[1], -40)
+        self.assertIsInstance(args[2], EddystoneTLMFrame)
+
+        # fragments in separate events and in a single event
+        scanner._mon.process_packet(ext_adv_event(ext_adv_report(1, addr, 1, -41, payload[:10])))
+        self.assertEqual(callback.call_count, 1)
+        scanner._mon.process_packet(ext_adv_event(ext_adv_report(0, addr, 1, -42, payload[10:])))
+        self.assertEqual(callback.call_count, 2)
+        self.assertEqual(callback.call_args[0][1], -42)
+        scanner._mon.process_packet(ext_adv_event(ext_adv_report(1, addr, 2, -41, payload[:5]),
+                                                  ext_adv_report(1, addr, 2, -41, payload[5:20]),
+                                                  ext_adv_report(0, addr, 2, -43, payload[20:])))
+        self.assertEqual(callback.call_count, 3)
+        self.assertIsInstance(callback.call_args[0][2], EddystoneTLMFrame)
+
+        # truncated data is not parsed
+        scanner._mon.process_packet(ext_adv_event(ext_adv_report(1, addr, 1, -41, payload[:10]),
+                                                  ext_adv_report(2, addr, 1, -42, payload[10:20])))
+        # the event is cut off in the middle of a report
+        scanner._mon.process_packet(ext_adv_event(ext_adv_report(0, addr, 1, -41, payload))[:-3])
+        self.assertEqual(callback.call_count, 3)
+        self.assertEqual(scanner.stats()['reassembly']['truncated'], 1)
+        self.assertEqual(scanner.stats()['reassembly']['malformed'], 1)
+        self.assertEqual(scanner.stats()['reassembly']['invalid'], 0)
+
+    def test_white_list(self):
+        """Test programming of the controller white list from BtAddrFilters."""
+        scanner = BeaconScanner(MagicMock(), device_filter=[BtAddrFilter("1c:d6:cd:ef:94:35"),
+                                                            BtAddrFilter("aa:bb:cc:dd:ee:ff")])
+        backend = scanner._mon.backend = MagicMock()
+        backend.send_req.return_value = b"\x00\x04"
+        self.assertTrue(scanner._mon.program_white_list())
+        self.assertTrue(scanner._mon.white_list_active)
+        calls = [call[0][1:] for call in backend.send_cmd.call_args_list]
+        self.assertEqual(calls, [
+            (OGF_LE_CTL, OCF_LE_CLEAR_WHITE_LIST, b""),
+            (OGF_LE_CTL, OCF_LE_ADD_DEVICE_TO_WHITE_LIST, b"\x00\x35\x94\xef\xcd\xd6\x1c"),
+            (OGF_LE_CTL, OCF_LE_ADD_DEVICE_TO_WHITE_LIST, b"\x01\x35\x94\xef\xcd\xd6\x1c"),
+            (OGF_LE_CTL, OCF_LE_ADD_DEVICE_TO_WHITE_LIST, b"\x00\xff\xee\xdd\xcc\xbb\xaa"),
+            (OGF_LE_CTL, OCF_LE_ADD_DEVICE_TO_WHITE_LIST, b"\x01\xff\xee\xdd\xcc\xbb\xaa"),
+        ])
+
+    def test_white_list_fallback(self):
+        """Test fallback to software filtering if the white list can't be used."""
+        # white list too small
+        scanner = BeaconScanner(MagicMock(), device_filter=[BtAddrFilter("1c:d6:cd:ef:94:35"),
+                                                            BtAddrFilter("aa:bb:cc:dd:ee:ff")])
+        backend = scanner._mon.backend = MagicMock()
+        backend.send_req.return_value = b"\x00\x03"
+        self.assertFalse(scanner._mon.program_white_list())
+        backend.send_cmd.assert_not_called()
+
+        # not supported by the backend
+        backend.send_req.side_effect = NotImplementedError
+        self.assertFalse(scanner._mon.program_white_list())
+        backend.send_cmd.assert_not_called()
+
+        # other device filters
+        for device_filter in [None, [BtAddrFilter("1c:d6:cd:ef:94:35"), IBeaconFilter(major=1)]]:
+            scanner = BeaconScanner(MagicMock(), device_filter=device_filter)
+            backend = scanner._mon.backend = MagicMock()
+            self.assertFalse(scanner._mon.program_white_list())
+            backend.send_req.assert_not_called()
+            backend.send_cmd.assert_not_called()
+            self.assertFalse(scanner._mon.white_list_active)
+
+    def test_white_list_scan_parameters(self):
+        """Test that the scan filter policy is reset if the white list can't be programmed."""
+        scanner = BeaconScanner(MagicMock(), device_filter=IBeaconFilter(major=1),
+                                scan_parameters={"filter_type": ScanFilter.WHITELIST_ONLY})
+        mon = scanner._mon
+        mon.backend = MagicMock()
+        mon.backend.open_dev.return_value, controller = socket.socketpair()
+        self.addCleanup(controller.close)
+        mon.backend.send_req.side_effect = NotImplementedError
+        mon.set_scan_parameters = MagicMock()
+        mon.keep_going = False
+        mon.run()
+        mon.set_scan_parameters.assert_called_once_with(filter_type=ScanFilter.ALL)
+
+    def test_min_rssi_blocklist(self):
+        """Test that weak and blocked advertisements are dropped before parsing."""
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, admission_policy=AdmissionPolicy(
+            min_rssi=-30, blocklist=["aa:bb:cc:dd:ee:ff"]))
+        mon = scanner._mon
+        mon.filters._kwtree = MagicMock()
+        # rssi -28, then -60
+        pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+              b"\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+        weak = pkt[:-1] + b"\xc4"
+        mon.process_packet(pkt)
+        mon.process_packet(weak)
+        self.assertEqual(callback.call_count, 1)
+        self.assertEqual(scanner.stats()['drops'], {'rssi': 1, 'blocked': 0, 'flood': 0, 'overload': 0})
+
+        scanner.block("1c:d6:cd:ef:94:35")
+        self.assertEqual(mon.admission_policy.blocklist, {b"\xff\xee\xdd\xcc\xbb\xaa", b"\x35\x94\xef\xcd\xd6\x1c"})
+        mon.process_packet(pkt)
+        mon.process_packet(weak)
+        self.assertEqual(callback.call_count, 1)
+        self.assertEqual(scanner.stats()['drops'], {'rssi': 1, 'blocked': 2, 'flood': 0, 'overload': 0})
+        # dropped before the prefilter
+        self.assertEqual(mon.filters._kwtree.search.call_count, 1)
+
+        scanner.unblock("1c:d6:cd:ef:94:35", "aa:bb:cc:dd:ee:ff")
+        self.assertEqual(mon.admission_policy.blocklist, frozenset())
+        mon.process_packet(pkt)
+        self.assertEqual(callback.call_count, 2)
+
+        # extended reports are checked with their own address and rssi
+        scanner.block("1c:d6:cd:ef:94:35")
+        payload = pkt[14:-1]
+        mon.process_packet(ext_adv_event(ext_adv_report(0, b"\x35\x94\xef\xcd\xd6\x1c", 1, -20, payload),
+                                         ext_adv_report(0, b"\x01\x94\xef\xcd\xd6\x1c", 1, -80, payload),
+                                         ext_adv_report(0, b"\x02\x94\xef\xcd\xd6\x1c", 1, -20, payload)))
+        self.assertEqual(callback.call_count, 3)
+        self.assertEqual(callback.call_args[0][:2], ("1c:d6:cd:ef:94:02", -20))
+        self.assertEqual(scanner.stats()['drops'], {'rssi': 2, 'blocked': 3, 'flood': 0, 'overload': 0})
+
+    def test_blocked_fragments(self):
+        """Test that fragments of blocked and weak advertisers are not buffered."""
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, admission_policy=AdmissionPolicy(
+            min_rssi=-60, blocklist=["1c:d6:cd:ef:94:35"]))
+        mon = scanner._mon
+        reassembler = mon.reassembler
+        mon.reassembler = MagicMock(wraps=reassembler)
+        blocked = b"\x35\x94\xef\xcd\xd6\x1c"
+        weak = b"\x01\x94\xef\xcd\xd6\x1c"
+        payload = b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00" \
+                  b"\x00\x14\x67\x00\x00\x2a\xc4\xe4"
+        mon.process_packet(ext_adv_event(ext_adv_report(1, blocked, 1, -40, payload[:10]),
+                                         ext_adv_report(1, blocked, 1, -40, payload[10:20]),
+                                         ext_adv_report(0, blocked, 1, -40, payload[20:]),
+                                         ext_adv_report(1, weak, 1, -80, payload[:10]),
+                                         ext_adv_report(0, weak, 1, -80, payload[10:])))
+        mon.reassembler.add.assert_not_called()
+        self.assertEqual(reassembler.pending, 0)
+        self.assertEqual(callback.call_count, 0)
+        self.assertEqual(scanner.stats()['drops'], {'rssi': 2, 'blocked': 3, 'flood': 0, 'overload': 0})
+
+    def test_update_filters(self):
+        """Test replacing the filters of a running scanner."""
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, device_filter=EddystoneFilter(instance="000000000002"))
+        mon = scanner._mon
+        mon.backend = MagicMock()
+        mon.socket = MagicMock()
+        uid = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x03\x03\xaa"\
+              b"\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89\x01\x00\x00\x00"\
+              b"\x00\x00\x01\x00\x00\xdd"
+        ibeacon = b"\x04\x3e\x2b\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x1f\x02\x01\x06\x1a\xff"\
+                  b"\x4c\x00\x02\x15\x41\x41\x41\x41\x41\x41\x41\x41\x41\x41\x41\x41\x41\x41"\
+                  b"\x41\x41\x00\x01\x00\x01\xf8\xdc"
+        mon.process_packet(uid)
+        callback.assert_not_called()
+        old_filters = mon.filters
+
+        scanner.update_filters(device_filter=EddystoneFilter(instance="000000000001"))
+        self.assertIsNot(mon.filters, old_filters)
+        # the prefilter was compiled before the swap
+        self.assertIsNotNone(mon.filters._kwtree)
+        mon.process_packet(uid)
+        self.assertEqual(callback.call_count, 1)
+        self.assertEqual(callback.call_args[0][3]["instance"], "000000000001")
+        # iBeacons are not part of the prefilter
+        self.assertIsNone(mon.kwtree.search(ibeacon[14:-1]))
+
+        scanner.update_filters(device_filter=IBeaconFilter(major=1), packet_filter=IBeaconAdvertisement)
+        mon.process_packet(uid)
+        mon.process_packet(ibeacon)
+        self.assertEqual(callback.call_count, 2)
+        self.assertIsInstance(callback.call_args[0][2], IBeaconAdvertisement)
+        self.assertEqual(mon.packet_filter, [IBeaconAdvertisement])
+
+        # invalid filters are rejected and the old ones stay active
+        filters = mon.filters
+        with self.assertRaises(ValueError):
+            scanner.update_filters(device_filter=[BtAddrFilter("aa:bb:cc:dd:ee:ff"), "foo"])
+        self.assertIs(mon.filters, filters)
+
+        # scanning was not interrupted
+        mon.backend.send_cmd.assert_not_called()
+
+    def test_update_filters_white_list(self):
+        """Test that the scanner thread reprograms the white list when the filters are replaced."""
+        scanner = BeaconScanner(MagicMock(), device_filter=BtAddrFilter("1c:d6:cd:ef:94:35"),
+                                scan_parameters={"filter_type": ScanFilter.WHITELIST_ONLY})
+        mon = scanner._mon
+        mon.backend = MagicMock()
+        mon.backend.open_dev.return_value, controller = socket.socketpair()
+        self.addCleanup(controller.close)
+
+        def send_req(sock, ogf, ocf, *args):  # pylint: disable=unused-argument
+            if ocf == OCF_LE_READ_WHITE_LIST_SIZE:
+                return b"\x00\x04"
+            raise NotImplementedError
+        mon.backend.send_req.side_effect = send_req
+        commands = []
+        threads = set()
+        scan_enabled = threading.Event()
+
+        def send_cmd(sock, ogf, ocf, data):  # pylint: disable=unused-argument
+            commands.append((ogf, ocf, data))
+            threads.add(threading.current_thread())
+            if ocf == OCF_LE_SET_SCAN_ENABLE and data[0]:
+                scan_enabled.set()
+        mon.backend.send_cmd.side_effect = send_cmd
+
+        scanner.start()
+        self.addCleanup(scanner.stop)
+        self.assertTrue(scan_enabled.wait(1))
+        scan_enabled.clear()
+        del commands[:]
+        scanner.update_filters(device_filter=BtAddrFilter("aa:bb:cc:dd:ee:ff"))
+        self.assertTrue(scan_enabled.wait(1))
+        self.assertEqual(commands, [
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x00\x00"),
+            (OGF_LE_CTL, OCF_LE_CLEAR_WHITE_LIST, b""),
+            (OGF_LE_CTL, OCF_LE_ADD_DEVICE_TO_WHITE_LIST, b"\x00\xff\xee\xdd\xcc\xbb\xaa"),
+            (OGF_LE_CTL, OCF_LE_ADD_DEVICE_TO_WHITE_LIST, b"\x01\xff\xee\xdd\xcc\xbb\xaa"),
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x01\x00"),
+        ])
+        self.assertTrue(mon.white_list_active)
+
+        # other filters can't use the white list, the scan policy falls back to all devices
+        scan_enabled.clear()
+        del commands[:]
+        scanner.update_filters(device_filter=IBeaconFilter(major=1))
+        self.assertTrue(scan_enabled.wait(1))
+        self.assertEqual([command[1] for command in commands],
+                         [OCF_LE_SET_SCAN_ENABLE, OCF_LE_SET_SCAN_PARAMETERS, OCF_LE_SET_SCAN_ENABLE])
+        self.assertEqual(commands[1][2][-1], ScanFilter.ALL)
+        self.assertFalse(mon.white_list_active)
+        # the controller was only accessed by the scanner thread
+        self.assertEqual(threads, {mon})
+
+    def test_duplicates_filter_rearm(self):
+        """Test that the duplicates filter of the controller is re-armed periodically."""
+        with self.assertRaises(ValueError):
+            BeaconScanner(MagicMock(), filter_duplicates=True, duplicates_rearm_interval=0)
+
+        scanner = BeaconScanner(MagicMock(), filter_duplicates=True, duplicates_rearm_interval=0.01)
+        mon = scanner._mon
+        mon.backend = MagicMock()
+        mon.socket, controller = socket.socketpair()
+        self.addCleanup(mon.socket.close)
+        self.addCleanup(controller.close)
+        mon._open_selector()
+        self.addCleanup(mon._close_selector)
+        mon._next_rearm = 0
+        self.assertFalse(mon._wait_for_packet())
+        calls = [call[0][1:] for call in mon.backend.send_cmd.call_args_list]
+        self.assertEqual(calls, [
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x00\x00"),
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x01\x01"),
+        ])
+        self.assertGreater(mon._next_rearm, 0)
+
+        # no timers while paused, the scan is re-enabled and the timer restarted on resume
+        mon.pause()
+        self.assertFalse(mon._wait_for_packet())
+        mon._scanning = True
+        mon._apply_pause()
+        mon.resume()
+        mon._apply_pause()
+        calls = [call[0][1:] for call in mon.backend.send_cmd.call_args_list[2:]]
+        self.assertEqual(calls, [
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x00\x00"),
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x01\x01"),
+        ])
+        self.assertGreater(mon._next_rearm, time.monotonic())
+
+        # packets are waited for without timeout
+        controller.send(b"\x04")
+        self.assertTrue(mon._wait_for_packet())
+
+    def test_stop_pause_resume(self):
+        """Test that a quiet scanner stops at once and that pausing only toggles the scan."""
+        scanner = BeaconScanner(MagicMock())
+        mon = scanner._mon
+        mon.backend = MagicMock()
+        mon.backend.send_req.side_effect = NotImplementedError
+        mon.backend.open_dev.return_value, controller = socket.socketpair()
+        self.addCleanup(controller.close)
+        scan_enabled = threading.Event()
+        scan_disabled = threading.Event()
+
+        def send_cmd(sock, ogf, ocf, data):  # pylint: disable=unused-argument
+            if ocf == OCF_LE_SET_SCAN_ENABLE:
+                (scan_enabled if data[0] else scan_disabled).set()
+        mon.backend.send_cmd.side_effect = send_cmd
+
+        scanner.start()
+        self.assertTrue(scan_enabled.wait(1))
+        scan_enabled.clear()
+        scanner.pause()
+        self.assertTrue(scan_disabled.wait(1))
+        scan_disabled.clear()
+        scanner.resume()
+        self.assertTrue(scan_enabled.wait(1))
+
+        start = time.monotonic()
+        scanner.stop()
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertFalse(mon.is_alive())
+        self.assertTrue(scan_disabled.is_set())
+        # the device was opened once
+        mon.backend.open_dev.assert_called_once_with(0)
+
 if __name__ == "__main__":
     unittest.main()
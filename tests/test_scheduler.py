@@ -0,0 +1,176 @@
+"""Test the adaptive scan duty cycle."""
+import sys
+import unittest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from beacontools import BeaconScanner, IBeaconAdvertisement, IBeaconFilter
+from beacontools.const import OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, OCF_LE_SET_SCAN_PARAMETERS
+from beacontools.scheduler import DutyCyclePolicy, DutyCycleScheduler
+
+
+class TestScheduler(unittest.TestCase):
+    """Test the DutyCycleScheduler."""
+
+    def test_policy(self):
+        """Test validation of the policy."""
+        tests = [
+            {"interval_ms": 2},
+            {"interval_ms": 20000},
+            {"min_duty_cycle": 0},
+            {"min_duty_cycle": 0.5, "max_duty_cycle": 0.4},
+            {"max_duty_cycle": 1.1},
+            {"interval_ms": 10, "min_duty_cycle": 0.1},
+            {"backoff_factor": 1},
+            {"evaluation_period": 0},
+        ]
+        for kwargs in tests:
+            with self.assertRaises(ValueError):
+                DutyCyclePolicy(**kwargs)
+
+        policy = DutyCyclePolicy(interval_ms=1000)
+        self.assertEqual(policy.window_ms(1.0), 1000)
+        self.assertEqual(policy.window_ms(0.1), 100)
+        # rounded to multiples of 0.625ms and clamped to the valid range
+        self.assertEqual(policy.window_ms(0.0001), 2.5)
+        self.assertEqual(policy.window_ms(0.0101), 10.0)
+
+    def test_backoff(self):
+        """The duty cycle is reduced when it is quiet and raised when new beacons appear."""
+        policy = DutyCyclePolicy(interval_ms=1000, min_duty_cycle=0.1, quiet_rate=1,
+                                 backoff_factor=0.5, evaluation_period=10, forget_after=100)
+        scheduler = DutyCycleScheduler(policy, now=0)
+        self.assertEqual(scheduler.scan_parameters(), {"interval_ms": 1000, "window_ms": 1000})
+        self.assertEqual(scheduler.next_deadline, 10)
+        self.assertIsNone(scheduler.update(now=5))
+
+        # quiet, back off until the minimum is reached
+        self.assertEqual(scheduler.update(now=10), {"interval_ms": 1000, "window_ms": 500})
+        self.assertEqual(scheduler.update(now=20), {"interval_ms": 1000, "window_ms": 250})
+        self.assertEqual(scheduler.update(now=30), {"interval_ms": 1000, "window_ms": 125})
+        self.assertEqual(scheduler.update(now=40), {"interval_ms": 1000, "window_ms": 100})
+        self.assertIsNone(scheduler.update(now=50))
+
+        # busy beacon which is known already, keep the duty cycle
+        self.assertTrue(scheduler.record_packet("a", now=51))
+        self.assertEqual(scheduler.update(now=51), {"interval_ms": 1000, "window_ms": 1000})
+        for i in range(20):
+            self.assertFalse(scheduler.record_packet("a", now=52 + i * 0.1))
+        self.assertIsNone(scheduler.update(now=61))
+        self.assertEqual(scheduler.duty_cycle, 1.0)
+
+        # quiet again
+        self.assertEqual(scheduler.update(now=71), {"interval_ms": 1000, "window_ms": 500})
+        # known beacon is not new
+        self.assertFalse(scheduler.record_packet("a", now=72))
+        self.assertIsNone(scheduler.update(now=72))
+
+        stats = scheduler.stats(now=81)
+        self.assertEqual(stats["duty_cycle"], 0.5)
+        self.assertEqual(stats["reprogrammed"], 6)
+        self.assertEqual(stats["known_beacons"], 1)
+        # saved 0.5*10 + 0.75*10 + 0.875*10 + 0.9*11 + 0.5*10 seconds
+        self.assertAlmostEqual(stats["radio_time_saved"], 36.15)
+        self.assertAlmostEqual(stats["radio_time_saved_ratio"], 36.15 / 81)
+        # stats doesn't account the saved time, an earlier time still sees less of it
+        self.assertAlmostEqual(scheduler.stats(now=76)["radio_time_saved"], 33.65)
+
+    def test_forget(self):
+        """Beacons which have not been seen for a while are new again."""
+        policy = DutyCyclePolicy(evaluation_period=10, forget_after=15)
+        scheduler = DutyCycleScheduler(policy, now=0)
+        scheduler.record_packet("a", now=1)
+        scheduler.update(now=10)
+        self.assertEqual(scheduler.stats(now=10)["known_beacons"], 1)
+        scheduler.update(now=20)
+        self.assertEqual(scheduler.stats(now=20)["known_beacons"], 0)
+        self.assertTrue(scheduler.record_packet("a", now=21))
+
+
+class TestScannerScheduler(unittest.TestCase):
+    """Test the integration of the scheduler into the scanner."""
+
+    def setUp(self):
+        # the Linux backend is used, it only needs the socket module
+        sys.platform = "linux"
+
+    def test_reprogram(self):
+        """The scanner reprograms the controller when the scheduler changes the parameters."""
+        scheduler = DutyCycleScheduler(DutyCyclePolicy(interval_ms=100, evaluation_period=10), now=0)
+        scheduler.update(now=10)
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, packet_filter=IBeaconAdvertisement, scan_scheduler=scheduler)
+        mon = scanner._mon
+        mon.backend = MagicMock()
+        mon.active_scan_parameters = {"interval_ms": 100, "window_ms": 50}
+        mon._scanning = True
+        pkt = b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01\x06\x1a\xff\x4c"\
+              b"\x00\x02\x15\x41\x42\x43\x44\x45\x46\x47\x48\x49\x40\x41\x42\x43\x44\x45\x46\x00"\
+              b"\x01\x00\x02\xf8\xdd"
+        mon.process_packet(pkt)
+        self.assertEqual(callback.call_count, 1)
+        calls = [call[0][1:] for call in mon.backend.send_cmd.call_args_list]
+        self.assertEqual(calls, [
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x00\x00"),
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_PARAMETERS, b"\x01\xa0\x00\xa0\x00\x01\x00"),
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x01\x00"),
+        ])
+        self.assertEqual(mon.active_scan_parameters, {"interval_ms": 100, "window_ms": 100})
+        self.assertEqual(scanner.stats()["scheduler"]["duty_cycle"], 1.0)
+
+        # the same beacon again does not trigger reprogramming
+        mon.process_packet(pkt)
+        self.assertEqual(mon.backend.send_cmd.call_count, 3)
+
+    def test_filtered(self):
+        """Beacons which don't pass the filters are not counted."""
+        scheduler = DutyCycleScheduler(DutyCyclePolicy(interval_ms=100, evaluation_period=10), now=0)
+        scheduler.update(now=10)
+        callback = MagicMock()
+        scanner = BeaconScanner(callback, device_filter=IBeaconFilter(major=5),
+                                scan_scheduler=scheduler)
+        mon = scanner._mon
+        mon.backend = MagicMock()
+        mon.active_scan_parameters = {"interval_ms": 100, "window_ms": 50}
+        mon._scanning = True
+        mon.process_packet(b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01"
+                           b"\x06\x1a\xff\x4c\x00\x02\x15\x41\x42\x43\x44\x45\x46\x47\x48\x49"
+                           b"\x40\x41\x42\x43\x44\x45\x46\x00\x01\x00\x02\xf8\xdd")
+        callback.assert_not_called()
+        mon.backend.send_cmd.assert_not_called()
+        self.assertEqual(scanner.stats()["scheduler"]["known_beacons"], 0)
+
+    def test_paused(self):
+        """A new beacon which was queued before pause does not re-enable scanning."""
+        scheduler = DutyCycleScheduler(DutyCyclePolicy(interval_ms=100, evaluation_period=10), now=0)
+        scheduler.update(now=10)
+        scanner = BeaconScanner(MagicMock(), packet_filter=IBeaconAdvertisement,
+                                scan_scheduler=scheduler)
+        mon = scanner._mon
+        mon.backend = MagicMock()
+        mon.active_scan_parameters = {"interval_ms": 100, "window_ms": 50}
+        mon._scanning = True
+        scanner.pause()
+        mon.process_packet(b"\x41\x3e\x41\x02\x01\x03\x01\x35\x94\xef\xcd\xd6\x1c\x19\x02\x01"
+                           b"\x06\x1a\xff\x4c\x00\x02\x15\x41\x42\x43\x44\x45\x46\x47\x48\x49"
+                           b"\x40\x41\x42\x43\x44\x45\x46\x00\x01\x00\x02\xf8\xdd")
+        mon._apply_pause()
+        calls = [call[0][1:] for call in mon.backend.send_cmd.call_args_list]
+        self.assertEqual(calls, [
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x00\x00"),
+            (OGF_LE_CTL, OCF_LE_SET_SCAN_PARAMETERS, b"\x01\xa0\x00\xa0\x00\x01\x00"),
+        ])
+
+        # resuming enables scanning with the new parameters
+        scanner.resume()
+        mon._apply_pause()
+        self.assertEqual(mon.backend.send_cmd.call_args[0][1:],
+                         (OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, b"\x01\x00"))
+        self.assertEqual(mon.backend.send_cmd.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
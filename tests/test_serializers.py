@@ -0,0 +1,86 @@
+"""Test the record encoders."""
+import json
+import unittest
+
+from beacontools import parse_record
+from beacontools.records import PACKET_FIELDS, RECORD_TYPES
+from beacontools.serializers import FIELD_KINDS, encode_binary, decode_binary, encode_json_lines
+
+PACKETS = [
+    # eddystone uid, url, tlm, encrypted tlm, eid
+    b"\x02\x01\x06\x03\x03\xaa\xfe\x17\x16\xaa\xfe\x00\xe3\x12\x34\x56\x78\x90\x12\x34\x67\x89"
+    b"\x01\x00\x00\x00\x00\x00\x01\x00\x00",
+    b"\x03\x03\xAA\xFE\x13\x16\xAA\xFE\x10\xF8\x03github\x00citruz",
+    b"\x02\x01\x06\x03\x03\xaa\xfe\x11\x16\xaa\xfe\x20\x00\x0b\x18\x13\x00\x00\x00\x14\x67\x00"
+    b"\x00\x2a\xc4\xe4",
+    b"\x02\x01\x06\x03\x03\xaa\xfe\x15\x16\xaa\xfe\x20\x01\x41\x41\x41\x41\x41\x41\x41\x41\x41"
+    b"\x41\x41\x41\xDE\xAD\xBE\xFF",
+    b"\x02\x01\x06\x03\x03\xaa\xfe\x0d\x16\xaa\xfe\x30\xe3\x45\x49\x44\x5f\x74\x65\x73\x74",
+    # ibeacon (cypress)
+    b"\x02\x01\x04\x1a\xff\x4c\x00\x02\x15\x00\x05\x00\x01\x00\x00\x10\x00\x80\x00\x00\x80\x5f"
+    b"\x9b\x01\x31\x00\x02\x6c\x66\xc3",
+    # estimote telemetry a, b, nearable
+    b"\x02\x01\x04\x03\x03\x9a\xfe\x17\x16\x9a\xfe\x22\x47\xa0\x38\xd5\xeb\x03\x26\x40\x00\x00"
+    b"\x01\x41\x44\x47\xfa\xff\xff\xff\xff",
+    b"\x02\x01\x04\x03\x03\x9a\xfe\x17\x16\x9a\xfe\x22\x47\xa0\x38\xd5\xeb\x03\x26\x40\x01\xd8"
+    b"\x42\xed\x73\x49\x25\x66\xbc\x2e\x50",
+    b"\x02\x01\x04\x03\x03\x0f\x18\x17\xff\x5d\x01\x01\x1e\xfe\x42\x7e\xb6\xf4\xbc\x2f\x04\x01"
+    b"\x68\xa1\xaa\xfe\x05\xc1\x45\x25\x53",
+    # exposure notification
+    b"\x02\x01\x1a\x03\x03\x6f\xfd\x17\x16\x6f\xfd\x0d\x3b\x4f\x65\x58\x4c\x58\x21\x60\x57\x1d"
+    b"\xd1\x90\x10\xd4\x1c\x26\x60\xee\x34\xd1",
+    # cj monitor
+    b"\x02\x01\x06\x05\x02\x1A\x18\x00\x18\x09\xFF\x72\x04\xFE\x10\xD1\x0C\x33\x61\x09\x09\x4D"
+    b"\x6F\x6E\x20\x35\x36\x34\x33",
+]
+
+
+class TestSerializers(unittest.TestCase):
+    """Test the JSON Lines and binary encoders."""
+
+    def setUp(self):
+        self.records = [parse_record(packet, "1c:d6:cd:ef:94:35", -35, 1600000000.25)
+                        for packet in PACKETS]
+
+    def test_schema(self):
+        """Every packet type has a binary layout for all of its fields."""
+        self.assertEqual(set(FIELD_KINDS), set(PACKET_FIELDS))
+        for cls, fields in PACKET_FIELDS.items():
+            self.assertEqual(len(FIELD_KINDS[cls]), len(fields), cls)
+
+    def test_binary(self):
+        """Records are restored exactly."""
+        self.assertEqual({type(record) for record in self.records}, set(RECORD_TYPES.values()))
+        data = encode_binary(self.records)
+        self.assertEqual(decode_binary(bytes(data)), self.records)
+
+        # missing values and appending to an existing buffer
+        records = [parse_record(PACKETS[0]),
+                   self.records[6]._replace(pressure=None, acceleration=None),
+                   self.records[10]._replace(name=None, properties={"name": "ä"})]
+        out = bytearray(data)
+        self.assertIs(encode_binary(records, out), out)
+        self.assertEqual(decode_binary(out), self.records + records)
+        self.assertEqual(encode_binary([]), b"")
+
+        for data in [out[:-1], b"\x01", b"\x02\x00\xff\x00", out[:2] + b"\x00" + out[2:]]:
+            with self.assertRaises(ValueError):
+                decode_binary(data)
+
+    def test_json_lines(self):
+        """One JSON object per record."""
+        data = encode_json_lines(self.records)
+        lines = data.decode("utf-8").split("\n")
+        self.assertEqual(len(lines), len(self.records) + 1)
+        self.assertEqual(lines[-1], "")
+        for line, record in zip(lines, self.records):
+            row = json.loads(line)
+            self.assertEqual(list(row), list(record._fields))
+            self.assertEqual(row["packet_type"], record.packet_type)
+        self.assertEqual(json.loads(lines[4])["eid"], "4549445f74657374")
+        self.assertEqual(json.loads(lines[0])["properties"]["instance"], "000000000001")
+        self.assertEqual(encode_json_lines([]), b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
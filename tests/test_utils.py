@@ -1,10 +1,13 @@
 """Test the utilities component."""
+import socket
 import unittest
 
 from beacontools.utils import data_to_hexstring, data_to_binstring, bt_addr_to_string, \
-                              is_one_of, is_packet_type, to_int, bin_to_int, data_to_uuid
+                              string_to_bt_addr, is_one_of, is_packet_type, to_int, bin_to_int, data_to_uuid, \
+                              drain_socket
 from beacontools import EddystoneUIDFrame, EddystoneURLFrame, \
-                        EddystoneEncryptedTLMFrame, EddystoneTLMFrame
+                        EddystoneEncryptedTLMFrame, EddystoneTLMFrame, CJMonitorAdvertisement
+from beacontools.packet_types import EstimoteNearable
 
 class TestUtils(unittest.TestCase):
     """Test the utilities."""
@@ -19,6 +22,18 @@ class TestUtils(unittest.TestCase):
         for data, hexstring in tests:
             self.assertEqual(data_to_hexstring(data), hexstring)
 
+    def test_drain_socket(self):
+        """Verify that everything waiting on the socket is read."""
+        reader, writer = socket.socketpair()
+        self.addCleanup(reader.close)
+        self.addCleanup(writer.close)
+        reader.setblocking(False)
+        drain_socket(reader)
+        writer.send(b"\0" * 5000)
+        drain_socket(reader)
+        with self.assertRaises(BlockingIOError):
+            reader.recv(1)
+
     def test_data_to_uuid(self):
         """Verify that data is converted correctly."""
         data = b"\x41\x42\x43\x44\x45\x46\x47\x48\x49\x40\x41\x42\x43\x44\x45\x46"
@@ -35,6 +50,17 @@ class TestUtils(unittest.TestCase):
         for data, hexstring in tests:
             self.assertEqual(data_to_binstring(data), hexstring)
 
+    def test_bt_addr(self):
+        """Verify that bluetooth addresses are converted in both directions."""
+        tests = [
+            (b"\x35\x94\xef\xcd\xd6\x1c", "1c:d6:cd:ef:94:35"),
+            (bytearray(b"\x00\x01\x02\x0a\xff\x10"), "10:ff:0a:02:01:00"),
+            (memoryview(b"\x00\x00\x00\x00\x00\x00"), "00:00:00:00:00:00"),
+        ]
+        for data, string in tests:
+            self.assertEqual(bt_addr_to_string(data), string)
+            self.assertEqual(string_to_bt_addr(string), bytes(data))
+
     def test_is_one_of(self):
         """Test is_one_of method."""
         tests = [
@@ -54,6 +80,8 @@ class TestUtils(unittest.TestCase):
             (EddystoneURLFrame, True),
             (EddystoneUIDFrame, True),
             (EddystoneEncryptedTLMFrame, True),
+            (EstimoteNearable, True),
+            (CJMonitorAdvertisement, True),
             (str, False),
             (list, False),
             (int, False),